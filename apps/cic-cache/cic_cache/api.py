@@ -55,7 +55,7 @@ class Api:
                     queue=callback_queue,
                     )       
 
-    def list(self, offset=0, limit=100, address=None, oldest=False):
+    def list(self, offset=0, limit=100, address=None, oldest=False, cursor=None):
         s = celery.signature(
         'cic_cache.tasks.tx.tx_filter',
         [
@@ -64,6 +64,9 @@ class Api:
             address,
             oldest,
             ],
+            {
+                'cursor': cursor,
+            },
             queue=self.queue,
         )
         if self.callback_param != None:
@@ -74,7 +77,7 @@ class Api:
         return t
 
 
-    def list_content(self, offset=0, limit=100, address=None, block_offset=None, block_limit=None, oldest=False):
+    def list_content(self, offset=0, limit=100, address=None, block_offset=None, block_limit=None, oldest=False, cursor=None):
         s = celery.signature(
         'cic_cache.tasks.tx.tx_filter_content',
         [
@@ -85,6 +88,9 @@ class Api:
             block_limit,
             oldest,
             ],
+            {
+                'cursor': cursor,
+            },
             queue=self.queue,
         )
         if self.callback_param != None:
@@ -1,9 +1,11 @@
 # standard imports
 import logging
 import datetime
+import math
 
 # external imports
 import moolb
+from sqlalchemy.exc import IntegrityError
 
 # local imports
 from cic_cache.db.list import (
@@ -13,13 +15,119 @@ from cic_cache.db.list import (
         list_transactions_mined_with_data_index,
         list_transactions_account_mined_with_data_index,
         list_transactions_account_mined_with_data,
+        list_block_spans,
+        list_bloom_ranges,
+        add_bloom_range,
+        get_sync_height,
         )
 
 logg = logging.getLogger()
 
 
 DEFAULT_FILTER_SIZE = 8192 * 8
+DEFAULT_FILTER_ROUNDS = 3
+DEFAULT_FP_RATE = 0.001
+DEFAULT_RANGE_SPAN = 1000
 DEFAULT_LIMIT = 100
+DEFAULT_STREAM_CHUNK_SIZE = 1000
+MIN_FILTER_SIZE = 64
+
+
+def filter_size(n, fp_rate=DEFAULT_FP_RATE, rounds=DEFAULT_FILTER_ROUNDS):
+    """Calculate the bloom filter size needed to hold a number of entries at a target false positive rate.
+
+    The size is rounded up to the nearest power of two, so that a filter can be folded into any smaller filter size, see fold_filter.
+
+    :param n: Number of entries
+    :type n: int
+    :param fp_rate: Target false positive rate
+    :type fp_rate: float
+    :param rounds: Hashing rounds per entry
+    :type rounds: int
+    :rtype: int
+    :returns: Filter size in bits
+    """
+    if n < 1:
+        return MIN_FILTER_SIZE
+    bits = math.ceil((-rounds * n) / math.log(1 - math.pow(fp_rate, 1 / rounds)))
+    size = MIN_FILTER_SIZE
+    while size < bits:
+        size *= 2
+    return size
+
+
+def filter_fp_rate(n, bits, rounds=DEFAULT_FILTER_ROUNDS):
+    """Estimate the false positive rate of a bloom filter.
+
+    :param n: Number of entries
+    :type n: int
+    :param bits: Filter size in bits
+    :type bits: int
+    :param rounds: Hashing rounds per entry
+    :type rounds: int
+    :rtype: float
+    :returns: False positive rate
+    """
+    return math.pow(1 - math.exp((-rounds * n) / bits), rounds)
+
+
+def fold_filter(filter_data, bits):
+    """Reduce a bloom filter to a smaller size.
+
+    Filter bits are set at the hash value modulo the filter size. When both sizes are powers of two, OR-ing the two halves of the filter repeatedly results in the same filter as if the entries had been added to a filter of the smaller size.
+
+    :param filter_data: Filter contents
+    :type filter_data: bytes
+    :param bits: Size to reduce to, in bits
+    :type bits: int
+    :raises ValueError: Size is larger than the filter
+    :rtype: bytes
+    :returns: Reduced filter contents
+    """
+    l = int(bits / 8)
+    if l > len(filter_data):
+        raise ValueError('cannot fold filter of {} bits to {} bits'.format(len(filter_data) * 8, bits))
+    filter_data = list(filter_data)
+    while len(filter_data) > l:
+        h = int(len(filter_data) / 2)
+        filter_data = list(map(lambda x, y: x | y, filter_data[:h], filter_data[h:]))
+    return bytes(filter_data)
+
+
+def encode_cursor(block_number, tx_index):
+    """Serialize a result set position to an opaque cursor string.
+
+    The cursor is the hex representation of the 32-bit big-endian block number concatenated with the 32-bit big-endian transaction index, the same serialization used for the bloom filter inputs.
+
+    :param block_number: Block number of last transaction in page
+    :type block_number: int
+    :param tx_index: Transaction index of last transaction in page
+    :type tx_index: int
+    :rtype: str
+    :returns: Cursor
+    """
+    return (block_number.to_bytes(4, byteorder='big') + tx_index.to_bytes(4, byteorder='big')).hex()
+
+
+def decode_cursor(cursor):
+    """Parse a cursor string created by encode_cursor.
+
+    :param cursor: Cursor
+    :type cursor: str
+    :raises ValueError: Invalid cursor
+    :rtype: tuple
+    :returns: Block number, transaction index
+    """
+    if cursor == None:
+        return None
+    try:
+        b = bytes.fromhex(cursor)
+    except (ValueError, TypeError):
+        raise ValueError('invalid cursor {}'.format(cursor))
+    if len(b) != 8:
+        raise ValueError('invalid cursor length {}'.format(cursor))
+    return (int.from_bytes(b[:4], byteorder='big'), int.from_bytes(b[4:], byteorder='big'),)
+
 
 class Cache:
 
@@ -28,37 +136,41 @@ class Cache:
 
 
 class BloomCache(Cache):
+    """Creates bloom filters for transactions in cache.
 
-    @staticmethod
-    def __get_filter_size(n):
-        n = DEFAULT_FILTER_SIZE
-        logg.warning('filter size hardcoded to {}'.format(n))
-        return n
+    Filters are sized from the number of entries they are expected to hold, for the given target false positive rate.
 
+    Filters for ranges of blocks that are completely synced are stored, and reused for block range queries.
 
-    def load_transactions(self, offset, limit, block_offset=None, block_limit=None, oldest=False):
-        """Retrieves a list of transactions from cache and creates a bloom filter pointing to blocks and transactions.
+    :param session: Persistent storage session object
+    :type session: SQLAlchemy session
+    :param fp_rate: Target false positive rate
+    :type fp_rate: float
+    :param range_span: Number of blocks in each stored filter range
+    :type range_span: int
+    """
 
-        Block and transaction numbers are serialized as 32-bit big-endian numbers. The input to the second bloom filter is the concatenation of the serialized block number and transaction index.
+    def __init__(self, session, fp_rate=DEFAULT_FP_RATE, range_span=DEFAULT_RANGE_SPAN):
+        super(BloomCache, self).__init__(session)
+        self.fp_rate = fp_rate
+        self.range_span = range_span
+        self.rounds = DEFAULT_FILTER_ROUNDS
 
-        For example, if the block number is 13 and the transaction index is 42, the input are:
 
-        block filter:       0x0d000000
-        block+tx filter:    0x0d0000002a0000000
+    def __get_filter_size(self, n):
+        return filter_size(n, fp_rate=self.fp_rate, rounds=self.rounds)
 
-        :param offset: Offset in data set to return transactions from
-        :type offset: int
-        :param limit: Max number of transactions to retrieve
-        :type limit: int
-        :return: Lowest block, bloom filter for blocks, bloom filter for blocks|tx
-        :rtype: tuple
-        """
-        rows = list_transactions_mined(self.session, offset, limit, block_offset=block_offset, block_limit=block_limit, oldest=oldest)
 
-        f_block = moolb.Bloom(BloomCache.__get_filter_size(limit), 3)
-        f_blocktx = moolb.Bloom(BloomCache.__get_filter_size(limit), 3)
+    def __process_rows(self, rows, limit, oldest):
+        # the filter is sized from the rows actually returned, since the limit is given by the caller
+        rows = list(rows)
+        bits = min(self.__get_filter_size(len(rows)), DEFAULT_FILTER_SIZE)
+        f_block = moolb.Bloom(bits, self.rounds)
+        f_blocktx = moolb.Bloom(bits, self.rounds)
         highest_block = -1
         lowest_block = -1
+        c = 0
+        last = None
         for r in rows:
             if highest_block == -1:
                 highest_block = r[0]
@@ -73,10 +185,41 @@ class BloomCache(Cache):
             f_block.add(block)
             f_blocktx.add(block + tx)
             logg.debug('added block {} tx {} lo {} hi {}'.format(r[0], r[1], lowest_block, highest_block))
-        return (lowest_block, highest_block, f_block.to_bytes(), f_blocktx.to_bytes(),)
+            c += 1
+            last = r
+        next_cursor = None
+        if c > 0 and c == limit:
+            next_cursor = encode_cursor(last[0], last[1])
+        fp_rate = filter_fp_rate(c, bits, rounds=self.rounds)
+        return (lowest_block, highest_block, f_block.to_bytes(), f_blocktx.to_bytes(), next_cursor, fp_rate,)
 
 
-    def load_transactions_account(self, address, offset, limit, block_offset=None, block_limit=None, oldest=False):
+    def load_transactions(self, offset, limit, block_offset=None, block_limit=None, oldest=False, cursor=None):
+        """Retrieves a list of transactions from cache and creates a bloom filter pointing to blocks and transactions.
+
+        Block and transaction numbers are serialized as 32-bit big-endian numbers. The input to the second bloom filter is the concatenation of the serialized block number and transaction index.
+
+        For example, if the block number is 13 and the transaction index is 42, the input are:
+
+        block filter:       0x0d000000
+        block+tx filter:    0x0d0000002a0000000
+
+        The filter is sized to hold the returned entries at the target false positive rate, up to DEFAULT_FILTER_SIZE.
+
+        :param offset: Offset in data set to return transactions from
+        :type offset: int
+        :param limit: Max number of transactions to retrieve
+        :type limit: int
+        :param cursor: Cursor returned by a previous call. If set, offset is ignored.
+        :type cursor: str
+        :return: Lowest block, highest block, bloom filter for blocks, bloom filter for blocks|tx, cursor for next page (None if no more results), estimated false positive rate
+        :rtype: tuple
+        """
+        rows = list_transactions_mined(self.session, offset, limit, block_offset=block_offset, block_limit=block_limit, oldest=oldest, cursor=decode_cursor(cursor))
+        return self.__process_rows(rows, limit, oldest)
+
+
+    def load_transactions_account(self, address, offset, limit, block_offset=None, block_limit=None, oldest=False, cursor=None):
         """Same as load_transactions(...), but only retrieves transactions where the specified account address is sender or recipient.
 
         :param address: Address to retrieve transactions for.
@@ -85,53 +228,187 @@ class BloomCache(Cache):
         :type offset: int
         :param limit: Max number of transactions to retrieve
         :type limit: int
-        :return: Lowest block, bloom filter for blocks, bloom filter for blocks|tx
+        :param cursor: Cursor returned by a previous call. If set, offset is ignored.
+        :type cursor: str
+        :return: Lowest block, highest block, bloom filter for blocks, bloom filter for blocks|tx, cursor for next page (None if no more results), estimated false positive rate
         :rtype: tuple
         """
-        rows = list_transactions_account_mined(self.session, address, offset, limit, block_offset=block_offset, block_limit=block_limit, oldest=oldest) 
+        rows = list_transactions_account_mined(self.session, address, offset, limit, block_offset=block_offset, block_limit=block_limit, oldest=oldest, cursor=decode_cursor(cursor))
+        return self.__process_rows(rows, limit, oldest)
 
-        f_block = moolb.Bloom(BloomCache.__get_filter_size(limit), 3)
-        f_blocktx = moolb.Bloom(BloomCache.__get_filter_size(limit), 3)
-        highest_block = -1;
-        lowest_block = -1;
+
+    def __add_range(self, f_block, f_blocktx, block_offset, block_limit):
+        rows = list_transactions_mined(self.session, 0, None, block_offset=block_offset, block_limit=block_limit, oldest=True)
+        c = 0
         for r in rows:
-            if highest_block == -1:
-                highest_block = r[0]
-                lowest_block = r[0]
-            else:
-                if oldest:
-                    highest_block = r[0]
-                else:
-                    lowest_block = r[0]
             block = r[0].to_bytes(4, byteorder='big')
             tx = r[1].to_bytes(4, byteorder='big')
             f_block.add(block)
             f_blocktx.add(block + tx)
-            logg.debug('added block {} tx {} lo {} hi {}'.format(r[0], r[1], lowest_block, highest_block))
-        return (lowest_block, highest_block, f_block.to_bytes(), f_blocktx.to_bytes(),)
+            c += 1
+        return c
+
+
+    def __store_range(self, block_offset, block_limit, c, f_block, f_blocktx):
+        try:
+            add_bloom_range(self.session, block_offset, block_limit, c, f_block.bits, f_block.rounds, f_block.to_bytes(), f_blocktx.to_bytes())
+            self.session.commit()
+        except IntegrityError:
+            self.session.rollback()
+            logg.debug('bloom filter range {}-{} already stored'.format(block_offset, block_limit))
+            return
+        logg.debug('stored bloom filter range {}-{} with {} transactions'.format(block_offset, block_limit, c))
+
+
+    def load_transactions_range(self, block_offset, block_limit):
+        """Creates bloom filters for all transactions in a block range, using the same filter inputs as load_transactions(...).
+
+        The range is split in spans of range_span blocks, of which only spans containing transactions are visited. Filters for spans that are completely below the height all syncer sessions have processed are stored, and stored filters are combined with the filters for the remaining blocks. The result is reduced to the size needed for the number of transactions in the range, at the target false positive rate, up to DEFAULT_FILTER_SIZE.
+
+        :param block_offset: First block of range
+        :type block_offset: int
+        :param block_limit: Last block of range, inclusive
+        :type block_limit: int
+        :return: First block, last block, bloom filter for blocks, bloom filter for blocks|tx, None, estimated false positive rate
+        :rtype: tuple
+        """
+        sync_height = get_sync_height(self.session)
+
+        f_block = moolb.Bloom(DEFAULT_FILTER_SIZE, self.rounds)
+        f_blocktx = moolb.Bloom(DEFAULT_FILTER_SIZE, self.rounds)
+        c = 0
+
+        span_offset = math.ceil(block_offset / self.range_span) * self.range_span
+        span_limit = (math.floor((block_limit + 1) / self.range_span) * self.range_span) - 1
+
+        spans = []
+        stored = {}
+        if span_offset <= span_limit:
+            spans = list_block_spans(self.session, self.range_span, span_offset, span_limit)
+            for r in list_bloom_ranges(self.session, span_offset, span_limit):
+                if r['filter_size'] != DEFAULT_FILTER_SIZE or r['filter_rounds'] != self.rounds or r['block_end'] - r['block_start'] + 1 != self.range_span:
+                    continue
+                stored[r['block_start']] = r
+        else:
+            span_offset = block_limit + 1
+            span_limit = block_limit
+
+        if block_offset < span_offset:
+            c += self.__add_range(f_block, f_blocktx, block_offset, span_offset - 1)
+
+        for i in spans:
+            r = stored.get(i)
+            if r != None:
+                f_block.merge(bytes(r['block_filter']))
+                f_blocktx.merge(bytes(r['blocktx_filter']))
+                c += r['tx_count']
+                continue
+
+            span_end = i + self.range_span - 1
+            # blocks at or above the sync height may still get transactions added
+            if sync_height == None or span_end >= sync_height:
+                c += self.__add_range(f_block, f_blocktx, i, span_end)
+                continue
+
+            f_span_block = moolb.Bloom(DEFAULT_FILTER_SIZE, self.rounds)
+            f_span_blocktx = moolb.Bloom(DEFAULT_FILTER_SIZE, self.rounds)
+            span_c = self.__add_range(f_span_block, f_span_blocktx, i, span_end)
+            self.__store_range(i, span_end, span_c, f_span_block, f_span_blocktx)
+            f_block.merge(f_span_block.to_bytes())
+            f_blocktx.merge(f_span_blocktx.to_bytes())
+            c += span_c
+
+        if span_limit < block_limit:
+            c += self.__add_range(f_block, f_blocktx, span_limit + 1, block_limit)
+
+        bits = min(self.__get_filter_size(c), DEFAULT_FILTER_SIZE)
+        fp_rate = filter_fp_rate(c, bits, rounds=self.rounds)
+        logg.debug('range {}-{} has {} transactions, filter size {} fp rate {}'.format(block_offset, block_limit, c, bits, fp_rate))
+        return (block_offset, block_limit, fold_filter(f_block.to_bytes(), bits), fold_filter(f_blocktx.to_bytes(), bits), None, fp_rate,)
 
 
 class DataCache(Cache):
 
-    def load_transactions_with_data(self, offset, limit, block_offset=None, block_limit=None, oldest=False):
+    def load_transactions_with_data(self, offset, limit, block_offset=None, block_limit=None, oldest=False, cursor=None):
+        if limit == 0:
+            limit = DEFAULT_LIMIT
+        rows = list_transactions_mined_with_data(self.session, offset, limit, block_offset, block_limit, oldest=oldest, cursor=decode_cursor(cursor))
+        return self.__process_rows(rows, limit, oldest)
+
+
+    def load_transactions_account_with_data(self, address, offset, limit, block_offset=None, block_limit=None, oldest=False, cursor=None):
+        if limit == 0:
+            limit = DEFAULT_LIMIT
+        rows = list_transactions_account_mined_with_data(self.session, address, offset, limit, block_offset, block_limit, oldest=oldest, cursor=decode_cursor(cursor))
+        return self.__process_rows(rows, limit, oldest)
+
+
+    def stream_transactions_with_data(self, offset, limit, block_offset=None, block_limit=None, oldest=False, cursor=None, chunk_size=DEFAULT_STREAM_CHUNK_SIZE):
+        """Same as load_transactions_with_data(...), but returns a generator yielding one transaction at a time.
+
+        Rows are fetched from the database in chunks of chunk_size as the generator is consumed, so that memory use does not depend on the limit.
+
+        :param chunk_size: Number of rows to fetch from the database at a time
+        :type chunk_size: int
+        :rtype: generator
+        :returns: Transactions, in the same format as the transaction list returned by load_transactions_with_data(...)
+        """
         if limit == 0:
             limit = DEFAULT_LIMIT
-        rows = list_transactions_mined_with_data(self.session, offset, limit, block_offset, block_limit, oldest=oldest) 
-        return self.__process_rows(rows, oldest)
+        rows = list_transactions_mined_with_data(self.session, offset, limit, block_offset, block_limit, oldest=oldest, cursor=decode_cursor(cursor), stream=True)
+        return self.__stream_rows(rows, chunk_size)
 
 
-    def load_transactions_account_with_data(self, address, offset, limit, block_offset=None, block_limit=None, oldest=False):
+    def stream_transactions_account_with_data(self, address, offset, limit, block_offset=None, block_limit=None, oldest=False, cursor=None, chunk_size=DEFAULT_STREAM_CHUNK_SIZE):
+        """Same as stream_transactions_with_data(...), but only retrieves transactions where the specified account address is sender or recipient.
+        """
         if limit == 0:
             limit = DEFAULT_LIMIT
-        rows = list_transactions_account_mined_with_data(self.session, address, offset, limit, block_offset, block_limit, oldest=oldest) 
-        return self.__process_rows(rows, oldest)
+        rows = list_transactions_account_mined_with_data(self.session, address, offset, limit, block_offset, block_limit, oldest=oldest, cursor=decode_cursor(cursor), stream=True)
+        return self.__stream_rows(rows, chunk_size)
+
+
+    def __stream_rows(self, rows, chunk_size):
+        while True:
+            chunk = rows.fetchmany(chunk_size)
+            if len(chunk) == 0:
+                break
+            for r in chunk:
+                yield self.__process_row(r)
+        rows.close()
 
 
-    def __process_rows(self, rows, oldest):
+    def __process_row(self, r):
+        tx_type = 'unknown'
+
+        if r['value'] != None:
+            tx_type = '{}.{}'.format(r['domain'], r['value'])
+
+        o = {
+            'block_number': r['block_number'],
+            'tx_index': r['tx_index'],
+            'tx_hash': r['tx_hash'],
+            'date_block': r['date_block'],
+            'sender': r['sender'],
+            'recipient': r['recipient'],
+            'from_value': int(r['from_value']),
+            'to_value': int(r['to_value']),
+            'source_token': r['source_token'],
+            'destination_token': r['destination_token'],
+            'success': r['success'],
+            'tx_type': tx_type,
+        }
+
+        if isinstance(r['date_block'], str):
+            o['date_block'] = datetime.datetime.fromisoformat(r['date_block'])
+
+        return o
+
+
+    def __process_rows(self, rows, limit, oldest):
         tx_cache = []
         highest_block = -1;
         lowest_block = -1;
-        date_is_str = None # stick this in startup
         for r in rows:
             if highest_block == -1:
                 highest_block = r['block_number']
@@ -141,31 +418,12 @@ class DataCache(Cache):
                     highest_block = r['block_number']
                 else:
                     lowest_block = r['block_number']
-            tx_type = 'unknown'
-
-            if r['value'] != None:
-                tx_type = '{}.{}'.format(r['domain'], r['value'])
-
-            if date_is_str == None:
-                date_is_str = type(r['date_block']).__name__ == 'str'
-
-            o = {
-                'block_number': r['block_number'],
-                'tx_index': r['tx_index'],
-                'tx_hash': r['tx_hash'],
-                'date_block': r['date_block'],
-                'sender': r['sender'],
-                'recipient': r['recipient'],
-                'from_value': int(r['from_value']),
-                'to_value': int(r['to_value']),
-                'source_token': r['source_token'],
-                'destination_token': r['destination_token'],
-                'success': r['success'],
-                'tx_type': tx_type,
-            }
-
-            if date_is_str:
-                o['date_block'] = datetime.datetime.fromisoformat(r['date_block'])
-
-            tx_cache.append(o)
-        return (lowest_block, highest_block, tx_cache)
+
+            tx_cache.append(self.__process_row(r))
+
+        next_cursor = None
+        if len(tx_cache) > 0 and len(tx_cache) == limit:
+            last = tx_cache[-1]
+            next_cursor = encode_cursor(last['block_number'], last['tx_index'])
+
+        return (lowest_block, highest_block, tx_cache, next_cursor,)
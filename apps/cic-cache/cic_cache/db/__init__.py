@@ -3,11 +3,15 @@ import logging
 
 # local imports
 from .list import (
+        list_transactions,
         list_transactions_mined,
         list_transactions_account_mined,
         add_transaction,
         tag_transaction,
         add_tag,
+        get_tag_ids,
+        get_cache_height,
+        get_sync_height,
     )
 from cic_cache.db.models.base import SessionBase
 
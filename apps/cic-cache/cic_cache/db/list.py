@@ -1,6 +1,8 @@
 # standard imports
 import logging
 import datetime
+import re
+import hashlib
 
 # external imports
 from cic_cache.db.models.base import SessionBase
@@ -9,6 +11,195 @@ from sqlalchemy import text
 logg = logging.getLogger()
 
 
+tx_data_columns = 'tx_hash, {0}block_number, {0}tx_index, date_block, sender, recipient, from_value, to_value, source_token, destination_token, success, domain, value'
+tx_data_join = 'tx LEFT JOIN tag_tx_link ON tx.id = tag_tx_link.tx_id LEFT JOIN tag ON tag_tx_link.tag_id = tag.id'
+account_tx_data_join = 'account_tx INNER JOIN tx ON tx.id = account_tx.tx_id LEFT JOIN tag_tx_link ON tx.id = tag_tx_link.tx_id LEFT JOIN tag ON tag_tx_link.tag_id = tag.id'
+
+re_bind_param = re.compile(r':(\w+)')
+
+__list_queries = {}
+__compiled_cache = {}
+
+
+def __build_list_query(
+        data,
+        account,
+        block_offset,
+        block_limit,
+        cursor,
+        paged,
+        oldest,
+        ):
+    """Builds a transaction list query for the given combination of query options, or returns it from cache if already built.
+
+    All values are bound parameters, so there is only one statement for each combination of options. The statement is returned both as a text clause, and as the statements needed to prepare and execute it server-side in postgres.
+
+    :param data: Retrieve all transaction data and tags, not only block number and transaction index
+    :type data: bool
+    :param account: Filter by account address, bound as :address
+    :type account: bool
+    :param block_offset: Filter by first block, bound as :block_offset
+    :type block_offset: bool
+    :param block_limit: Filter by last block, bound as :block_limit
+    :type block_limit: bool
+    :param cursor: Filter by position after previous page, bound as :cursor_block and :cursor_tx
+    :type cursor: bool
+    :param paged: Apply LIMIT and OFFSET, bound as :limit and :offset
+    :type paged: bool
+    :param oldest: Order by oldest transaction first
+    :type oldest: bool
+    :rtype: dict
+    :returns: Query
+    """
+    k = (data, account, block_offset, block_limit, cursor, paged, oldest,)
+    q = __list_queries.get(k)
+    if q != None:
+        return q
+
+    order_by = 'DESC'
+    cursor_op = '<'
+    if oldest:
+        order_by = 'ASC'
+        cursor_op = '>'
+
+    columns = 'block_number, tx_index'
+    source = 'tx'
+    column_prefix = ''
+    if account:
+        source = 'account_tx'
+    if data:
+        if account:
+            column_prefix = 'account_tx.'
+            columns = tx_data_columns.format(column_prefix)
+            source = account_tx_data_join
+        else:
+            columns = tx_data_columns.format('')
+            source = tx_data_join
+
+    block_column = column_prefix + 'block_number'
+    tx_column = column_prefix + 'tx_index'
+
+    filters = []
+    if account:
+        filters.append(column_prefix + 'address = :address')
+    if block_offset:
+        filters.append(block_column + ' >= :block_offset')
+    if block_limit:
+        filters.append(block_column + ' <= :block_limit')
+    if cursor:
+        filters.append('({}, {}) {} (:cursor_block, :cursor_tx)'.format(block_column, tx_column, cursor_op))
+
+    sql = 'SELECT {} FROM {}'.format(columns, source)
+    if len(filters) > 0:
+        sql += ' WHERE ' + ' AND '.join(filters)
+    sql += ' ORDER BY {} {}, {} {}'.format(block_column, order_by, tx_column, order_by)
+    if paged:
+        sql += ' LIMIT :limit OFFSET :offset'
+
+    params = []
+    def positional(m):
+        params.append(m.group(1))
+        return '${}'.format(len(params))
+    sql_positional = re_bind_param.sub(positional, sql)
+
+    h = hashlib.sha256()
+    h.update(sql.encode('utf-8'))
+    name = 'cic_cache_list_' + h.hexdigest()[:16]
+    q = {
+        'name': name,
+        'text': text(sql),
+        'prepare': 'PREPARE {} AS {}'.format(name, sql_positional),
+        'execute': text('EXECUTE {}'.format(name)),
+            }
+    if len(params) > 0:
+        q['execute'] = text('EXECUTE {} ({})'.format(name, ', '.join(map(lambda x: ':' + x, params))))
+
+    logg.debug('built list query {}: {}'.format(name, sql))
+    __list_queries[k] = q
+    return q
+
+
+def __execute_list_query(session, q, params, stream=False):
+    conn = session.connection().execution_options(compiled_cache=__compiled_cache)
+    if stream:
+        conn = conn.execution_options(stream_results=True)
+        return conn.execute(q['text'], params)
+
+    if conn.dialect.driver == 'psycopg2':
+        prepared = conn.info.setdefault('cic_cache_prepared', set())
+        if q['name'] not in prepared:
+            conn.execute(q['prepare'])
+            prepared.add(q['name'])
+        return conn.execute(q['execute'], params)
+
+    return conn.execute(q['text'], params)
+
+
+def list_transactions(
+        session,
+        offset,
+        limit,
+        block_offset=None,
+        block_limit=None,
+        address=None,
+        data=False,
+        oldest=False,
+        cursor=None,
+        stream=False,
+        ):
+    """Executes db query to return confirmed transactions. All transaction list functions in this module use this query builder.
+
+    Values are passed to the database as bound parameters. With psycopg2, the query is prepared server-side the first time it is used on a database connection, and is then executed without being parsed and planned again.
+
+    If a cursor is given, rows are selected by comparing (block_number, tx_index) to the cursor position instead of skipping rows with OFFSET, and the offset argument is ignored.
+
+    :param offset: Offset in data set to return transactions from
+    :type offset: int
+    :param limit: Max number of transactions to retrieve. If None, all transactions are retrieved.
+    :type limit: int
+    :param block_offset: First block to include in search
+    :type block_offset: int
+    :param block_limit: Last block to include in search
+    :type block_limit: int
+    :param address: If set, only retrieve transactions where address is sender or recipient
+    :type address: str
+    :param data: If set, retrieve all transaction data and tags, not only block number and transaction index
+    :type data: bool
+    :param cursor: Block number and transaction index of the last transaction of the previous page. Overrides offset.
+    :type cursor: tuple of int
+    :param stream: If set, rows are fetched from the database as they are read from the result set, using a server-side cursor where supported.
+    :type stream: bool
+    :result: Result set
+    :rtype: SQLAlchemy.ResultProxy
+    """
+    q = __build_list_query(
+            data,
+            address != None,
+            block_offset != None,
+            block_limit != None,
+            cursor != None,
+            limit != None,
+            oldest,
+            )
+
+    params = {}
+    if address != None:
+        params['address'] = address
+    if block_offset != None:
+        params['block_offset'] = int(block_offset)
+    if block_limit != None:
+        params['block_limit'] = int(block_limit)
+    if cursor != None:
+        params['cursor_block'] = int(cursor[0])
+        params['cursor_tx'] = int(cursor[1])
+        offset = 0
+    if limit != None:
+        params['limit'] = int(limit)
+        params['offset'] = int(offset)
+
+    return __execute_list_query(session, q, params, stream=stream)
+
+
 def list_transactions_mined(
         session,
         offset,
@@ -16,29 +207,20 @@ def list_transactions_mined(
         block_offset,
         block_limit,
         oldest=False,
+        cursor=None,
         ):
     """Executes db query to return all confirmed transactions according to the specified offset and limit.
 
     :param offset: Offset in data set to return transactions from
     :type offset: int
-    :param limit: Max number of transactions to retrieve
+    :param limit: Max number of transactions to retrieve. If None, all transactions are retrieved.
     :type limit: int
+    :param cursor: Block number and transaction index of the last transaction of the previous page. Overrides offset.
+    :type cursor: tuple of int
     :result: Result set
     :rtype: SQLAlchemy.ResultProxy
     """
-    order_by = 'DESC'
-    if oldest:
-        order_by = 'ASC'
-
-    if block_offset:
-        if block_limit:
-            s = "SELECT block_number, tx_index FROM tx WHERE block_number >= {} and block_number <= {} ORDER BY block_number {}, tx_index {} LIMIT {} OFFSET {}".format(block_offset, block_limit, order_by, order_by, limit, offset)
-        else:
-            s = "SELECT block_number, tx_index FROM tx WHERE block_number >= {} ORDER BY block_number {}, tx_index {} LIMIT {} OFFSET {}".format(block_offset, order_by, order_by, limit, offset)
-    else:
-        s = "SELECT block_number, tx_index FROM tx ORDER BY block_number {}, tx_index {} LIMIT {} OFFSET {}".format(order_by, order_by, limit, offset)
-    r = session.execute(s)
-    return r
+    return list_transactions(session, offset, limit, block_offset=block_offset, block_limit=block_limit, oldest=oldest, cursor=cursor)
 
 
 def list_transactions_mined_with_data(
@@ -48,6 +230,8 @@ def list_transactions_mined_with_data(
         block_offset,
         block_limit,
         oldest=False,
+        cursor=None,
+        stream=False,
         ):
     """Executes db query to return all confirmed transactions according to the specified offset and limit.
 
@@ -55,33 +239,24 @@ def list_transactions_mined_with_data(
     :type block_offset: int
     :param block_limit: Last block to include in search
     :type block_limit: int
+    :param cursor: Block number and transaction index of the last transaction of the previous page. Overrides offset.
+    :type cursor: tuple of int
+    :param stream: If set, rows are fetched from the database as they are read from the result set, using a server-side cursor where supported.
+    :type stream: bool
     :result: Result set
     :rtype: SQLAlchemy.ResultProxy
     """
-    order_by = 'DESC'
-    if oldest:
-        order_by = 'ASC'
-
-    if block_offset:
-        if block_limit:
-            s = "SELECT tx_hash, block_number, tx_index, date_block, sender, recipient, from_value, to_value, source_token, destination_token, success, domain, value FROM tx LEFT JOIN tag_tx_link ON tx.id = tag_tx_link.tx_id LEFT JOIN tag ON tag_tx_link.tag_id = tag.id WHERE block_number >= {} AND block_number <= {} ORDER BY block_number {}, tx_index {} LIMIT {} OFFSET {}".format(block_offset, block_limit, order_by, order_by, limit, offset)
-        else:
-            s = "SELECT tx_hash, block_number, tx_index, date_block, sender, recipient, from_value, to_value, source_token, destination_token, success, domain, value FROM tx LEFT JOIN tag_tx_link ON tx.id = tag_tx_link.tx_id LEFT JOIN tag ON tag_tx_link.tag_id = tag.id WHERE block_number >= {} ORDER BY block_number {}, tx_index {} LIMIT {} OFFSET {}".format(block_offset, order_by, order_by, limit, offset)
-    else:
-        s = "SELECT tx_hash, block_number, tx_index, date_block, sender, recipient, from_value, to_value, source_token, destination_token, success, domain, value FROM tx LEFT JOIN tag_tx_link ON tx.id = tag_tx_link.tx_id LEFT JOIN tag ON tag_tx_link.tag_id = tag.id ORDER BY block_number {}, tx_index {} LIMIT {} OFFSET {}".format(order_by, order_by, limit, offset)
-
-
-    r = session.execute(s)
-    return r
+    return list_transactions(session, offset, limit, block_offset=block_offset, block_limit=block_limit, data=True, oldest=oldest, cursor=cursor, stream=stream)
 
 
 def list_transactions_mined_with_data_index(
         session,
         offset,
-        end,
+        limit,
         block_offset,
         block_limit,
         oldest=False,
+        cursor=None,
         ):
     """Executes db query to return all confirmed transactions according to the specified offset and limit.
 
@@ -89,24 +264,12 @@ def list_transactions_mined_with_data_index(
     :type offset: int
     :param limit: Max number of transactions to retrieve
     :type limit: int
+    :param cursor: Block number and transaction index of the last transaction of the previous page. Overrides offset.
+    :type cursor: tuple of int
     :result: Result set
     :rtype: SQLAlchemy.ResultProxy
     """
-
-    order_by = 'DESC'
-    if oldest:
-        order_by = 'ASC'
-
-    if block_offset:
-        if block_limit:
-            s = "SELECT tx_hash, block_number, tx_index, date_block, sender, recipient, from_value, to_value, source_token, destination_token, success, domain, value FROM tx LEFT JOIN tag_tx_link ON tx.id = tag_tx_link.tx_id LEFT JOIN tag ON tag_tx_link.tag_id = tag.id WHERE block_number >= {} and block_number <= {} ORDER BY block_number {}, tx_index {} LIMIT {} OFFSET {}".format(block_offset, block_limit, order_by, order_by, offset, end)
-        else:
-            s = "SELECT tx_hash, block_number, tx_index, date_block, sender, recipient, from_value, to_value, source_token, destination_token, success, domain, value FROM tx LEFT JOIN tag_tx_link ON tx.id = tag_tx_link.tx_id LEFT JOIN tag ON tag_tx_link.tag_id = tag.id WHERE block_number >= {} ORDER BY block_number {}, tx_index {} LIMIT {} OFFSET {}".format(block_offset, order_by, order_by, offset, end)
-    else:
-        s = "SELECT tx_hash, block_number, tx_index, date_block, sender, recipient, from_value, to_value, source_token, destination_token, success, domain, value FROM tx LEFT JOIN tag_tx_link ON tx.id = tag_tx_link.tx_id LEFT JOIN tag ON tag_tx_link.tag_id = tag.id ORDER BY block_number {}, tx_index {} LIMIT {} OFFSET {}".format(order_by, order_by, offset, end)
-
-    r = session.execute(s)
-    return r
+    return list_transactions(session, offset, limit, block_offset=block_offset, block_limit=block_limit, data=True, oldest=oldest, cursor=cursor)
 
 
 def list_transactions_account_mined_with_data_index(
@@ -117,6 +280,7 @@ def list_transactions_account_mined_with_data_index(
         block_offset,
         block_limit,
         oldest=False,
+        cursor=None,
         ):
     """Executes db query to return all confirmed transactions according to the specified offset and limit, filtered by address
 
@@ -124,24 +288,13 @@ def list_transactions_account_mined_with_data_index(
     :type offset: int
     :param limit: Max number of transactions to retrieve
     :type limit: int
+    :param cursor: Block number and transaction index of the last transaction of the previous page. Overrides offset.
+    :type cursor: tuple of int
     :result: Result set
     :rtype: SQLAlchemy.ResultProxy
     """
+    return list_transactions(session, offset, limit, block_offset=block_offset, block_limit=block_limit, address=address, data=True, oldest=oldest, cursor=cursor)
 
-    order_by = 'DESC'
-    if oldest:
-        order_by = 'ASC'
-
-    if block_offset:
-        if block_limit:
-            s = "SELECT tx_hash, block_number, tx_index, date_block, sender, recipient, from_value, to_value, source_token, destination_token, success, domain, value FROM tx LEFT JOIN tag_tx_link ON tx.id = tag_tx_link.tx_id LEFT JOIN tag ON tag_tx_link.tag_id = tag.id WHERE block_number >= {} AND block_number <= {} AND (sender = '{}' OR recipient = '{}') ORDER BY block_number {}, tx_index {} LIMIT {} OFFSET {}".format(block_offset, block_limit, address, address, order_by, order_by, limit, offset)
-        else:
-            s = "SELECT tx_hash, block_number, tx_index, date_block, sender, recipient, from_value, to_value, source_token, destination_token, success, domain, value FROM tx LEFT JOIN tag_tx_link ON tx.id = tag_tx_link.tx_id LEFT JOIN tag ON tag_tx_link.tag_id = tag.id WHERE block_number >= {} AND (sender = '{}' OR recipient = '{}') ORDER BY block_number {}, tx_index {} LIMIT {} OFFSET {}".format(block_offset, address, address, order_by, order_by, limit, offset)
-    else:
-        s = "SELECT tx_hash, block_number, tx_index, date_block, sender, recipient, from_value, to_value, source_token, destination_token, success, domain, value FROM tx LEFT JOIN tag_tx_link ON tx.id = tag_tx_link.tx_id LEFT JOIN tag ON tag_tx_link.tag_id = tag.id WHERE sender = '{}' OR recipient = '{}' ORDER BY block_number {}, tx_index {} LIMIT {} OFFSET {}".format(address, address, order_by, order_by, limit, offset)
-
-    r = session.execute(s)
-    return r
 
 def list_transactions_account_mined_with_data(
         session,
@@ -151,6 +304,8 @@ def list_transactions_account_mined_with_data(
         block_offset,
         block_limit,
         oldest=False,
+        cursor=None,
+        stream=False,
         ):
     """Executes db query to return all confirmed transactions according to the specified offset and limit.
 
@@ -158,24 +313,14 @@ def list_transactions_account_mined_with_data(
     :type block_offset: int
     :param block_limit: Last block to include in search
     :type block_limit: int
+    :param cursor: Block number and transaction index of the last transaction of the previous page. Overrides offset.
+    :type cursor: tuple of int
+    :param stream: If set, rows are fetched from the database as they are read from the result set, using a server-side cursor where supported.
+    :type stream: bool
     :result: Result set
     :rtype: SQLAlchemy.ResultProxy
     """
-
-    order_by = 'DESC'
-    if oldest:
-        order_by = 'ASC'
-
-    if block_offset:
-        if block_limit:
-            s = "SELECT tx_hash, block_number, tx_index, date_block, sender, recipient, from_value, to_value, source_token, destination_token, success, domain, value FROM tx LEFT JOIN tag_tx_link ON tx.id = tag_tx_link.tx_id LEFT JOIN tag ON tag_tx_link.tag_id = tag.id WHERE block_number >= {} AND block_number <= {} AND (sender = '{}' OR recipient = '{}') ORDER BY block_number {}, tx_index {} LIMIT {} OFFSET {}".format(block_offset, block_limit, address, address, order_by, order_by, limit, offset)
-        else:
-            s = "SELECT tx_hash, block_number, tx_index, date_block, sender, recipient, from_value, to_value, source_token, destination_token, success, domain, value FROM tx LEFT JOIN tag_tx_link ON tx.id = tag_tx_link.tx_id LEFT JOIN tag ON tag_tx_link.tag_id = tag.id WHERE block_number >= {} AND (sender = '{}' OR recipient = '{}') ORDER BY block_number {}, tx_index {} LIMIT {} OFFSET {}".format(block_offset, address, address, order_by, order_by, limit, offset)
-    else:
-        s = "SELECT tx_hash, block_number, tx_index, date_block, sender, recipient, from_value, to_value, source_token, destination_token, success, domain, value FROM tx LEFT JOIN tag_tx_link ON tx.id = tag_tx_link.tx_id LEFT JOIN tag ON tag_tx_link.tag_id = tag.id WHERE sender = '{}' OR recipient = '{}' ORDER BY block_number {}, tx_index {} LIMIT {} OFFSET {}".format(address, address, order_by, order_by, limit, offset)
-
-    r = session.execute(s)
-    return r
+    return list_transactions(session, offset, limit, block_offset=block_offset, block_limit=block_limit, address=address, data=True, oldest=oldest, cursor=cursor, stream=stream)
 
 
 def list_transactions_account_mined(
@@ -186,6 +331,7 @@ def list_transactions_account_mined(
         block_offset,
         block_limit,
         oldest=False,
+        cursor=None,
         ):
     """Same as list_transactions_mined(...), but only retrieves transaction where the specified account address is sender or recipient.
 
@@ -195,25 +341,42 @@ def list_transactions_account_mined(
     :type offset: int
     :param limit: Max number of transactions to retrieve
     :type limit: int
+    :param cursor: Block number and transaction index of the last transaction of the previous page. Overrides offset.
+    :type cursor: tuple of int
     :result: Result set
     :rtype: SQLAlchemy.ResultProxy
     """
+    return list_transactions(session, offset, limit, block_offset=block_offset, block_limit=block_limit, address=address, oldest=oldest, cursor=cursor)
 
-    order_by = 'DESC'
-    if oldest:
-        order_by = 'ASC'
 
-    if block_offset:
-        if block_limit:
-            s = "SELECT block_number, tx_index FROM tx WHERE block_number >= {} AND block_number <= {} AND (sender = '{}' OR recipient = '{}') ORDER BY block_number {}, tx_index {} LIMIT {} OFFSET {}".format(block_offset, block_limit, address, address, order_by, order_by, limit, offset)
-        else:
-            s = "SELECT block_number, tx_index FROM tx WHERE block_number >= {} AND (sender = '{}' OR recipient = '{}') ORDER BY block_number {}, tx_index {} LIMIT {} OFFSET {}".format(block_offset, address, address, order_by, order_by, limit, offset)
+def get_cache_height(session):
+    """Returns the position of the most recently added transaction.
 
-    else:
-        s = "SELECT block_number, tx_index FROM tx WHERE sender = '{}' OR recipient = '{}' ORDER BY block_number {}, tx_index {} LIMIT {} OFFSET {}".format(address, address, order_by, order_by, limit, offset)
+    The highest block number tells how far the tracker has synced. The highest row id changes on every insert, including transactions added by history syncers behind the head.
+
+    :param session: Persistent storage session object
+    :type session: SQLAlchemy session
+    :rtype: tuple
+    :returns: Highest block number, highest transaction row id. Both are None if cache is empty.
+    """
+    r = session.execute("SELECT MAX(block_number), MAX(id) FROM tx").fetchone()
+    return (r[0], r[1],)
+
+
+def get_sync_height(session):
+    """Returns the block height below which all blocks have been completely processed by the tracker.
 
-    r = session.execute(s)
-    return r
+    This is the lowest cursor of the current live syncer session, and of all history syncer sessions that have not yet processed their target block. Transactions are never added below this height, while they may still be added below the highest block in cache, e.g. by history syncers.
+
+    Live sessions of earlier runs are never closed, and their remaining blocks are synced by history sessions created on resume, so only the most recent live session is considered.
+
+    :param session: Persistent storage session object
+    :type session: SQLAlchemy session
+    :rtype: int
+    :returns: Block height, or None if there are no active syncer sessions
+    """
+    r = session.execute("SELECT MIN(block_cursor) FROM chain_sync WHERE (block_target IS NOT NULL AND block_cursor <= block_target) OR id = (SELECT MAX(id) FROM chain_sync WHERE block_target IS NULL)").fetchone()
+    return r[0]
 
 
 def add_transaction(
@@ -232,6 +395,8 @@ def add_transaction(
         ):
     """Adds a single transaction to the cache persistent storage. Sensible interpretation of all fields is the responsibility of the caller.
 
+    The transaction is also linked to the sender and recipient addresses in the account_tx table, which is used by the per-account list queries. Any stored bloom filter for a block range including the transaction's block is removed.
+
     :param session: Persistent storage session object
     :type session: SQLAlchemy session
     :param tx_hash: Transaction hash
@@ -273,6 +438,11 @@ def add_transaction(
             )
     session.execute(s)
 
+    s = text("INSERT INTO account_tx (address, block_number, tx_index, tx_id) SELECT sender, block_number, tx_index, id FROM tx WHERE tx_hash = :a UNION SELECT recipient, block_number, tx_index, id FROM tx WHERE tx_hash = :a")
+    session.execute(s, {'a': tx_hash})
+
+    remove_bloom_range(session, block_number)
+
 
 
 def tag_transaction(
@@ -343,3 +513,123 @@ def add_tag(
     else:
         s = text("INSERT INTO tag (domain, value) VALUES (:a, :b)")
     session.execute(s, {'a': domain, 'b': name})
+
+
+def get_tag_ids(session):
+    """Retrieve the ids of all tags in storage.
+
+    :param session: Persistent storage session object
+    :type session: SQLAlchemy session
+    :rtype: dict
+    :returns: Tag ids, keyed by tuple of tag value and domain
+    """
+    r = session.execute("SELECT id, value, domain FROM tag").fetchall()
+    tag_ids = {}
+    for v in r:
+        tag_ids[(v[1], v[2],)] = v[0]
+    return tag_ids
+
+
+def list_block_spans(
+        session,
+        span,
+        block_start,
+        block_end,
+        ):
+    """Retrieve the block spans that contain transactions within the given block range.
+
+    :param session: Persistent storage session object
+    :type session: SQLAlchemy session
+    :param span: Number of blocks in each span
+    :type span: int
+    :param block_start: First block of range
+    :type block_start: int
+    :param block_end: Last block of range, inclusive
+    :type block_end: int
+    :result: First block of each span
+    :rtype: list of int
+    """
+    s = text("SELECT DISTINCT block_number / :s FROM tx WHERE block_number >= :a AND block_number <= :b")
+    r = session.execute(s, {'s': span, 'a': block_start, 'b': block_end})
+    spans = []
+    for v in r:
+        spans.append(v[0] * span)
+    spans.sort()
+    return spans
+
+
+def list_bloom_ranges(
+        session,
+        block_start,
+        block_end,
+        ):
+    """Retrieve stored bloom filters for block ranges within the given block range.
+
+    :param session: Persistent storage session object
+    :type session: SQLAlchemy session
+    :param block_start: First block of range
+    :type block_start: int
+    :param block_end: Last block of range, inclusive
+    :type block_end: int
+    :result: Result set, ordered by block_start
+    :rtype: SQLAlchemy.ResultProxy
+    """
+    s = text("SELECT block_start, block_end, tx_count, filter_size, filter_rounds, block_filter, blocktx_filter FROM tx_bloom WHERE block_start >= :a AND block_end <= :b ORDER BY block_start")
+    return session.execute(s, {'a': block_start, 'b': block_end})
+
+
+def add_bloom_range(
+        session,
+        block_start,
+        block_end,
+        tx_count,
+        filter_size,
+        filter_rounds,
+        block_filter,
+        blocktx_filter,
+        ):
+    """Store bloom filters for all transactions in a block range.
+
+    :param session: Persistent storage session object
+    :type session: SQLAlchemy session
+    :param block_start: First block of range
+    :type block_start: int
+    :param block_end: Last block of range, inclusive
+    :type block_end: int
+    :param tx_count: Number of transactions added to the filters
+    :type tx_count: int
+    :param filter_size: Filter size in bits
+    :type filter_size: int
+    :param filter_rounds: Hashing rounds used for filter entries
+    :type filter_rounds: int
+    :param block_filter: Bloom filter for blocks
+    :type block_filter: bytes
+    :param blocktx_filter: Bloom filter for blocks|tx
+    :type blocktx_filter: bytes
+    :raises sqlalchemy.exc.IntegrityError: Range already exists
+    """
+    s = text("INSERT INTO tx_bloom (block_start, block_end, tx_count, filter_size, filter_rounds, block_filter, blocktx_filter) VALUES (:a, :b, :c, :d, :e, :f, :g)")
+    session.execute(s, {
+        'a': block_start,
+        'b': block_end,
+        'c': tx_count,
+        'd': filter_size,
+        'e': filter_rounds,
+        'f': block_filter,
+        'g': blocktx_filter,
+        })
+
+
+def remove_bloom_range(
+        session,
+        block_number,
+        ):
+    """Remove stored bloom filters for any block range that includes the given block.
+
+    :param session: Persistent storage session object
+    :type session: SQLAlchemy session
+    :param block_number: Block number
+    :type block_number: int
+    """
+    s = text("DELETE FROM tx_bloom WHERE block_start <= :a AND block_end >= :a")
+    session.execute(s, {'a': block_number})
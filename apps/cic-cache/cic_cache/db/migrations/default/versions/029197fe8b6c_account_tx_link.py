@@ -0,0 +1,40 @@
+"""Account transaction link
+
+Revision ID: 029197fe8b6c
+Revises: aaf2bdce7d6e
+Create Date: 2026-10-18 09:12:41.301772
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '029197fe8b6c'
+down_revision = 'aaf2bdce7d6e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+            'account_tx',
+            sa.Column('id', sa.Integer, primary_key=True),
+            sa.Column('address', sa.String(42), nullable=False),
+            sa.Column('block_number', sa.Integer, nullable=False),
+            sa.Column('tx_index', sa.Integer, nullable=False),
+            sa.Column('tx_id', sa.Integer, sa.ForeignKey('tx.id'), nullable=False),
+            )
+
+    op.execute("INSERT INTO account_tx (address, block_number, tx_index, tx_id) SELECT sender, block_number, tx_index, id FROM tx UNION SELECT recipient, block_number, tx_index, id FROM tx")
+
+    op.create_index('idx_account_tx_address_block_tx', 'account_tx', ['address', 'block_number', 'tx_index', 'tx_id'])
+    op.create_index('idx_tx_block_tx', 'tx', ['block_number', 'tx_index'])
+    op.create_index('idx_tag_tx_link_tx', 'tag_tx_link', ['tx_id'])
+
+
+def downgrade():
+    op.drop_index('idx_tag_tx_link_tx')
+    op.drop_index('idx_tx_block_tx')
+    op.drop_index('idx_account_tx_address_block_tx')
+    op.drop_table('account_tx')
@@ -0,0 +1,36 @@
+"""Bloom filter ranges
+
+Revision ID: b4a1e2c07f53
+Revises: 029197fe8b6c
+Create Date: 2026-10-18 14:02:19.530118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4a1e2c07f53'
+down_revision = '029197fe8b6c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+            'tx_bloom',
+            sa.Column('id', sa.Integer, primary_key=True),
+            sa.Column('block_start', sa.Integer, nullable=False),
+            sa.Column('block_end', sa.Integer, nullable=False),
+            sa.Column('tx_count', sa.Integer, nullable=False),
+            sa.Column('filter_size', sa.Integer, nullable=False),
+            sa.Column('filter_rounds', sa.Integer, nullable=False),
+            sa.Column('block_filter', sa.LargeBinary, nullable=False),
+            sa.Column('blocktx_filter', sa.LargeBinary, nullable=False),
+            )
+    op.create_index('idx_tx_bloom_block_range', 'tx_bloom', ['block_start', 'block_end'], unique=True)
+
+
+def downgrade():
+    op.drop_index('idx_tx_bloom_block_range')
+    op.drop_table('tx_bloom')
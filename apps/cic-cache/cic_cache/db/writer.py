@@ -0,0 +1,224 @@
+# standard imports
+import logging
+import datetime
+
+# external imports
+from sqlalchemy import text
+from chainsyncer.backend.sql import SQLBackend
+
+# local imports
+from .list import remove_bloom_range
+
+logg = logging.getLogger(__name__)
+
+
+class TransactionWriter:
+    """Buffers transactions and their tags, and writes all of them to storage in a single database transaction.
+
+    The buffer is meant to be flushed at every block boundary of the syncer. Rows for all buffered transactions are written with one multi-row INSERT for each of the tx, account_tx and tag_tx_link tables.
+
+    :param tag_ids: Tag ids, keyed by tuple of tag value and domain
+    :type tag_ids: dict
+    """
+
+    def __init__(self, tag_ids=None):
+        self.tag_ids = tag_ids
+        if self.tag_ids == None:
+            self.tag_ids = {}
+        self.txs = []
+        self.tags = []
+
+
+    def add(
+            self,
+            tx_hash,
+            block_number,
+            tx_index,
+            sender,
+            receiver,
+            source_token,
+            destination_token,
+            from_value,
+            to_value,
+            success,
+            timestamp,
+            tag=None,
+            ):
+        """Add a transaction to the buffer. Arguments are the same as for cic_cache.db.list.add_transaction.
+
+        :param tag: Tag value and domain to tag the transaction with
+        :type tag: tuple
+        :raises ValueError: Unknown tag
+        """
+        if tag != None:
+            try:
+                self.tags.append((tx_hash, self.tag_ids[tag],))
+            except KeyError:
+                raise ValueError('unknown tag name {} domain {}'.format(tag[0], tag[1]))
+
+        self.txs.append({
+            'tx_hash': tx_hash,
+            'block_number': block_number,
+            'tx_index': tx_index,
+            'sender': sender,
+            'recipient': receiver,
+            'source_token': source_token,
+            'destination_token': destination_token,
+            'from_value': from_value,
+            'to_value': to_value,
+            'success': success,
+            'date_block': datetime.datetime.fromtimestamp(timestamp),
+            })
+
+
+    def __len__(self):
+        return len(self.txs)
+
+
+    def flush(self, session):
+        """Write and commit all buffered rows, and empty the buffer.
+
+        :param session: Persistent storage session object
+        :type session: SQLAlchemy session
+        :rtype: int
+        :returns: Number of transactions written
+        """
+        c = self.write(session)
+        if c == 0:
+            return 0
+        session.commit()
+        self.reset()
+        return c
+
+
+    def reset(self):
+        """Empty the buffer.
+        """
+        self.txs = []
+        self.tags = []
+
+
+    def write(self, session):
+        """Write all buffered rows in the current database transaction of the session, without committing.
+
+        The buffer is left unchanged, and must be emptied with reset() once the transaction has been committed.
+
+        :param session: Persistent storage session object
+        :type session: SQLAlchemy session
+        :rtype: int
+        :returns: Number of transactions written
+        """
+        c = len(self.txs)
+        if c == 0:
+            return 0
+
+        values = []
+        params = {}
+        i = 0
+        for tx in self.txs:
+            keys = []
+            for k in tx.keys():
+                param_key = '{}_{}'.format(k, i)
+                keys.append(':' + param_key)
+                params[param_key] = tx[k]
+            values.append('(' + ', '.join(keys) + ')')
+            i += 1
+        s = text("INSERT INTO tx (tx_hash, block_number, tx_index, sender, recipient, source_token, destination_token, from_value, to_value, success, date_block) VALUES {} RETURNING id, tx_hash".format(', '.join(values)))
+        r = session.execute(s, params)
+        tx_ids = {}
+        for v in r:
+            tx_ids[v[1]] = v[0]
+
+        values = []
+        params = {}
+        i = 0
+        for tx in self.txs:
+            addresses = [tx['sender']]
+            if tx['recipient'] != tx['sender']:
+                addresses.append(tx['recipient'])
+            for address in addresses:
+                values.append('(:a_{0}, :b_{0}, :c_{0}, :d_{0})'.format(i))
+                params['a_{}'.format(i)] = address
+                params['b_{}'.format(i)] = tx['block_number']
+                params['c_{}'.format(i)] = tx['tx_index']
+                params['d_{}'.format(i)] = tx_ids[tx['tx_hash']]
+                i += 1
+        s = text("INSERT INTO account_tx (address, block_number, tx_index, tx_id) VALUES {}".format(', '.join(values)))
+        session.execute(s, params)
+
+        if len(self.tags) > 0:
+            values = []
+            params = {}
+            i = 0
+            for (tx_hash, tag_id) in self.tags:
+                values.append('(:a_{0}, :b_{0})'.format(i))
+                params['a_{}'.format(i)] = tag_id
+                params['b_{}'.format(i)] = tx_ids[tx_hash]
+                i += 1
+            s = text("INSERT INTO tag_tx_link (tag_id, tx_id) VALUES {}".format(', '.join(values)))
+            session.execute(s, params)
+
+        block_numbers = set()
+        for tx in self.txs:
+            block_numbers.add(tx['block_number'])
+        for block_number in block_numbers:
+            remove_bloom_range(session, block_number)
+
+        logg.debug('wrote {} transactions with {} tags'.format(c, len(self.tags)))
+
+        return c
+
+
+class BatchSQLBackend(SQLBackend):
+    """Syncer backend that writes the rows buffered by a transaction writer in the same database transaction as the syncer cursor moving past a block.
+
+    The syncer commits its cursor for each transaction within a block, but the rows of a block are only written when the cursor moves to a later block. A syncer resumed from the middle of a block must therefore start over from the first transaction of the block, see rewind().
+
+    If the write fails, the cursor is not moved and the error is raised to the syncer.
+
+    :param chain_spec: Chain spec
+    :type chain_spec: chainlib.chain.ChainSpec
+    :param object_id: Syncer session record id
+    :type object_id: int
+    :param writer: Transaction writer shared by the filters of the syncer
+    :type writer: cic_cache.db.writer.TransactionWriter
+    """
+
+    def __init__(self, chain_spec, object_id, writer):
+        super(BatchSQLBackend, self).__init__(chain_spec, object_id)
+        self.writer = writer
+
+
+    def set(self, block_height, tx_height):
+        session = self.connect()
+        (block_cursor, tx_cursor) = self.db_object.cursor()
+        c = 0
+        try:
+            if block_height > block_cursor:
+                c = self.writer.write(session)
+            pair = self.db_object.set(block_height, tx_height)
+            (filter_state, count, digest) = self.db_object_filter.cursor()
+            self.disconnect()
+        except Exception:
+            session.rollback()
+            session.close()
+            self.db_session = None
+            raise
+        if c > 0:
+            self.writer.reset()
+        return (pair, filter_state,)
+
+
+    def rewind(self):
+        """Move the cursor back to the first transaction of the current block, and clear the filter state.
+
+        Must be called before a syncer is resumed, since the rows of transactions already processed in the current block have not been written.
+        """
+        self.connect()
+        (block_cursor, tx_cursor) = self.db_object.cursor()
+        if tx_cursor > 0:
+            logg.info('rewinding sync session {} from block {} tx {} to start of block'.format(self.object_id, block_cursor, tx_cursor))
+        self.db_object.set(block_cursor, 0)
+        self.db_object_filter.release()
+        self.db_object_filter.clear()
+        self.disconnect()
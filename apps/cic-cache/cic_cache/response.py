@@ -0,0 +1,164 @@
+# standard imports
+import logging
+import threading
+import collections
+
+# external imports
+import redis
+
+logg = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """In-process least-recently-used store for server responses.
+
+    Entries are stored together with the cache height they were generated at. When a lookup is made with a different height, all entries are discarded, since any new transaction in the cache may change the result of a query.
+
+    :param size: Maximum number of entries to keep
+    :type size: int
+    """
+
+    def __init__(self, size=1024):
+        self.size = size
+        self.height = None
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+
+    @staticmethod
+    def normalize(path):
+        """Normalize a request path for use as a cache key.
+
+        :param path: Request path
+        :type path: str
+        :rtype: str
+        :returns: Normalized path
+        """
+        path = '/' + path.strip('/')
+        while '//' in path:
+            path = path.replace('//', '/')
+        return path
+
+
+    def __check_height(self, height):
+        if height != self.height:
+            logg.debug('cache height changed from {} to {}, purging {} entries'.format(self.height, height, len(self.entries)))
+            self.entries.clear()
+            self.height = height
+
+
+    def get(self, path, height):
+        """Retrieve a response.
+
+        :param path: Request path
+        :type path: str
+        :param height: Current cache height
+        :type height: any
+        :rtype: tuple
+        :returns: Mime type and content, or None if not cached
+        """
+        k = ResponseCache.normalize(path)
+        with self.lock:
+            self.__check_height(height)
+            try:
+                v = self.entries.pop(k)
+            except KeyError:
+                self.misses += 1
+                return None
+            self.entries[k] = v
+            self.hits += 1
+            return v
+
+
+    def put(self, path, height, mime_type, content):
+        """Store a response.
+
+        :param path: Request path
+        :type path: str
+        :param height: Cache height the response was generated at
+        :type height: any
+        :param mime_type: Response mime type
+        :type mime_type: str
+        :param content: Response content
+        :type content: bytes
+        """
+        k = ResponseCache.normalize(path)
+        with self.lock:
+            self.__check_height(height)
+            self.entries[k] = (mime_type, content,)
+            self.entries.move_to_end(k)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+
+    def stats(self):
+        """Return cache usage counters.
+
+        :rtype: dict
+        :returns: Usage counters
+        """
+        return {
+            'backend': 'memory',
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self.entries),
+            'size': self.size,
+            'height': self.height,
+                }
+
+
+class RedisResponseCache(ResponseCache):
+    """Response cache shared between server processes through redis.
+
+    Entries are keyed by cache height, and expire after the given ttl. Hit and miss counters are local to the process.
+
+    :param redis_url: Redis connection url
+    :type redis_url: str
+    :param ttl: Entry expiry in seconds
+    :type ttl: int
+    :param prefix: Redis key prefix
+    :type prefix: str
+    """
+
+    def __init__(self, redis_url, ttl=300, prefix='cic-cache:response'):
+        super(RedisResponseCache, self).__init__(size=0)
+        self.redis = redis.Redis.from_url(redis_url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+
+    def __key(self, path, height):
+        return '{}:{}:{}'.format(self.prefix, height, ResponseCache.normalize(path))
+
+
+    def get(self, path, height):
+        r = self.redis.hmget(self.__key(path, height), 'mime_type', 'content')
+        with self.lock:
+            self.height = height
+            if r[0] == None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return (r[0].decode('utf-8'), r[1],)
+
+
+    def put(self, path, height, mime_type, content):
+        k = self.__key(path, height)
+        pipe = self.redis.pipeline()
+        pipe.hset(k, mapping={
+            'mime_type': mime_type,
+            'content': content,
+            })
+        pipe.expire(k, self.ttl)
+        pipe.execute()
+
+
+    def stats(self):
+        o = super(RedisResponseCache, self).stats()
+        o['backend'] = 'redis'
+        o['entries'] = None
+        o['size'] = None
+        o['ttl'] = self.ttl
+        return o
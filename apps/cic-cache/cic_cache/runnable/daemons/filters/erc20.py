@@ -7,7 +7,6 @@ from chainlib.eth.address import (
         )
 from chainlib.eth.error import RequestMismatchException
 from chainlib.status import Status
-from cic_eth_registry.erc20 import ERC20Token
 from cic_eth_registry.error import (
         NotAContractError,
         ContractMismatchError,
@@ -17,15 +16,20 @@ from eth_erc20 import ERC20
 # local imports
 from .base import TagSyncFilter
 from cic_cache import db as cic_cache_db
+from cic_cache.token import TokenCache
 
 logg = logging.getLogger().getChild(__name__)
 
 
 class ERC20TransferFilter(TagSyncFilter):
 
-    def __init__(self, chain_spec):
+    def __init__(self, chain_spec, writer=None, token_cache=None):
         super(ERC20TransferFilter, self).__init__('transfer', domain='erc20')
         self.chain_spec = chain_spec
+        self.writer = writer
+        self.token_cache = token_cache
+        if self.token_cache == None:
+            self.token_cache = TokenCache(chain_spec)
 
 
     # TODO: Verify token in declarator / token index
@@ -33,7 +37,7 @@ class ERC20TransferFilter(TagSyncFilter):
         logg.debug('filter {} {}'.format(block, tx))
         token = None
         try:
-            token = ERC20Token(self.chain_spec, conn, tx.inputs[0])
+            token = self.token_cache.get(conn, tx.inputs[0])
         except NotAContractError:
             logg.debug('not a contract {}'.format(tx.inputs[0]))
             return False
@@ -57,6 +61,23 @@ class ERC20TransferFilter(TagSyncFilter):
 
         logg.debug('matched erc20 token transfer {} ({}) to {} value {}'.format(token.name, token.address, transfer_data[0], transfer_data[1]))
 
+        if self.writer != None:
+            self.writer.add(
+                    tx.hash,
+                    block.number,
+                    tx.index,
+                    to_checksum_address(token_sender),
+                    to_checksum_address(token_recipient),
+                    token.address,
+                    token.address,
+                    token_value,
+                    token_value,
+                    tx.status == Status.SUCCESS,
+                    block.timestamp,
+                    tag=self.tag(),
+                    )
+            return True
+
         cic_cache_db.add_transaction(
                 db_session,
                 tx.hash,
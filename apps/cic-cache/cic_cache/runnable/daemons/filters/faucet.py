@@ -16,12 +16,86 @@ from .base import TagSyncFilter
 logg = logging.getLogger()
 
 
+class FaucetCache:
+    """Remembers the token and amount given by faucet contracts.
+
+    An entry is valid for block_span blocks from the block it was retrieved at. Entries are invalidated before that when the filter sees any other transaction than a faucet give to the faucet contract, since that may change its configuration.
+
+    :param chain_spec: Chain spec the faucets are deployed on
+    :type chain_spec: chainlib.chain.ChainSpec
+    :param sender_address: Address to use as sender for contract queries
+    :type sender_address: str, 0x-hex
+    :param block_span: Number of blocks an entry is valid for
+    :type block_span: int
+    """
+
+    def __init__(self, chain_spec, sender_address=ZERO_ADDRESS, block_span=1000):
+        self.chain_spec = chain_spec
+        self.sender_address = sender_address
+        self.block_span = block_span
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+
+    def get(self, conn, faucet_address, block_number):
+        """Retrieve token and amount for the faucet, querying the network if not cached for the given block.
+
+        :param conn: RPC connection
+        :type conn: chainlib.connection.RPCConnection
+        :param faucet_address: Faucet contract address
+        :type faucet_address: str, 0x-hex
+        :param block_number: Block number the values are needed for
+        :type block_number: int
+        :rtype: tuple
+        :returns: Token address, token amount
+        """
+        k = faucet_address.lower()
+        entry = self.entries.get(k)
+        if entry != None and block_number >= entry[0] and block_number < entry[0] + self.block_span:
+            self.hits += 1
+            return (entry[1], entry[2],)
+
+        self.misses += 1
+        f = Faucet(self.chain_spec)
+        o = f.token(faucet_address, sender_address=self.sender_address)
+        r = conn.do(o)
+        token = f.parse_token(r)
+
+        o = f.token_amount(faucet_address, sender_address=self.sender_address)
+        r = conn.do(o)
+        token_value = f.parse_token_amount(r)
+
+        self.entries[k] = (block_number, token, token_value,)
+        return (token, token_value,)
+
+
+    def invalidate(self, faucet_address):
+        """Remove the cached values for the faucet, if any.
+
+        :param faucet_address: Faucet contract address
+        :type faucet_address: str, 0x-hex
+        :rtype: bool
+        :returns: True if an entry was removed
+        """
+        k = faucet_address.lower()
+        if self.entries.get(k) == None:
+            return False
+        logg.debug('invalidating faucet cache for {}'.format(faucet_address))
+        del self.entries[k]
+        return True
+
+
 class FaucetFilter(TagSyncFilter):
 
-    def __init__(self, chain_spec, sender_address=ZERO_ADDRESS):
+    def __init__(self, chain_spec, sender_address=ZERO_ADDRESS, writer=None, faucet_cache=None):
         super(FaucetFilter, self).__init__('give_to', domain='faucet')
         self.chain_spec = chain_spec
         self.sender_address = sender_address
+        self.writer = writer
+        self.faucet_cache = faucet_cache
+        if self.faucet_cache == None:
+            self.faucet_cache = FaucetCache(chain_spec, sender_address=sender_address)
 
 
     def filter(self, conn, block, tx, db_session=None):
@@ -31,21 +105,32 @@ class FaucetFilter(TagSyncFilter):
             return False
         logg.debug('data {}'.format(data))
         if Faucet.method_for(data[:8]) == None:
+            if len(tx.inputs) > 0 and tx.inputs[0] != None:
+                self.faucet_cache.invalidate(tx.inputs[0])
             return False
 
         token_sender = tx.inputs[0]
         token_recipient = data[64+8-40:]
         logg.debug('token recipient {}'.format(token_recipient))
  
-        f = Faucet(self.chain_spec)
-        o = f.token(token_sender, sender_address=self.sender_address)
-        r = conn.do(o)
-        token = f.parse_token(r)
+        (token, token_value,) = self.faucet_cache.get(conn, token_sender, block.number)
 
-        f = Faucet(self.chain_spec)
-        o = f.token_amount(token_sender, sender_address=self.sender_address)
-        r = conn.do(o)
-        token_value = f.parse_token_amount(r)
+        if self.writer != None:
+            self.writer.add(
+                    tx.hash,
+                    block.number,
+                    tx.index,
+                    to_checksum_address(token_sender),
+                    to_checksum_address(token_recipient),
+                    token,
+                    token,
+                    token_value,
+                    token_value,
+                    tx.status == Status.SUCCESS,
+                    block.timestamp,
+                    tag=self.tag(),
+                    )
+            return True
 
         cic_cache_db.add_transaction(
                 db_session,
@@ -15,6 +15,7 @@ from chainlib.encode import TxHexNormalizer
 from cic_cache.cache import (
         BloomCache,
         DataCache,
+        encode_cursor,
     )
 
 logg = logging.getLogger(__name__)
@@ -24,9 +25,15 @@ re_transactions_all_bloom = r'/tx/?(\d+)?/?(\d+)?/?(\d+)?/?(\d+)?/?'
 re_transactions_account_bloom = r'/tx/user/((0x)?[a-fA-F0-9]+)(/(\d+)(/(\d+))?)?/?'
 re_transactions_all_data = r'/txa/?(\d+)?/?(\d+)?/?(\d+)?/?(\d+)?/?'
 re_transactions_account_data = r'/txa/user/((0x)?[a-fA-F0-9]+)(/(\d+)(/(\d+))?)?/?'
+re_transactions_range_bloom = r'/tx/range/(\d+)/(\d+)/?'
+re_transactions_all_bloom_cursor = r'/tx/cursor/([a-fA-F0-9]{16})(/(\d+))?/?'
+re_transactions_account_bloom_cursor = r'/tx/user/((0x)?[a-fA-F0-9]+)/cursor/([a-fA-F0-9]{16})(/(\d+))?/?'
+re_transactions_all_data_cursor = r'/txa/cursor/([a-fA-F0-9]{16})(/(\d+))?/?'
+re_transactions_account_data_cursor = r'/txa/user/((0x)?[a-fA-F0-9]+)/cursor/([a-fA-F0-9]{16})(/(\d+))?/?'
 re_default_limit = r'/defaultlimit/?'
 
 DEFAULT_LIMIT = 100
+DEFAULT_STREAM_CHUNK_SIZE = 100
 
 tx_normalize = TxHexNormalizer()
 
@@ -48,6 +55,25 @@ def parse_query_account(r):
     return (address, offset, limit,)
 
 
+# r is an re.Match
+def parse_query_cursor(r, account=False):
+    address = None
+    cursor_index = 1
+    if account:
+        address = strip_0x(r[1])
+        cursor_index = 3
+    cursor = r[cursor_index]
+    limit = DEFAULT_LIMIT
+    if r[cursor_index + 2] != None:
+        limit = int(r[cursor_index + 2])
+        if limit == 0:
+            limit = DEFAULT_LIMIT
+
+    logg.debug('cursor query is address {} cursor {} limit {}'.format(address, cursor, limit))
+
+    return (address, cursor, limit,)
+
+
 # r is an re.Match
 def parse_query_any(r):
     limit = DEFAULT_LIMIT
@@ -71,6 +97,95 @@ def parse_query_any(r):
     return (offset, limit, block_offset, block_end,)
 
 
+def parse_stream(env):
+    """Determine whether the client requests a streamed response.
+
+    A streamed response is newline-delimited JSON if the Accept header is application/x-ndjson, or a JSON document sent in chunks if the X-CIC-Cache-Stream header is set.
+
+    :param env: WSGI environment
+    :type env: dict
+    :rtype: str
+    :returns: "ndjson", "json" or None if the response should not be streamed
+    """
+    if 'application/x-ndjson' in env.get('HTTP_ACCEPT', ''):
+        return 'ndjson'
+    if env.get('HTTP_X_CIC_CACHE_STREAM'):
+        return 'json'
+    return None
+
+
+def stream_transactions_data(txs, limit, oldest, stream, chunk_size=DEFAULT_STREAM_CHUNK_SIZE):
+    """Serialize transactions as they are retrieved from the database.
+
+    For json, the document has the same fields as the unstreamed response. For ndjson, each line is a transaction, and the last line holds the low, high and next fields.
+
+    :param txs: Transactions
+    :type txs: generator
+    :param limit: Max number of transactions in query
+    :type limit: int
+    :param oldest: Transactions are in ascending order
+    :type oldest: bool
+    :param stream: Stream format, "json" or "ndjson"
+    :type stream: str
+    :param chunk_size: Number of transactions to serialize in each chunk
+    :type chunk_size: int
+    :rtype: tuple
+    :returns: Mime type, generator of content chunks
+    """
+    if limit == 0:
+        limit = DEFAULT_LIMIT
+
+    mime_type = 'application/json'
+    if stream == 'ndjson':
+        mime_type = 'application/x-ndjson'
+
+    def chunks():
+        lowest_block = -1
+        highest_block = -1
+        c = 0
+        last = None
+        buf = []
+        if stream == 'json':
+            yield b'{"data": ['
+        for tx in txs:
+            if highest_block == -1:
+                highest_block = tx['block_number']
+                lowest_block = tx['block_number']
+            else:
+                if oldest:
+                    highest_block = tx['block_number']
+                else:
+                    lowest_block = tx['block_number']
+            tx['date_block'] = tx['date_block'].timestamp()
+            v = json.dumps(tx)
+            if stream == 'ndjson':
+                v += '\n'
+            elif c > 0:
+                v = ', ' + v
+            buf.append(v)
+            c += 1
+            last = tx
+            if len(buf) == chunk_size:
+                yield ''.join(buf).encode('utf-8')
+                buf = []
+
+        next_cursor = None
+        if c > 0 and c == limit:
+            next_cursor = encode_cursor(last['block_number'], last['tx_index'])
+        o = {
+            'low': lowest_block,
+            'high': highest_block,
+            'next': next_cursor,
+            }
+        if stream == 'ndjson':
+            buf.append(json.dumps(o) + '\n')
+        else:
+            buf.append('], ' + json.dumps(o)[1:])
+        yield ''.join(buf).encode('utf-8')
+
+    return (mime_type, chunks(),)
+
+
 def process_default_limit(session, env):
     r = re.match(re_default_limit, env.get('PATH_INFO'))
     if not r:
@@ -80,15 +195,20 @@ def process_default_limit(session, env):
 
 
 def process_transactions_account_bloom(session, env):
-    r = re.match(re_transactions_account_bloom, env.get('PATH_INFO'))
-    if not r:
-        return None
+    cursor = None
+    offset = 0
+    r = re.match(re_transactions_account_bloom_cursor, env.get('PATH_INFO'))
+    if r:
+        (address, cursor, limit,) = parse_query_cursor(r, account=True)
+    else:
+        r = re.match(re_transactions_account_bloom, env.get('PATH_INFO'))
+        if not r:
+            return None
+        (address, offset, limit,) = parse_query_account(r)
     logg.debug('match account bloom')
 
-    (address, offset, limit,) = parse_query_account(r)
-
     c = BloomCache(session)
-    (lowest_block, highest_block, bloom_filter_block, bloom_filter_tx) = c.load_transactions_account(address, offset, limit)
+    (lowest_block, highest_block, bloom_filter_block, bloom_filter_tx, next_cursor, fp_rate) = c.load_transactions_account(address, offset, limit, cursor=cursor)
 
     o = {
         'alg': 'sha256',
@@ -96,7 +216,9 @@ def process_transactions_account_bloom(session, env):
         'high': highest_block,
         'block_filter': base64.b64encode(bloom_filter_block).decode('utf-8'),
         'blocktx_filter': base64.b64encode(bloom_filter_tx).decode('utf-8'),
-        'filter_rounds': 3,
+        'filter_rounds': c.rounds,
+        'fp_rate': fp_rate,
+        'next': next_cursor,
             }
 
     j = json.dumps(o)
@@ -104,16 +226,59 @@ def process_transactions_account_bloom(session, env):
     return ('application/json', j.encode('utf-8'),)
 
 
-def process_transactions_all_bloom(session, env):
-    r = re.match(re_transactions_all_bloom, env.get('PATH_INFO'))
+# r is an re.Match
+def parse_query_range(r):
+    block_offset = int(r[1])
+    block_end = int(r[2])
+    if block_end < block_offset:
+        raise ValueError('cart before the horse, dude')
+
+    logg.debug('range query is block_offset {} block_end {}'.format(block_offset, block_end))
+
+    return (block_offset, block_end,)
+
+
+def process_transactions_range_bloom(session, env):
+    r = re.match(re_transactions_range_bloom, env.get('PATH_INFO'))
     if not r:
         return None
-    logg.debug('match all bloom')
+    (block_offset, block_end,) = parse_query_range(r)
+    logg.debug('match range bloom')
 
-    (limit, offset, block_offset, block_end,) = parse_query_any(r)
+    c = BloomCache(session)
+    (lowest_block, highest_block, bloom_filter_block, bloom_filter_tx, next_cursor, fp_rate) = c.load_transactions_range(block_offset, block_end)
+
+    o = {
+        'alg': 'sha256',
+        'low': lowest_block,
+        'high': highest_block,
+        'block_filter': base64.b64encode(bloom_filter_block).decode('utf-8'),
+        'blocktx_filter': base64.b64encode(bloom_filter_tx).decode('utf-8'),
+        'filter_rounds': c.rounds,
+        'fp_rate': fp_rate,
+        'next': next_cursor,
+            }
+
+    j = json.dumps(o)
+
+    return ('application/json', j.encode('utf-8'),)
+
+
+def process_transactions_all_bloom(session, env):
+    cursor = None
+    offset = 0
+    r = re.match(re_transactions_all_bloom_cursor, env.get('PATH_INFO'))
+    if r:
+        (address, cursor, limit,) = parse_query_cursor(r)
+    else:
+        r = re.match(re_transactions_all_bloom, env.get('PATH_INFO'))
+        if not r:
+            return None
+        (limit, offset, block_offset, block_end,) = parse_query_any(r)
+    logg.debug('match all bloom')
 
     c = BloomCache(session)
-    (lowest_block, highest_block, bloom_filter_block, bloom_filter_tx) = c.load_transactions(offset, limit)
+    (lowest_block, highest_block, bloom_filter_block, bloom_filter_tx, next_cursor, fp_rate) = c.load_transactions(offset, limit, cursor=cursor)
 
     o = {
         'alg': 'sha256',
@@ -121,7 +286,9 @@ def process_transactions_all_bloom(session, env):
         'high': highest_block,
         'block_filter': base64.b64encode(bloom_filter_block).decode('utf-8'),
         'blocktx_filter': base64.b64encode(bloom_filter_tx).decode('utf-8'),
-        'filter_rounds': 3,
+        'filter_rounds': c.rounds,
+        'fp_rate': fp_rate,
+        'next': next_cursor,
             }
 
     j = json.dumps(o)
@@ -130,19 +297,31 @@ def process_transactions_all_bloom(session, env):
 
 
 def process_transactions_all_data(session, env):
-    r = re.match(re_transactions_all_data, env.get('PATH_INFO'))
-    if not r:
-        return None
+    cursor = None
+    offset = 0
+    block_offset = None
+    block_end = None
+    r = re.match(re_transactions_all_data_cursor, env.get('PATH_INFO'))
+    if r:
+        (address, cursor, limit,) = parse_query_cursor(r)
+    else:
+        r = re.match(re_transactions_all_data, env.get('PATH_INFO'))
+        if not r:
+            return None
+        (offset, limit, block_offset, block_end) = parse_query_any(r)
     #if env.get('HTTP_X_CIC_CACHE_MODE') != 'all':
     #    return None
     logg.debug('match all data')
 
     logg.debug('got data request {}'.format(env))
 
-    (offset, limit, block_offset, block_end) = parse_query_any(r)
-
     c = DataCache(session)
-    (lowest_block, highest_block, tx_cache) = c.load_transactions_with_data(offset, limit, block_offset, block_end, oldest=True) # oldest needs to be settable
+    stream = parse_stream(env)
+    if stream != None:
+        txs = c.stream_transactions_with_data(offset, limit, block_offset, block_end, oldest=True, cursor=cursor)
+        return stream_transactions_data(txs, limit, True, stream)
+
+    (lowest_block, highest_block, tx_cache, next_cursor) = c.load_transactions_with_data(offset, limit, block_offset, block_end, oldest=True, cursor=cursor) # oldest needs to be settable
 
     for r in tx_cache:
         r['date_block'] = r['date_block'].timestamp()
@@ -151,6 +330,7 @@ def process_transactions_all_data(session, env):
         'low': lowest_block,
         'high': highest_block,
         'data': tx_cache,
+        'next': next_cursor,
     }
 
     
@@ -160,17 +340,27 @@ def process_transactions_all_data(session, env):
 
 
 def process_transactions_account_data(session, env):
-    r = re.match(re_transactions_account_data, env.get('PATH_INFO'))
-    if not r:
-        return None
+    cursor = None
+    offset = 0
+    r = re.match(re_transactions_account_data_cursor, env.get('PATH_INFO'))
+    if r:
+        (address, cursor, limit,) = parse_query_cursor(r, account=True)
+    else:
+        r = re.match(re_transactions_account_data, env.get('PATH_INFO'))
+        if not r:
+            return None
+        (address, offset, limit,) = parse_query_account(r)
     logg.debug('match account data')
     #if env.get('HTTP_X_CIC_CACHE_MODE') != 'all':
     #    return None
 
-    (address, offset, limit,) = parse_query_account(r)
-
     c = DataCache(session)
-    (lowest_block, highest_block, tx_cache) = c.load_transactions_account_with_data(address, offset, limit)
+    stream = parse_stream(env)
+    if stream != None:
+        txs = c.stream_transactions_account_with_data(address, offset, limit, cursor=cursor)
+        return stream_transactions_data(txs, limit, False, stream)
+
+    (lowest_block, highest_block, tx_cache, next_cursor) = c.load_transactions_account_with_data(address, offset, limit, cursor=cursor)
 
     for r in tx_cache:
         r['date_block'] = r['date_block'].timestamp()
@@ -179,6 +369,7 @@ def process_transactions_account_data(session, env):
         'low': lowest_block,
         'high': highest_block,
         'data': tx_cache,
+        'next': next_cursor,
     }
 
     j = json.dumps(o)
@@ -3,20 +3,31 @@ import os
 import logging
 import argparse
 import base64
+import json
+import re
 
 # external imports
 import confini
 
 # local imports
 import cic_cache.cli
-from cic_cache.db import dsn_from_config
+from cic_cache.db import (
+        dsn_from_config,
+        get_cache_height,
+        )
 from cic_cache.db.models.base import SessionBase
+from cic_cache.response import (
+        ResponseCache,
+        RedisResponseCache,
+        )
 from cic_cache.runnable.daemons.query import (
         process_default_limit,
         process_transactions_account_bloom,
         process_transactions_account_data,
         process_transactions_all_bloom,
         process_transactions_all_data,
+        process_transactions_range_bloom,
+        parse_stream,
         )
 import cic_cache.cli
 
@@ -37,30 +48,78 @@ config = cic_cache.cli.Config.from_args(args, arg_flags, local_arg_flags)
 dsn = dsn_from_config(config, 'cic_cache')
 SessionBase.connect(dsn, config.true('DATABASE_DEBUG'))
 
+# set up response cache
+re_cache_stats = r'/cachestats/?$'
+response_cache = None
+if config.get('SERVER_CACHE_REDIS_URL'):
+    response_cache = RedisResponseCache(config.get('SERVER_CACHE_REDIS_URL'), ttl=int(config.get('SERVER_CACHE_TTL')))
+    logg.info('using redis response cache at {}'.format(config.get('SERVER_CACHE_REDIS_URL')))
+elif int(config.get('SERVER_CACHE_SIZE', 0)) > 0:
+    response_cache = ResponseCache(size=int(config.get('SERVER_CACHE_SIZE')))
+    logg.info('using in-process response cache size {}'.format(config.get('SERVER_CACHE_SIZE')))
+
+
+def stream_content(session, content):
+    try:
+        for v in content:
+            yield v
+    finally:
+        session.close()
+
 
 # uwsgi application
 def application(env, start_response):
 
     headers = []
     content = b''
+    path = env.get('PATH_INFO')
+
+    if response_cache != None and re.match(re_cache_stats, path):
+        content = json.dumps(response_cache.stats()).encode('utf-8')
+        headers.append(('Content-Length', str(len(content))),)
+        headers.append(('Content-Type', 'application/json',))
+        start_response('200 OK', headers)
+        return [content]
 
     session = SessionBase.create_session()
-    for handler in [
-            process_transactions_account_data,
-            process_transactions_account_bloom,
-            process_transactions_all_data,
-            process_transactions_all_bloom,
-            process_default_limit,
-            ]:
-        r = None
-        try:
-            r = handler(session, env)
-        except ValueError as e:
-            start_response('400 {}'.format(str(e)))
-            return []
-        if r != None:
-            (mime_type, content) = r
-            break
+
+    stream = parse_stream(env)
+
+    height = None
+    r = None
+    if response_cache != None and stream == None:
+        height = get_cache_height(session)
+        r = response_cache.get(path, height)
+
+    if r != None:
+        (mime_type, content) = r
+    else:
+        for handler in [
+                process_transactions_account_data,
+                process_transactions_account_bloom,
+                process_transactions_all_data,
+                process_transactions_range_bloom,
+                process_transactions_all_bloom,
+                process_default_limit,
+                ]:
+            try:
+                r = handler(session, env)
+            except ValueError as e:
+                session.close()
+                start_response('400 {}'.format(str(e)))
+                return []
+            if r != None:
+                (mime_type, content) = r
+                if response_cache != None and stream == None:
+                    response_cache.put(path, height, mime_type, content)
+                break
+
+    if not isinstance(content, bytes):
+        headers.append(('Access-Control-Allow-Origin', '*',))
+        headers.append(('Content-Type', mime_type,))
+        start_response('200 OK', headers)
+        return stream_content(session, content)
+
     session.close()
 
     headers.append(('Content-Length', str(len(content))),)
@@ -6,6 +6,7 @@ import time
 import argparse
 import sys
 import re
+import multiprocessing
 
 # external imports
 import sqlalchemy
@@ -30,7 +31,15 @@ import cic_cache.cli
 from cic_cache.db import (
         dsn_from_config,
         add_tag,
+        get_tag_ids,
         )
+from cic_cache.db.writer import TransactionWriter
+from cic_cache.sync import (
+        history_ranges,
+        create_syncer,
+        sync_history,
+        )
+from cic_cache.token import TokenCache
 from cic_cache.runnable.daemons.filters import (
         ERC20TransferFilter,
         FaucetFilter,
@@ -78,6 +87,65 @@ def register_filter_tags(filters, session):
         except sqlalchemy.exc.IntegrityError:
             session.rollback()
             logg.debug('already have tag name "{}" domain "{}"'.format(tag[0], tag[1]))
+    return get_tag_ids(session)
+
+
+def setup_filters():
+    """Create the filters for a syncer, and make sure their tags exist in storage.
+
+    :rtype: tuple
+    :returns: Filters, transaction writer (None if batch writes are not enabled)
+    """
+    writer = None
+    if config.true('SYNCER_BATCH_WRITE'):
+        writer = TransactionWriter()
+        logg.info('writing transactions in batches per block')
+
+    token_cache = TokenCache(chain_spec)
+    erc20_transfer_filter = ERC20TransferFilter(chain_spec, writer=writer, token_cache=token_cache)
+    faucet_filter = FaucetFilter(chain_spec, writer=writer)
+
+    filters = [
+        erc20_transfer_filter,
+        faucet_filter,
+            ]
+
+    session = SessionBase.create_session()
+    tag_ids = register_filter_tags(filters, session)
+    session.close()
+    if writer != None:
+        writer.tag_ids = tag_ids
+
+    return (filters, writer,)
+
+
+def init_history_worker():
+    SessionBase.connect(dsn, debug=config.true('DATABASE_DEBUG'))
+
+
+def sync_history_worker(object_id):
+    """Run a history syncer for a single persisted sync session to completion.
+
+    Executed in a worker process, with its own database engine, rpc connection and filters.
+
+    :param object_id: Syncer backend object id
+    :type object_id: int
+    :rtype: tuple
+    :returns: Syncer backend object id, syncer state at completion
+    """
+    conn = RPCConnection.connect(chain_spec, 'default')
+    logg.info('history worker {} syncing session {}'.format(os.getpid(), object_id))
+    (filters, writer) = setup_filters()
+    r = sync_history(chain_spec, object_id, cic_cache.cli.chain_interface, conn, filters, writer=writer, interval=int(config.get('SYNCER_LOOP_INTERVAL')))
+    return (object_id, r,)
+
+
+def sync_history_done(r):
+    sys.stderr.write("history sync session {} done at block {}\n".format(r[0], r[1]))
+
+
+def sync_history_error(e):
+    logg.error('history sync failed, unfinished ranges will be resumed on next start: {}'.format(e))
 
 
 def main():
@@ -90,6 +158,14 @@ def main():
 
     logg.debug('current block height {}'.format(block_offset))
 
+    trusted_addresses_src = config.get('CIC_TRUST_ADDRESS')
+    if trusted_addresses_src == None:
+        logg.critical('At least one trusted address must be declared in CIC_TRUST_ADDRESS')
+        sys.exit(1)
+    trusted_addresses = trusted_addresses_src.split(',')
+    for address in trusted_addresses:
+        logg.info('using trusted address {}'.format(address))
+
     syncers = []
 
     syncer_backends = SQLBackend.resume(chain_spec, block_offset)
@@ -100,43 +176,36 @@ def main():
         if config.get('SYNCER_NO_HISTORY'):
             initial_block_start = initial_block_offset
             initial_block_offset += 1
-        syncer_backends.append(SQLBackend.initial(chain_spec, initial_block_offset, start_block_height=initial_block_start))
-        logg.info('found no backends to resume, adding initial sync from history start {} end {}'.format(initial_block_start, initial_block_offset))
+        chunk_size = int(config.get('SYNCER_HISTORY_CHUNK_SIZE'))
+        # the history syncer target is inclusive, so chunks must not share their boundary blocks
+        for (chunk_start, chunk_end) in history_ranges(initial_block_start, initial_block_offset, chunk_size):
+            syncer_backends.append(SQLBackend.initial(chain_spec, chunk_end, start_block_height=chunk_start))
+        logg.info('found no backends to resume, adding {} initial syncs from history start {} end {}'.format(len(syncer_backends), initial_block_start, initial_block_offset))
     else:
         for syncer_backend in syncer_backends:
             logg.info('resuming sync session {}'.format(syncer_backend))
 
-    for syncer_backend in syncer_backends:
-        syncers.append(HistorySyncer(syncer_backend, cic_cache.cli.chain_interface))
-
-    syncer_backend = SQLBackend.live(chain_spec, block_offset+1)
-    syncers.append(HeadSyncer(syncer_backend, cic_cache.cli.chain_interface))
-
-    trusted_addresses_src = config.get('CIC_TRUST_ADDRESS')
-    if trusted_addresses_src == None:
-        logg.critical('At least one trusted address must be declared in CIC_TRUST_ADDRESS')
-        sys.exit(1)
-    trusted_addresses = trusted_addresses_src.split(',')
-    for address in trusted_addresses:
-        logg.info('using trusted address {}'.format(address))
-
-    erc20_transfer_filter = ERC20TransferFilter(chain_spec)
-    faucet_filter = FaucetFilter(chain_spec)
+    (filters, writer) = setup_filters()
 
-    filters = [
-        erc20_transfer_filter,
-        faucet_filter,
-            ]
+    history_workers = int(config.get('SYNCER_HISTORY_WORKERS'))
+    if history_workers > 0:
+        # worker processes must not share pooled connections with the parent
+        SessionBase.engine.dispose()
+        pool = multiprocessing.Pool(history_workers, initializer=init_history_worker)
+        for syncer_backend in syncer_backends:
+            pool.apply_async(sync_history_worker, (syncer_backend.object_id,), callback=sync_history_done, error_callback=sync_history_error)
+        pool.close()
+        logg.info('started {} history syncs in {} worker processes'.format(len(syncer_backends), history_workers))
+    else:
+        for syncer_backend in syncer_backends:
+            syncers.append(create_syncer(HistorySyncer, syncer_backend, chain_spec, cic_cache.cli.chain_interface, filters, writer=writer))
 
-    session = SessionBase.create_session()
-    register_filter_tags(filters, session)
-    session.close()
+    syncer_backend = SQLBackend.live(chain_spec, block_offset+1)
+    syncers.append(create_syncer(HeadSyncer, syncer_backend, chain_spec, cic_cache.cli.chain_interface, filters, writer=writer))
 
     i = 0
     for syncer in syncers:
         logg.debug('running syncer index {}'.format(i))
-        for f in filters:
-            syncer.add_filter(f)
         r = syncer.loop(int(config.get('SYNCER_LOOP_INTERVAL')), rpc)
         sys.stderr.write("sync {} done at block {}\n".format(syncer, r))
 
@@ -0,0 +1,97 @@
+# standard imports
+import logging
+
+# external imports
+from chainsyncer.backend.sql import SQLBackend
+from chainsyncer.driver.history import HistorySyncer
+
+# local imports
+from cic_cache.db.writer import BatchSQLBackend
+
+logg = logging.getLogger()
+
+
+def history_ranges(block_start, block_end, chunk_size=0):
+    """Split the block range of a history sync into contiguous, non-overlapping chunks.
+
+    Both ends of a range are inclusive, as is the target of the history syncer. The chunks together cover exactly the blocks of the unchunked range, and each block is in exactly one chunk.
+
+    A sync session must span at least two blocks, so a single block left over at the end is added to the last chunk.
+
+    :param block_start: First block to sync
+    :type block_start: int
+    :param block_end: Last block to sync
+    :type block_end: int
+    :param chunk_size: Number of blocks per chunk, or 0 for a single range
+    :type chunk_size: int
+    :raises ValueError: Chunk size of a single block
+    :rtype: list of tuples
+    :returns: First and last block of each chunk, in order
+    """
+    if chunk_size <= 0:
+        return [(block_start, block_end,)]
+    if chunk_size == 1:
+        raise ValueError('history chunks must span at least two blocks')
+    r = []
+    for chunk_start in range(block_start, block_end + 1, chunk_size):
+        chunk_end = min(chunk_start + chunk_size - 1, block_end)
+        if chunk_start == chunk_end and len(r) > 0:
+            r[-1] = (r[-1][0], chunk_end,)
+            continue
+        r.append((chunk_start, chunk_end,))
+    return r
+
+
+def create_syncer(syncer_class, syncer_backend, chain_spec, chain_interface, filters, writer=None):
+    """Create a syncer for a persisted sync session, and add the given filters to it.
+
+    If a writer is given, the rows it buffers are written in the same database transaction as the syncer cursor moving past their block. The session is then rewound to the start of its current block, so that a block interrupted before its rows were written is processed again.
+
+    :param syncer_class: Syncer implementation
+    :type syncer_class: chainsyncer.driver.base.Syncer
+    :param syncer_backend: Syncer backend of the session
+    :type syncer_backend: chainsyncer.backend.sql.SQLBackend
+    :param chain_spec: Chain spec
+    :type chain_spec: chainlib.chain.ChainSpec
+    :param chain_interface: Chain interface
+    :type chain_interface: chainlib.interface.ChainInterface
+    :param filters: Filters to apply to each transaction
+    :type filters: list
+    :param writer: Transaction writer used by the filters, or None
+    :type writer: cic_cache.db.writer.TransactionWriter
+    :rtype: chainsyncer.driver.base.Syncer
+    :returns: Syncer
+    """
+    if writer != None:
+        syncer_backend = BatchSQLBackend(chain_spec, syncer_backend.object_id, writer)
+        syncer_backend.rewind()
+    syncer = syncer_class(syncer_backend, chain_interface)
+    for f in filters:
+        syncer.add_filter(f)
+    return syncer
+
+
+def sync_history(chain_spec, object_id, chain_interface, conn, filters, writer=None, interval=1):
+    """Run a history syncer for a single persisted sync session to completion.
+
+    :param chain_spec: Chain spec
+    :type chain_spec: chainlib.chain.ChainSpec
+    :param object_id: Syncer backend object id
+    :type object_id: int
+    :param chain_interface: Chain interface
+    :type chain_interface: chainlib.interface.ChainInterface
+    :param conn: RPC connection
+    :type conn: chainlib.connection.RPCConnection
+    :param filters: Filters to apply to each transaction
+    :type filters: list
+    :param writer: Transaction writer used by the filters, or None
+    :type writer: cic_cache.db.writer.TransactionWriter
+    :param interval: Syncer loop interval in seconds
+    :type interval: int
+    :rtype: tuple
+    :returns: Syncer state at completion
+    """
+    syncer_backend = SQLBackend(chain_spec, object_id)
+    logg.info('syncing history session {}'.format(syncer_backend))
+    syncer = create_syncer(HistorySyncer, syncer_backend, chain_spec, chain_interface, filters, writer=writer)
+    return syncer.loop(interval, conn)
@@ -12,7 +12,7 @@ celery_app = celery.current_app
 
 
 @celery_app.task(bind=True)
-def tx_filter(self, offset, limit, address=None, oldest=False, encoding='hex'):
+def tx_filter(self, offset, limit, address=None, oldest=False, encoding='hex', cursor=None):
     queue = self.request.delivery_info.get('routing_key')
 
     session = SessionBase.create_session()
@@ -20,9 +20,9 @@ def tx_filter(self, offset, limit, address=None, oldest=False, encoding='hex'):
     c = BloomCache(session)
     b = None
     if address == None:
-        (lowest_block, highest_block, bloom_filter_block, bloom_filter_tx) = c.load_transactions(offset, limit, oldest=oldest)
+        (lowest_block, highest_block, bloom_filter_block, bloom_filter_tx, next_cursor, fp_rate) = c.load_transactions(offset, limit, oldest=oldest, cursor=cursor)
     else:
-        (lowest_block, highest_block, bloom_filter_block, bloom_filter_tx) = c.load_transactions_account(address, offset, limit, oldest=oldest)
+        (lowest_block, highest_block, bloom_filter_block, bloom_filter_tx, next_cursor, fp_rate) = c.load_transactions_account(address, offset, limit, oldest=oldest, cursor=cursor)
 
     session.close()
 
@@ -32,23 +32,25 @@ def tx_filter(self, offset, limit, address=None, oldest=False, encoding='hex'):
         'high': highest_block,
         'block_filter': bloom_filter_block.hex(), 
         'blocktx_filter': bloom_filter_tx.hex(),
-        'filter_rounds': 3,
+        'filter_rounds': c.rounds,
+        'fp_rate': fp_rate,
+        'next': next_cursor,
             }
 
     return o
 
 
 @celery_app.task(bind=True)
-def tx_filter_content(self, offset, limit, address=None, block_offset=None, block_limit=None, oldest=False, encoding='hex'):
+def tx_filter_content(self, offset, limit, address=None, block_offset=None, block_limit=None, oldest=False, encoding='hex', cursor=None):
     session = SessionBase.create_session()
 
     c = DataCache(session)
     b = None
     if address == None:
-        (lowest_block, highest_block, tx_cache) = c.load_transactions_with_data(offset, limit, block_offset=block_offset, block_limit=block_limit, oldest=oldest)
+        (lowest_block, highest_block, tx_cache, next_cursor) = c.load_transactions_with_data(offset, limit, block_offset=block_offset, block_limit=block_limit, oldest=oldest, cursor=cursor)
     else:
-        (lowest_block, highest_block, tx_cache) = c.load_transactions_account_with_data_index(address, offset, limit, block_offset=block_offset, block_limit=block_limit)
+        (lowest_block, highest_block, tx_cache, next_cursor) = c.load_transactions_account_with_data(address, offset, limit, block_offset=block_offset, block_limit=block_limit, oldest=oldest, cursor=cursor)
 
     session.close()
 
-    return (lowest_block, highest_block, tx_cache,)
+    return (lowest_block, highest_block, tx_cache, next_cursor,)
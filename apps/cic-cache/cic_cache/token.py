@@ -0,0 +1,92 @@
+# standard imports
+import logging
+import time
+import collections
+
+# external imports
+from cic_eth_registry.erc20 import ERC20Token
+from cic_eth_registry.error import (
+        NotAContractError,
+        ContractMismatchError,
+        )
+
+logg = logging.getLogger(__name__)
+
+
+class TokenCache:
+    """Bounded, expiring store of ERC20 token details for a single chain.
+
+    Lookups that fail because the address is not a contract, or is not an ERC20 contract, are cached too, and the error is raised again on subsequent lookups until the entry expires.
+
+    :param chain_spec: Chain spec the tokens are deployed on
+    :type chain_spec: chainlib.chain.ChainSpec
+    :param size: Maximum number of entries to keep
+    :type size: int
+    :param ttl: Seconds to keep token details
+    :type ttl: int
+    :param negative_ttl: Seconds to keep failed lookups
+    :type negative_ttl: int
+    """
+
+    def __init__(self, chain_spec, size=1024, ttl=3600, negative_ttl=600):
+        self.chain_spec = chain_spec
+        self.size = size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+
+    def __put(self, k, v, ttl):
+        self.entries[k] = (time.time() + ttl, v,)
+        self.entries.move_to_end(k)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+
+    def get(self, conn, address):
+        """Retrieve token details, querying the network if not cached.
+
+        :param conn: RPC connection
+        :type conn: chainlib.connection.RPCConnection
+        :param address: Token contract address
+        :type address: str, 0x-hex
+        :raises NotAContractError: Address is not a contract
+        :raises ContractMismatchError: Contract is not an ERC20 token
+        :rtype: cic_eth_registry.erc20.ERC20Token
+        :returns: Token
+        """
+        k = address.lower()
+        entry = self.entries.get(k)
+        if entry != None and entry[0] > time.time():
+            self.entries.move_to_end(k)
+            self.hits += 1
+            if isinstance(entry[1], Exception):
+                raise entry[1].with_traceback(None)
+            return entry[1]
+
+        self.misses += 1
+        try:
+            token = ERC20Token(self.chain_spec, conn, address)
+        except (NotAContractError, ContractMismatchError) as e:
+            self.__put(k, e, self.negative_ttl)
+            raise e
+
+        logg.debug('cached token {} ({})'.format(token.name, token.address))
+        self.__put(k, token, self.ttl)
+        return token
+
+
+    def stats(self):
+        """Return cache usage counters.
+
+        :rtype: dict
+        :returns: Usage counters
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self.entries),
+            'size': self.size,
+                }
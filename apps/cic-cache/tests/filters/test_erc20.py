@@ -20,6 +20,7 @@ from hexathon import (
 from cic_cache.db import add_tag
 from cic_cache.runnable.daemons.filters.erc20 import ERC20TransferFilter
 from cic_cache.runnable.daemons.filters.base import TagSyncFilter
+from cic_cache.token import TokenCache
 
 logg = logging.getLogger()
 
@@ -81,6 +82,70 @@ def test_erc20_filter(
     assert r[0] == tx.hash
 
 
+def test_erc20_filter_token_cache(
+        eth_rpc,
+        foo_token,
+        init_database,
+        list_defaults,
+        list_actors,
+        tags,
+        ):
+
+    chain_spec = ChainSpec('foo', 'bar', 42, 'baz')
+
+    token_cache = TokenCache(chain_spec)
+    fltr = ERC20TransferFilter(chain_spec, token_cache=token_cache)
+
+    add_tag(init_database, fltr.tag_name, domain=fltr.tag_domain)
+
+    data = 'a9059cbb'
+    data += strip_0x(list_actors['alice'])
+    data += '1000'.ljust(64, '0')
+
+    block = Block({
+        'hash': os.urandom(32).hex(),
+        'number': 42,
+        'timestamp': datetime.datetime.utcnow().timestamp(),
+        'transactions': [],
+        })
+
+    for i in range(2):
+        tx = Tx({
+            'to': foo_token,
+            'from': list_actors['bob'],
+            'data': data,
+            'value': 0,
+            'hash': os.urandom(32).hex(),
+            'nonce': 13 + i,
+            'gasPrice': 10000000,
+            'gas': 123456,
+                })
+        block.txs.append(tx)
+        tx.block = block
+        assert fltr.filter(eth_rpc, block, tx, db_session=init_database)
+
+    not_a_contract = os.urandom(20).hex()
+    for i in range(2):
+        tx = Tx({
+            'to': not_a_contract,
+            'from': list_actors['bob'],
+            'data': data,
+            'value': 0,
+            'hash': os.urandom(32).hex(),
+            'nonce': 15 + i,
+            'gasPrice': 10000000,
+            'gas': 123456,
+                })
+        block.txs.append(tx)
+        tx.block = block
+        assert not fltr.filter(eth_rpc, block, tx, db_session=init_database)
+
+    o = token_cache.stats()
+    assert o['misses'] == 2
+    assert o['hits'] == 2
+    assert o['entries'] == 2
+
+
 def test_erc20_filter_nocontract(
         eth_rpc,
         foo_token,
@@ -20,7 +20,10 @@ from sqlalchemy import text
 
 # local imports
 from cic_cache.db import add_tag
-from cic_cache.runnable.daemons.filters.faucet import FaucetFilter
+from cic_cache.runnable.daemons.filters.faucet import (
+        FaucetFilter,
+        FaucetCache,
+        )
 
 logg = logging.getLogger()
 
@@ -69,3 +72,34 @@ def test_filter_faucet(
     s = text("SELECT x.tx_hash FROM tag a INNER JOIN tag_tx_link l ON l.tag_id = a.id INNER JOIN tx x ON x.id = l.tx_id WHERE a.domain = :a AND a.value = :b")
     r = init_database.execute(s, {'a': fltr.tag_domain, 'b': fltr.tag_name}).fetchone()
     assert r[0] == tx.hash
+
+
+def test_faucet_cache(
+        eth_rpc,
+        foo_token,
+        faucet_noregistry,
+        contract_roles,
+        ):
+
+    chain_spec = ChainSpec('foo', 'bar', 42, 'baz')
+
+    c = FaucetCache(chain_spec, sender_address=contract_roles['CONTRACT_DEPLOYER'], block_span=10)
+
+    (token, token_value) = c.get(eth_rpc, faucet_noregistry, 100)
+    assert c.misses == 1
+
+    r = c.get(eth_rpc, faucet_noregistry, 109)
+    assert r == (token, token_value,)
+    assert c.hits == 1
+
+    c.get(eth_rpc, faucet_noregistry, 110)
+    assert c.misses == 2
+
+    c.get(eth_rpc, faucet_noregistry, 99)
+    assert c.misses == 3
+
+    assert c.invalidate(faucet_noregistry)
+    assert not c.invalidate(faucet_noregistry)
+
+    c.get(eth_rpc, faucet_noregistry, 99)
+    assert c.misses == 4
@@ -6,12 +6,16 @@ import json
 
 # external imports
 import pytest
+import moolb
 from chainlib.encode import TxHexNormalizer
 
 # local imports
 from cic_cache import db
 from cic_cache import BloomCache
-from cic_cache.cache import DataCache
+from cic_cache.cache import (
+        DataCache,
+        filter_size,
+        )
 
 logg = logging.getLogger()
 
@@ -36,6 +40,25 @@ def test_cache(
     assert b[0] == list_defaults['block'] - 1
 
 
+def test_cache_account_tx_link(
+        init_database,
+        list_actors,
+        txs,
+        ):
+
+    session = init_database
+
+    tx_normalize = TxHexNormalizer()
+
+    account = tx_normalize.wallet_address(list_actors['alice'])
+    r = session.execute("SELECT block_number, tx_index FROM account_tx WHERE address = '{}' ORDER BY block_number".format(account)).fetchall()
+    assert len(r) == 2
+
+    account = tx_normalize.wallet_address(list_actors['bob'])
+    r = session.execute("SELECT block_number, tx_index FROM account_tx WHERE address = '{}'".format(account)).fetchall()
+    assert len(r) == 1
+
+
 def test_cache_data(
         init_database,
         txs,
@@ -269,3 +292,190 @@ def test_cache_ranges_data(
     assert b[1] == oldest
     assert len(b[2]) == 1
     assert b[2][0]['tx_hash'] == more_txs[2]
+
+
+def test_cache_cursor(
+        init_database,
+        list_defaults,
+        list_actors,
+        more_txs,
+        ):
+
+    session = init_database
+
+    tx_normalize = TxHexNormalizer()
+
+    oldest = list_defaults['block'] - 1
+    mid = list_defaults['block']
+    newest = list_defaults['block'] + 2
+
+    c = BloomCache(session)
+    b = c.load_transactions(0, 2)
+    assert b[0] == mid
+    assert b[1] == newest
+    assert b[4] != None
+
+    b = c.load_transactions(0, 2, cursor=b[4])
+    assert b[0] == oldest
+    assert b[1] == oldest
+    assert b[4] == None
+
+    c = DataCache(session)
+    b = c.load_transactions_with_data(0, 1)
+    assert len(b[2]) == 1
+    assert b[2][0]['tx_hash'] == more_txs[0]
+
+    b = c.load_transactions_with_data(0, 1, cursor=b[3])
+    assert len(b[2]) == 1
+    assert b[2][0]['tx_hash'] == more_txs[1]
+
+    b = c.load_transactions_with_data(0, 1, cursor=b[3])
+    assert len(b[2]) == 1
+    assert b[2][0]['tx_hash'] == more_txs[2]
+
+    b = c.load_transactions_with_data(0, 1, cursor=b[3])
+    assert len(b[2]) == 0
+    assert b[3] == None
+
+    account = tx_normalize.wallet_address(list_actors['alice'])
+    b = c.load_transactions_account_with_data(account, 0, 2, oldest=True)
+    assert len(b[2]) == 2
+    assert b[2][0]['tx_hash'] == more_txs[2]
+    assert b[2][1]['tx_hash'] == more_txs[1]
+
+    b = c.load_transactions_account_with_data(account, 0, 2, oldest=True, cursor=b[3])
+    assert len(b[2]) == 1
+    assert b[2][0]['tx_hash'] == more_txs[0]
+    assert b[3] == None
+
+    with pytest.raises(ValueError):
+        c.load_transactions_with_data(0, 1, cursor='deadbeef')
+
+
+def test_cache_filter_size(
+        init_database,
+        list_defaults,
+        txs,
+        ):
+
+    session = init_database
+
+    assert filter_size(1) < filter_size(100)
+    assert filter_size(100) < filter_size(10000)
+
+    c = BloomCache(session)
+    b = c.load_transactions(0, 2)
+    assert len(b[2]) * 8 == filter_size(2)
+    assert b[5] < 0.001
+
+    # filters are sized from the returned rows, not from the requested limit
+    b_big = c.load_transactions(0, 1000000000)
+    assert b_big[2] == b[2]
+    assert b_big[3] == b[3]
+
+
+def test_cache_range(
+        init_database,
+        list_defaults,
+        list_actors,
+        list_tokens,
+        txs,
+        ):
+
+    session = init_database
+
+    block_offset = list_defaults['block'] - 1000
+    block_limit = list_defaults['block'] + 1000
+
+    c = BloomCache(session)
+    b = c.load_transactions(0, 2)
+
+    # spans are not stored before they have been synced
+    q = "INSERT INTO chain_sync (blockchain, block_start, tx_start, block_cursor, tx_cursor, block_target, date_created) VALUES ('foo:bar:42:baz', :start, 0, :start, 0, :target, :created)"
+    dt = datetime.datetime.utcnow()
+    # live session of an earlier run, which is resumed by a history session
+    session.execute(q, {'start': list_defaults['block'] - 5000, 'target': None, 'created': dt})
+    session.execute(q, {'start': list_defaults['block'] - 1000, 'target': list_defaults['block'], 'created': dt})
+    session.execute(q, {'start': list_defaults['block'] + 1, 'target': None, 'created': dt})
+    session.commit()
+    b_range = c.load_transactions_range(block_offset, block_limit)
+    assert b_range[0] == block_offset
+    assert b_range[1] == block_limit
+    assert b_range[2] == b[2]
+    assert b_range[3] == b[3]
+
+    r = session.execute('SELECT block_start, block_end, tx_count FROM tx_bloom').fetchall()
+    assert len(r) == 0
+
+    # the history target is inclusive, so the session is still open at its target block
+    session.execute("UPDATE chain_sync SET block_cursor = block_target WHERE block_target IS NOT NULL")
+    session.commit()
+    assert db.get_sync_height(session) == list_defaults['block']
+
+    session.execute("UPDATE chain_sync SET block_cursor = block_target + 1 WHERE block_target IS NOT NULL")
+    session.commit()
+    assert db.get_sync_height(session) == list_defaults['block'] + 1
+    b_range = c.load_transactions_range(block_offset, block_limit)
+    assert b_range[2] == b[2]
+    assert b_range[3] == b[3]
+
+    r = session.execute('SELECT block_start, block_end, tx_count FROM tx_bloom').fetchall()
+    assert len(r) == 1
+    assert r[0][0] == list_defaults['block'] - 1000
+    assert r[0][1] == list_defaults['block'] - 1
+    assert r[0][2] == 1
+
+    b_range = c.load_transactions_range(block_offset, block_limit)
+    assert b_range[2] == b[2]
+    assert b_range[3] == b[3]
+
+    tx_normalize = TxHexNormalizer()
+    db.add_transaction(
+        session,
+        '0x' + os.urandom(32).hex(),
+        list_defaults['block'] - 2,
+        13,
+        tx_normalize.wallet_address(list_actors['alice']),
+        tx_normalize.wallet_address(list_actors['bob']),
+        tx_normalize.executable_address(list_tokens['foo']),
+        tx_normalize.executable_address(list_tokens['foo']),
+        1024,
+        2048,
+        True,
+        datetime.datetime.utcnow().timestamp(),
+        )
+    session.commit()
+
+    r = session.execute('SELECT block_start, block_end, tx_count FROM tx_bloom').fetchall()
+    assert len(r) == 0
+
+    b_range = c.load_transactions_range(block_offset, block_limit)
+    block_filter = moolb.Bloom(len(b_range[2]) * 8, c.rounds, default_data=b_range[2])
+    assert block_filter.check((list_defaults['block'] - 2).to_bytes(4, byteorder='big'))
+
+
+def test_cache_list_query(
+        init_database,
+        list_defaults,
+        list_actors,
+        txs,
+        ):
+
+    session = init_database
+
+    tx_normalize = TxHexNormalizer()
+    account = tx_normalize.wallet_address(list_actors['alice'])
+
+    r = db.list_transactions(session, 0, 100, address=account).fetchall()
+    assert len(r) == 2
+
+    r = db.list_transactions(session, 0, 100, address=account, block_offset=list_defaults['block']).fetchall()
+    assert len(r) == 1
+
+    r = db.list_transactions(session, 0, 100, address="' OR 1=1 --").fetchall()
+    assert len(r) == 0
+
+    r = db.list_transactions(session, 1, 1, data=True, oldest=True).fetchall()
+    assert len(r) == 1
+    assert r[0]['block_number'] == list_defaults['block']
+    assert r[0]['tx_hash'] == txs[0]
@@ -7,6 +7,7 @@ import re
 
 # external imports
 import pytest
+import moolb
 from hexathon import strip_0x
 
 # local imports
@@ -92,7 +93,6 @@ def test_query_process_txs_account(
         list_actors,
         list_tokens,
         txs,
-        zero_filter,
         role_name,
         query_offset,
         query_limit,
@@ -121,6 +121,7 @@ def test_query_process_txs_account(
 
     o = json.loads(r[1])
     block_filter_data = base64.b64decode(o['block_filter'].encode('utf-8'))
+    zero_filter = moolb.Bloom(len(block_filter_data) * 8, o['filter_rounds'])
     zero_filter_data = zero_filter.to_bytes()
     if len(query_match) == 0:
         assert block_filter_data == zero_filter_data
@@ -152,7 +153,6 @@ def test_query_process_txs_bloom(
         list_actors,
         list_tokens,
         txs,
-        zero_filter,
         query_offset,
         query_limit,
         query_match,
@@ -174,6 +174,7 @@ def test_query_process_txs_bloom(
 
     o = json.loads(r[1])
     block_filter_data = base64.b64decode(o['block_filter'].encode('utf-8'))
+    zero_filter = moolb.Bloom(len(block_filter_data) * 8, o['filter_rounds'])
     zero_filter_data = zero_filter.to_bytes()
     if len(query_match) == 0:
         assert block_filter_data == zero_filter_data
@@ -230,3 +231,108 @@ def test_query_process_txs_data(
     o = json.loads(r[1])
     logg.debug('oo {}'.format(o))
     assert len(o['data']) == query_match_count
+
+
+def test_query_process_txs_data_cursor(
+        init_database,
+        list_defaults,
+        list_actors,
+        list_tokens,
+        txs,
+        ):
+
+    env = {
+            'PATH_INFO': '/txa/100/0/419999/420000',
+            }
+    r = process_transactions_all_data(init_database, env)
+    o = json.loads(r[1])
+    assert len(o['data']) == 2
+    assert o['next'] == None
+
+    env = {
+            'PATH_INFO': '/txa/1/0/419999/420000',
+            }
+    r = process_transactions_all_data(init_database, env)
+    o = json.loads(r[1])
+    assert len(o['data']) == 1
+    assert o['data'][0]['block_number'] == 419999
+
+    env = {
+            'PATH_INFO': '/txa/cursor/{}/1'.format(o['next']),
+            }
+    r = process_transactions_all_data(init_database, env)
+    o = json.loads(r[1])
+    assert len(o['data']) == 1
+    assert o['data'][0]['block_number'] == 420000
+
+    env = {
+            'PATH_INFO': '/txa/cursor/{}/1'.format(o['next']),
+            }
+    r = process_transactions_all_data(init_database, env)
+    o = json.loads(r[1])
+    assert len(o['data']) == 0
+    assert o['next'] == None
+
+
+def test_query_process_txs_range_bloom(
+        init_database,
+        list_defaults,
+        list_actors,
+        list_tokens,
+        txs,
+        ):
+
+    env = {
+            'PATH_INFO': '/tx/range/{}/{}'.format(list_defaults['block'] - 1000, list_defaults['block'] + 1000),
+            }
+    r = process_transactions_range_bloom(init_database, env)
+    assert r != None
+
+    o = json.loads(r[1])
+    assert o['fp_rate'] < 0.001
+    block_filter_data = base64.b64decode(o['block_filter'].encode('utf-8'))
+    block_filter = moolb.Bloom(len(block_filter_data) * 8, o['filter_rounds'], default_data=block_filter_data)
+    for block in [list_defaults['block'] - 1, list_defaults['block']]:
+        assert block_filter.check(block.to_bytes(4, byteorder='big'))
+
+    env = {
+            'PATH_INFO': '/tx/range/{}/{}'.format(list_defaults['block'], list_defaults['block'] - 1),
+            }
+    with pytest.raises(ValueError):
+        process_transactions_range_bloom(init_database, env)
+
+
+def test_query_process_txs_data_stream(
+        init_database,
+        list_defaults,
+        list_actors,
+        list_tokens,
+        txs,
+        ):
+
+    env = {
+            'PATH_INFO': '/txa/1/0/419999/420000',
+            }
+    r = process_transactions_all_data(init_database, env)
+    o = json.loads(r[1])
+
+    env['HTTP_X_CIC_CACHE_STREAM'] = '1'
+    r = process_transactions_all_data(init_database, env)
+    assert r[0] == 'application/json'
+    o_stream = json.loads(b''.join(r[1]))
+    assert o_stream == o
+
+    env = {
+            'PATH_INFO': '/txa/user/0x{}/100/0'.format(strip_0x(list_actors['alice'])),
+            'HTTP_ACCEPT': 'application/x-ndjson',
+            }
+    r = process_transactions_account_data(init_database, env)
+    assert r[0] == 'application/x-ndjson'
+    lines = b''.join(r[1]).decode('utf-8').rstrip('\n').split('\n')
+    assert len(lines) == 3
+    assert json.loads(lines[0])['block_number'] == list_defaults['block']
+    assert json.loads(lines[1])['block_number'] == list_defaults['block'] - 1
+    o = json.loads(lines[2])
+    assert o['low'] == list_defaults['block'] - 1
+    assert o['high'] == list_defaults['block']
+    assert o['next'] == None
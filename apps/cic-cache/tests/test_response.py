@@ -0,0 +1,51 @@
+# standard imports
+import logging
+
+# external imports
+import pytest
+
+# local imports
+from cic_cache.db import get_cache_height
+from cic_cache.response import ResponseCache
+
+logg = logging.getLogger()
+
+
+def test_response_cache_lru():
+    c = ResponseCache(size=2)
+
+    assert c.get('/tx/1', 42) == None
+    c.put('/tx/1', 42, 'application/json', b'foo')
+    c.put('/tx/2/', 42, 'application/json', b'bar')
+
+    assert c.get('/tx/1/', 42) == ('application/json', b'foo',)
+
+    c.put('/tx/3', 42, 'application/json', b'baz')
+    assert c.get('/tx/2', 42) == None
+    assert c.get('/tx//1', 42) == ('application/json', b'foo',)
+    assert c.get('/tx/3', 42) == ('application/json', b'baz',)
+
+    o = c.stats()
+    assert o['hits'] == 3
+    assert o['misses'] == 2
+    assert o['entries'] == 2
+
+
+def test_response_cache_height():
+    c = ResponseCache()
+
+    c.put('/tx/1', 42, 'application/json', b'foo')
+    assert c.get('/tx/1', 42) != None
+    assert c.get('/tx/1', 43) == None
+    assert c.get('/tx/1', 42) == None
+
+
+def test_response_cache_db_height(
+        init_database,
+        list_defaults,
+        txs,
+        ):
+
+    (block_height, tx_id) = get_cache_height(init_database)
+    assert block_height == list_defaults['block']
+    assert tx_id == 2
@@ -0,0 +1,149 @@
+# standard imports
+import datetime
+import logging
+
+# external imports
+import pytest
+from chainlib.chain import ChainSpec
+from chainsyncer.backend.sql import SQLBackend
+from chainsyncer.db.models.base import SessionBase as SyncerSessionBase
+
+# local imports
+from cic_cache.db import get_tag_ids
+from cic_cache.db.writer import TransactionWriter
+from cic_cache.sync import (
+        history_ranges,
+        sync_history,
+        )
+
+logg = logging.getLogger()
+
+
+class MockTx:
+
+    def __init__(self, block, index):
+        self.hash = '0x{:032x}{:032x}'.format(block, index)
+        self.index = index
+
+
+    def apply_receipt(self, rcpt):
+        pass
+
+
+class MockBlock:
+
+    def __init__(self, number, tx_count):
+        self.number = number
+        self.tx_count = tx_count
+
+
+    def tx(self, i):
+        if i >= self.tx_count:
+            raise IndexError(i)
+        return MockTx(self.number, i)
+
+
+class MockChain:
+    """Chain interface and rpc connection of a chain with two transactions in every block.
+    """
+
+    def block_by_number(self, block_number, include_tx=False):
+        return ('block', block_number,)
+
+
+    def block_from_src(self, src):
+        return MockBlock(src, 2)
+
+
+    def tx_receipt(self, tx_hash):
+        return ('receipt', tx_hash,)
+
+
+    def src_normalize(self, src):
+        return src
+
+
+    def do(self, o):
+        if o[0] == 'block':
+            return o[1]
+        return None
+
+
+class MockWriterFilter:
+
+    def __init__(self, writer, actors, token):
+        self.writer = writer
+        self.actors = actors
+        self.token = token
+
+
+    def filter(self, conn, block, tx, db_session=None):
+        self.writer.add(
+            tx.hash,
+            block.number,
+            tx.index,
+            self.actors['alice'],
+            self.actors['bob'],
+            self.token,
+            self.token,
+            1024,
+            1024,
+            True,
+            datetime.datetime.utcnow().timestamp(),
+            )
+
+
+    def __str__(self):
+        return 'mock writer filter'
+
+
+def test_history_ranges():
+    assert history_ranges(100, 110) == [(100, 110,)]
+    assert history_ranges(100, 110, 3) == [(100, 102,), (103, 105,), (106, 108,), (109, 110,)]
+    assert history_ranges(100, 110, 11) == [(100, 110,)]
+
+    # a single block left over is added to the last chunk
+    assert history_ranges(100, 109, 3) == [(100, 102,), (103, 105,), (106, 109,)]
+
+    with pytest.raises(ValueError):
+        history_ranges(100, 110, 1)
+
+    for chunk_size in range(2, 15):
+        r = history_ranges(100, 110, chunk_size)
+        assert r[0][0] == 100
+        assert r[-1][1] == 110
+        for i in range(len(r)):
+            assert r[i][1] > r[i][0]
+            if i > 0:
+                assert r[i][0] == r[i-1][1] + 1
+
+
+def test_sync_history_chunks(
+        database_engine,
+        init_database,
+        list_defaults,
+        list_actors,
+        list_tokens,
+        tags,
+        ):
+
+    SyncerSessionBase.connect(database_engine)
+    chain_spec = ChainSpec('foo', 'bar', 42, 'baz')
+    chain = MockChain()
+    block_start = list_defaults['block'] + 1
+    block_end = block_start + 9
+
+    object_ids = []
+    for (chunk_start, chunk_end) in history_ranges(block_start, block_end, 3):
+        backend = SQLBackend.initial(chain_spec, chunk_end, start_block_height=chunk_start)
+        object_ids.append(backend.object_id)
+
+    for object_id in object_ids:
+        writer = TransactionWriter(get_tag_ids(init_database))
+        fltr = MockWriterFilter(writer, list_actors, list_tokens['foo'])
+        sync_history(chain_spec, object_id, chain, chain, [fltr], writer=writer, interval=0)
+
+    r = init_database.execute('SELECT block_number, COUNT(*) FROM tx WHERE block_number >= {} GROUP BY block_number ORDER BY block_number'.format(block_start)).fetchall()
+    assert [v[0] for v in r] == list(range(block_start, block_end + 1))
+    for v in r:
+        assert v[1] == 2
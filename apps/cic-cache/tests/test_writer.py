@@ -0,0 +1,150 @@
+# standard imports
+import os
+import datetime
+import logging
+
+# external imports
+import pytest
+from chainlib.chain import ChainSpec
+from chainsyncer.backend.sql import SQLBackend
+from chainsyncer.db.models.base import SessionBase as SyncerSessionBase
+
+# local imports
+from cic_cache.db import get_tag_ids
+from cic_cache.db.writer import (
+        TransactionWriter,
+        BatchSQLBackend,
+        )
+
+logg = logging.getLogger()
+
+
+def test_writer(
+        init_database,
+        list_defaults,
+        list_actors,
+        list_tokens,
+        tags,
+        ):
+
+    tag_ids = get_tag_ids(init_database)
+    assert len(tag_ids) == 3
+
+    writer = TransactionWriter(tag_ids)
+
+    dt = datetime.datetime.utcnow()
+    tx_hashes = []
+    for i in range(3):
+        tx_hash = '0x' + os.urandom(32).hex()
+        writer.add(
+            tx_hash,
+            list_defaults['block'],
+            i,
+            list_actors['alice'],
+            list_actors['bob'],
+            list_tokens['foo'],
+            list_tokens['foo'],
+            1024,
+            1024,
+            True,
+            dt.timestamp(),
+            tag=('baz', 'bar',),
+            )
+        tx_hashes.append(tx_hash)
+
+    with pytest.raises(ValueError):
+        writer.add(
+            '0x' + os.urandom(32).hex(),
+            list_defaults['block'],
+            3,
+            list_actors['alice'],
+            list_actors['bob'],
+            list_tokens['foo'],
+            list_tokens['foo'],
+            1024,
+            1024,
+            True,
+            dt.timestamp(),
+            tag=('xyzzy', 'foo',),
+            )
+
+    r = init_database.execute("SELECT count(*) FROM tx").fetchone()
+    assert r[0] == 0
+
+    assert writer.flush(init_database) == 3
+    assert len(writer) == 0
+
+    r = init_database.execute("SELECT x.tx_hash FROM tag a INNER JOIN tag_tx_link l ON l.tag_id = a.id INNER JOIN tx x ON x.id = l.tx_id WHERE a.domain = 'bar' AND a.value = 'baz' ORDER BY x.tx_index").fetchall()
+    assert len(r) == 3
+    for i in range(3):
+        assert r[i][0] == tx_hashes[i]
+
+    r = init_database.execute("SELECT count(*) FROM account_tx WHERE address = '{}'".format(list_actors['bob'])).fetchone()
+    assert r[0] == 3
+
+    assert writer.flush(init_database) == 0
+
+
+def test_writer_backend_replay(
+        database_engine,
+        init_database,
+        list_defaults,
+        list_actors,
+        list_tokens,
+        tags,
+        ):
+
+    SyncerSessionBase.connect(database_engine)
+    chain_spec = ChainSpec('foo', 'bar', 42, 'baz')
+    block = list_defaults['block']
+    backend = SQLBackend.initial(chain_spec, block + 10, start_block_height=block)
+    backend.register_filter('foo')
+
+    writer = TransactionWriter(get_tag_ids(init_database))
+    backend = BatchSQLBackend(chain_spec, backend.object_id, writer)
+
+    dt = datetime.datetime.utcnow()
+    def add(i):
+        writer.add(
+            '0x{:064x}'.format(i),
+            block,
+            i,
+            list_actors['alice'],
+            list_actors['bob'],
+            list_tokens['foo'],
+            list_tokens['foo'],
+            1024,
+            1024,
+            True,
+            dt.timestamp(),
+            )
+
+    add(0)
+    backend.set(block, 1)
+    add(1)
+    backend.set(block, 2)
+    r = init_database.execute("SELECT count(*) FROM tx").fetchone()
+    assert r[0] == 0
+
+    # a failed write must not move the cursor past the block
+    def fail(session):
+        raise RuntimeError('write failed')
+    writer.write = fail
+    with pytest.raises(RuntimeError):
+        backend.set(block + 1, 0)
+    del writer.write
+    assert backend.get()[0] == (block, 2)
+
+    # the resumed syncer processes the block again from the start
+    writer.reset()
+    backend.rewind()
+    assert backend.get()[0] == (block, 0)
+    add(0)
+    backend.set(block, 1)
+    add(1)
+    backend.set(block + 1, 0)
+    assert backend.get()[0] == (block + 1, 0)
+    assert len(writer) == 0
+
+    r = init_database.execute("SELECT count(*) FROM tx").fetchone()
+    assert r[0] == 2
@@ -161,6 +161,27 @@ class Api(ApiBase):
         return s_token_resolve.apply_async()
 
 
+    def token_symbols(self):
+        """Retrieves the symbols of all tokens in the token registry.
+
+        The symbols are passed to the success callback as a single list.
+
+        :returns: uuid of root task
+        :rtype: celery.Task
+        """
+        s_symbols = celery.signature(
+                'cic_eth.eth.erc20.token_symbols',
+                [
+                    self.chain_spec.asdict(),
+                    ],
+                queue=self.queue,
+                )
+        if self.callback_param != None:
+            s_symbols.link(self.callback_success).on_error(self.callback_error)
+
+        return s_symbols.apply_async()
+
+
 #    def convert_transfer(self, from_address, to_address, target_return, minimum_return, from_token_symbol, to_token_symbol):
 #        """Executes a chain of celery tasks that performs conversion between two ERC20 tokens, and transfers to a specified receipient after convert has completed.
 #
@@ -469,36 +490,24 @@ class Api(ApiBase):
 
         last_in_chain = s_balance
         if include_pending:
-            s_balance_incoming = celery.signature(
-                    'cic_eth.queue.balance.balance_incoming',
-                    [
-                        address,
-                        self.chain_spec.asdict(),
-                        ],
-                    queue=self.queue,
-                    )
-            s_balance_outgoing = celery.signature(
-                    'cic_eth.queue.balance.balance_outgoing',
+            s_balance_pending = celery.signature(
+                    'cic_eth.queue.balance.balance_pending',
                     [
                         address,
                         self.chain_spec.asdict(),
                         ],
                     queue=self.queue,
                     )
-            s_balance.link(s_balance_incoming)
-            s_balance_incoming.link(s_balance_outgoing)
-            last_in_chain = s_balance_outgoing
 
             one = celery.chain(s_tokens, s_balance)
-            two = celery.chain(s_tokens, s_balance_incoming)
-            three = celery.chain(s_tokens, s_balance_outgoing)
+            two = celery.chain(s_tokens, s_balance_pending)
 
             t = None
             if self.callback_param != None:
                 s_result.link(self.callback_success).on_error(self.callback_error)
-                t = celery.chord([one, two, three])(s_result)
+                t = celery.chord([one, two])(s_result)
             else:
-                t = celery.chord([one, two, three])(s_result)
+                t = celery.chord([one, two])(s_result)
         else:
             # TODO: Chord is inefficient with only one chain, but assemble_balances must be able to handle different structures in order to avoid chord
             one = celery.chain(s_tokens, s_balance)
@@ -1 +1,6 @@
-from .callback import Callback
+from .callback import (
+        Callback,
+        batch_error,
+        batch_error_key,
+        is_batch_error,
+        )
@@ -14,3 +14,32 @@ class Callback(celery.Task):
     """Password to unlock key file"""
     ssl_ca_file = None
     """Client certificate CA chain"""
+    http_pool = None
+    """Connection pool for HTTP callbacks, or None to use the default pool of cic_eth.callbacks.http"""
+
+
+batch_error_key = '__error__'
+
+
+def batch_error(error):
+    """Mark a single result of a batch as an error.
+
+    Tasks passing several results to a batch callback return the marker in place of the failed result, so that the other results are still delivered. The batch callback reports it with an error status.
+
+    :param error: Error description
+    :type error: str
+    :rtype: dict
+    :returns: Error marker
+    """
+    return {batch_error_key: error}
+
+
+def is_batch_error(result):
+    """Check whether a result of a batch is an error marker created by batch_error.
+
+    :param result: Result
+    :type result: any
+    :rtype: bool
+    :returns: True if error marker
+    """
+    return isinstance(result, dict) and list(result.keys()) == [batch_error_key]
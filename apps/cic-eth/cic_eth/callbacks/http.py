@@ -2,9 +2,17 @@
 import json
 import ssl
 import os
-import urllib
-from urllib import request
-from urllib.request import urlopen
+import time
+import select
+import threading
+import uuid
+from http.client import (
+        HTTPConnection,
+        HTTPSConnection,
+        HTTPException,
+        RemoteDisconnected,
+        )
+from urllib.parse import urlparse
 
 # third-party imports
 from . import Callback
@@ -14,6 +22,355 @@ celery_app = celery.current_app
 logg = celery_app.log.get_default_logger()
 
 
+class ThreadSemaphore:
+    """Counting semaphore shared by the threads of a single process.
+
+    :param value: Maximum number of holders
+    :type value: int
+    """
+
+    def __init__(self, value):
+        self.semaphore = threading.BoundedSemaphore(value)
+
+
+    def acquire(self, timeout):
+        """Acquire the semaphore, waiting at most the given time.
+
+        :param timeout: Maximum seconds to wait
+        :type timeout: float
+        :rtype: bool
+        :returns: Token to pass to release, or None if not acquired within the timeout
+        """
+        if self.semaphore.acquire(timeout=timeout):
+            return True
+        return None
+
+
+    def release(self, token):
+        """Release a semaphore acquired with acquire.
+
+        :param token: Token returned by acquire
+        :type token: bool
+        """
+        self.semaphore.release()
+
+
+class RedisSemaphore:
+    """Counting semaphore shared by all processes using the same redis database.
+
+    Holders are kept in a sorted set, scored by the redis server time at which their lease ends. A holder that has not released the semaphore by then is taken to have died, so that a worker killed while holding it does not take up a slot forever.
+
+    :param client: Redis client
+    :type client: redis.Redis
+    :param key: Redis key of the semaphore
+    :type key: str
+    :param value: Maximum number of holders
+    :type value: int
+    :param lease: Seconds after which a holder is dropped
+    :type lease: float
+    """
+
+    # drop holders whose lease has ended, then add a holder if there is room for it
+    acquire_script = """redis.replicate_commands()
+local t = redis.call('time')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+redis.call('zremrangebyscore', KEYS[1], '-inf', now)
+if redis.call('zcard', KEYS[1]) < tonumber(ARGV[1]) then
+    redis.call('zadd', KEYS[1], now + tonumber(ARGV[2]), ARGV[3])
+    local ttl = math.ceil(tonumber(ARGV[2]))
+    if redis.call('ttl', KEYS[1]) < ttl then
+        redis.call('expire', KEYS[1], ttl)
+    end
+    return 1
+end
+return 0"""
+
+    poll_interval = 0.01
+    poll_interval_max = 0.1
+
+    def __init__(self, client, key, value, lease):
+        self.redis = client
+        self.key = key
+        self.value = value
+        self.lease = lease
+        self.try_acquire = self.redis.register_script(self.acquire_script)
+
+
+    def acquire(self, timeout):
+        """Acquire the semaphore, waiting at most the given time.
+
+        :param timeout: Maximum seconds to wait
+        :type timeout: float
+        :rtype: str
+        :returns: Token to pass to release, or None if not acquired within the timeout
+        """
+        token = uuid.uuid4().hex
+        deadline = time.time() + timeout
+        interval = self.poll_interval
+        while True:
+            if self.try_acquire(keys=[self.key], args=[self.value, self.lease, token]) == 1:
+                return token
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+            time.sleep(min(interval, remaining))
+            interval = min(interval * 2, self.poll_interval_max)
+
+
+    def release(self, token):
+        """Release a semaphore acquired with acquire.
+
+        :param token: Token returned by acquire
+        :type token: str
+        """
+        self.redis.zrem(self.key, token)
+
+
+class HTTPCallbackPool:
+    """Pool of persistent HTTP connections to callback receivers, shared by all http callback tasks in a worker process.
+
+    Idle connections are kept per receiver, up to the given size. The number of callbacks delivered to the same receiver at the same time is bounded, so that bursts of callbacks to one receiver are sent over the connections already open to it.
+
+    If a redis client is given, the bound applies to all worker processes using the same redis database, which is needed for the prefork pool, where each child process delivers a single callback at a time. Otherwise it only applies within a single worker process, which only has an effect with the thread and eventlet pools.
+
+    The timeout is a hard limit on the total time spent on a callback, including waiting for a delivery slot and all retries. A delivery is only retried if the callback was never sent to the receiver, that is if the connection to the receiver could not be established, or if a reused idle connection was found closed when sending. Any failure after the callback was sent, such as a read timeout or an error status, is reported as an error without retrying, since the receiver may already have received the callback.
+
+    Connections inherited from a parent process are never reused.
+
+    :param size: Maximum number of idle connections to keep per receiver
+    :type size: int
+    :param concurrency: Maximum number of callbacks to deliver to the same receiver at the same time
+    :type concurrency: int
+    :param timeout: Maximum seconds to spend on a callback
+    :type timeout: float
+    :param retries: Maximum number of times to retry a failed connection
+    :type retries: int
+    :param redis: Redis client used to bound the callbacks to a receiver across processes, or None to bound them per process
+    :type redis: redis.Redis
+    :param prefix: Redis key prefix of the delivery slots
+    :type prefix: str
+    """
+
+    def __init__(self, size=8, concurrency=16, timeout=10.0, retries=2, redis=None, prefix='cic-eth:callback:http'):
+        self.size = size
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.redis = redis
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+        self.idle = {}
+        self.slots = {}
+        self.contexts = {}
+        self.created = 0
+        self.reused = 0
+        self.retried = 0
+        self.delivered = 0
+        self.failed = 0
+
+
+    def __reset(self):
+        if os.getpid() != self.pid:
+            # sockets and delivery slots held before fork belong to the parent
+            self.idle = {}
+            self.slots = {}
+            self.pid = os.getpid()
+
+
+    def ssl_context(self, cert_file, key_file, password=None):
+        """Retrieve the SSL context for a client certificate, creating it on first use.
+
+        :param cert_file: Absolute path to client certificate PEM file
+        :type cert_file: str
+        :param key_file: Absolute path to client key file
+        :type key_file: str
+        :param password: Password to unlock key file
+        :type password: str
+        :rtype: ssl.SSLContext
+        :returns: SSL context
+        """
+        k = (cert_file, key_file, password,)
+        with self.lock:
+            ctx = self.contexts.get(k)
+            if ctx == None:
+                ctx = ssl.SSLContext()
+                ctx.load_cert_chain(cert_file, key_file, password)
+                self.contexts[k] = ctx
+        return ctx
+
+
+    def __slot(self, k):
+        with self.lock:
+            self.__reset()
+            slot = self.slots.get(k)
+            if slot == None:
+                if self.redis != None:
+                    # a holder releases its slot within the timeout, unless it died
+                    slot = RedisSemaphore(self.redis, '{}:{}://{}'.format(self.prefix, k[0], k[1]), self.concurrency, self.timeout * 2)
+                else:
+                    slot = ThreadSemaphore(self.concurrency)
+                self.slots[k] = slot
+        return slot
+
+
+    def __checkout(self, url, ssl_context):
+        k = (url.scheme, url.netloc,)
+        with self.lock:
+            self.__reset()
+            idle = self.idle.get(k, [])
+            while len(idle) > 0:
+                h = idle.pop()
+                if h.sock == None:
+                    self.reused += 1
+                    return (h, True,)
+                try:
+                    # an idle connection only becomes readable when the receiver has closed it
+                    r = select.select([h.sock], [], [], 0)
+                except (OSError, ValueError):
+                    r = ([h.sock],)
+                if r[0] == []:
+                    self.reused += 1
+                    return (h, True,)
+                h.close()
+            self.created += 1
+        if url.scheme == 'https':
+            h = HTTPSConnection(url.hostname, port=url.port, timeout=self.timeout, context=ssl_context)
+        else:
+            h = HTTPConnection(url.hostname, port=url.port, timeout=self.timeout)
+        logg.debug('new persistent callback connection to {}'.format(url.netloc))
+        return (h, False,)
+
+
+    def __checkin(self, url, h):
+        k = (url.scheme, url.netloc,)
+        with self.lock:
+            idle = self.idle.get(k)
+            if idle == None:
+                idle = []
+                self.idle[k] = idle
+            if len(idle) < self.size:
+                idle.append(h)
+                return
+        h.close()
+
+
+    def post(self, location, data, ssl_context=None):
+        """Post JSON data to a callback receiver.
+
+        :param location: Receiver url
+        :type location: str
+        :param data: Request body
+        :type data: str
+        :param ssl_context: SSL context for https receivers, or None for the default context
+        :type ssl_context: ssl.SSLContext
+        :raises TimeoutError: Callback could not be delivered within the timeout
+        :raises ConnectionError: Receiver could not be reached within the retry budget, or no response was received
+        :raises RuntimeError: Receiver responded with a status other than 200
+        """
+        deadline = time.time() + self.timeout
+        url = urlparse(location)
+        path = url.path
+        if path == '':
+            path = '/'
+        if url.query != '':
+            path += '?' + url.query
+
+        slot = self.__slot((url.scheme, url.netloc,))
+        token = slot.acquire(timeout=self.timeout)
+        if token == None:
+            self.failed += 1
+            raise TimeoutError('no callback delivery slot for {} within {} seconds'.format(url.netloc, self.timeout))
+        try:
+            self.__deliver(url, path, data, ssl_context, deadline)
+        finally:
+            slot.release(token)
+
+
+    def __deliver(self, url, path, data, ssl_context, deadline):
+        attempt = 0
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                self.failed += 1
+                raise TimeoutError('callback to {} not delivered within {} seconds'.format(url.netloc, self.timeout))
+
+            (h, reused) = self.__checkout(url, ssl_context)
+            h.timeout = remaining
+            if h.sock != None:
+                h.sock.settimeout(remaining)
+            else:
+                try:
+                    h.connect()
+                except OSError as e:
+                    h.close()
+                    # nothing was sent, so the callback can be sent again on a new connection
+                    if attempt == self.retries or time.time() >= deadline:
+                        self.failed += 1
+                        raise ConnectionError('callback to {} failed after {} attempts: {}'.format(url.netloc, attempt + 1, e))
+                    attempt += 1
+                    self.retried += 1
+                    logg.debug('callback connection to {} failed, retrying ({}/{}): {}'.format(url.netloc, attempt, self.retries, e))
+                    continue
+
+            try:
+                h.request('POST', path, body=data, headers={'Content-Type': 'application/json'})
+            except (BrokenPipeError, ConnectionResetError) as e:
+                h.close()
+                # the receiver may close idle persistent connections, in which case the request could not be sent
+                if reused:
+                    logg.debug('persistent callback connection to {} was closed, reconnecting'.format(url.netloc))
+                    continue
+                self.failed += 1
+                raise ConnectionError('callback to {} failed: {}'.format(url.netloc, e))
+            except (OSError, HTTPException) as e:
+                h.close()
+                self.failed += 1
+                raise ConnectionError('callback to {} failed: {}'.format(url.netloc, e))
+
+            try:
+                r = h.getresponse()
+                r.read()
+            except (OSError, HTTPException) as e:
+                h.close()
+                self.failed += 1
+                raise ConnectionError('callback to {} sent, but no response received: {}'.format(url.netloc, e))
+
+            if r.will_close:
+                h.close()
+            else:
+                self.__checkin(url, h)
+            if r.status != 200:
+                self.failed += 1
+                raise RuntimeError('Expected status 200 from remote server, but got {} {}'.format(r.status, r.reason))
+            self.delivered += 1
+            return
+
+
+    def stats(self):
+        """Return pool usage counters.
+
+        :rtype: dict
+        :returns: Usage counters
+        """
+        idle = 0
+        for v in self.idle.values():
+            idle += len(v)
+        return {
+            'size': self.size,
+            'concurrency': self.concurrency,
+            'idle': idle,
+            'created': self.created,
+            'reused': self.reused,
+            'retried': self.retried,
+            'delivered': self.delivered,
+            'failed': self.failed,
+                }
+
+
+default_pool = HTTPCallbackPool()
+
+
 @celery_app.task(base=Callback, bind=True)
 def http(self, result, url, status_code):
     """A generic web callback implementation for task results.
@@ -28,6 +385,8 @@ def http(self, result, url, status_code):
         'result': <result>,
     }
 
+    The callback is posted over a persistent connection from the http pool of the task, or the default pool.
+
     :param result: Task context object (on error) or return value of previous task (on success)
     :type result: Varies
     :param url: Url to HTTP POST results to
@@ -35,30 +394,23 @@ def http(self, result, url, status_code):
     :param status_code: 0 on success, any other value is error
     :type status_code: int
     """
-    req = request.Request(url)
     data = {
             'root_id': self.request.root_id,
             'status': status_code,
             'result': result,
             }
     data_str = json.dumps(data)
-    data_bytes = data_str.encode('utf-8')
-    req.add_header('Content-Type', 'application/json')
-    req.data = data_bytes
+
+    pool = self.http_pool
+    if pool == None:
+        pool = default_pool
 
     ctx = None
     if self.ssl:
-        ctx = ssl.SSLContext()
-        ctx.load_cert_chain(
+        ctx = pool.ssl_context(
             self.ssl_cert_file,
             self.ssl_key_file,
             self.ssl_password,
             )
 
-    response = urlopen(
-            req,
-            context=ctx,
-            )
-
-    if response.status != 200:
-        raise RuntimeError('Expected status 200 from remote server, but got {} {}'.format(response.status, response.msg))
+    pool.post(url, data_str, ssl_context=ctx)
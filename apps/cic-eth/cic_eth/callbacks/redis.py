@@ -1,28 +1,96 @@
 # standard imports
+import os
 import logging
 import json
+import threading
 import redis as redis_interface
 
 # third-party imports
 import celery
 
 # local imports
-from . import Callback
+from . import (
+        Callback,
+        batch_error_key,
+        is_batch_error,
+        )
 
 celery_app = celery.current_app
 
 logg = celery_app.log.get_default_logger()
 
+pools = {}
+pools_pid = None
+pools_lock = threading.Lock()
+
+
+def connect(destination):
+    """Parse a redis callback destination, and return a client using the connection pool of the destination redis server.
+
+    Connection pools are kept for the lifetime of the worker process, so successive callbacks to the same server reuse connections.
+
+    :param destination: Callback destination, in the format host:port:db:channel
+    :type destination: str
+    :rtype: tuple
+    :returns: Redis client, and channel to publish to
+    """
+    global pools_pid
+    (host, port, db, channel) = destination.split(':')
+    k = (host, int(port), int(db),)
+    with pools_lock:
+        if pools_pid != os.getpid():
+            # connections opened before fork belong to the parent
+            pools.clear()
+            pools_pid = os.getpid()
+        pool = pools.get(k)
+        if pool == None:
+            logg.debug('new redis callback connection pool for host {} port {} db {}'.format(host, port, db))
+            pool = redis_interface.ConnectionPool(host=k[0], port=k[1], db=k[2])
+            pools[k] = pool
+    return (redis_interface.Redis(connection_pool=pool), channel,)
+
 
 @celery_app.task(base=Callback, bind=True)
 def redis(self, result, destination, status_code):
-    (host, port, db, channel) = destination.split(':')
-    r = redis_interface.Redis(host=host, port=port, db=db)
+    (r, channel) = connect(destination)
     data = {
             'root_id': self.request.root_id,
             'status': status_code,
             'result': result,
             }
-    logg.debug('redis callback on host {} port {} db {} channel {}'.format(host, port, db, channel))
+    logg.debug('redis callback to {}'.format(destination))
     r.publish(channel, json.dumps(data))
-    r.close()
+
+
+@celery_app.task(base=Callback, bind=True, batch=True)
+def redis_batch(self, results, destination, status_code):
+    """Publish each of a list of results as a separate callback message, in a single round trip.
+
+    Tasks that produce several results for one api call check the batch attribute of the callback task, and pass all results to a single call of it instead of calling it for each result.
+
+    Results marked with cic_eth.callbacks.batch_error are published with error status 1, so that every result of the call is delivered even if some of them failed.
+
+    :param results: Results, or a single result (e.g. when used as an error callback)
+    :type results: list
+    :param destination: Callback destination, in the format host:port:db:channel
+    :type destination: str
+    :param status_code: 0 on success, any other value is error
+    :type status_code: int
+    """
+    if not isinstance(results, list):
+        results = [results]
+    (r, channel) = connect(destination)
+    pipe = r.pipeline(transaction=False)
+    for result in results:
+        status = status_code
+        if is_batch_error(result):
+            status = 1
+            result = result[batch_error_key]
+        data = {
+            'root_id': self.request.root_id,
+            'status': status,
+            'result': result,
+            }
+        pipe.publish(channel, json.dumps(data))
+    logg.debug('redis batch callback of {} results to {}'.format(len(results), destination))
+    pipe.execute()
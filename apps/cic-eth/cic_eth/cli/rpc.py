@@ -12,6 +12,9 @@ from chainlib.eth.connection import (
         )
 from chainlib.chain import ChainSpec
 
+# local imports
+from cic_eth.eth.rpc import PooledEthHTTPConnection
+
 logg = logging.getLogger(__name__)
 
 
@@ -32,9 +35,14 @@ class RPC:
 
 
     @staticmethod
-    def from_config(config, use_signer=False, default_label='default', signer_label='signer'):
+    def from_config(config, use_signer=False, default_label='default', signer_label='signer', pool=None):
         chain_spec = ChainSpec.from_chain_str(config.get('CHAIN_SPEC'))
 
+        if pool != None:
+            PooledEthHTTPConnection.pool = pool
+            RPCConnection.register_constructor(ConnType.HTTP, PooledEthHTTPConnection, default_label)
+            RPCConnection.register_constructor(ConnType.HTTP_SSL, PooledEthHTTPConnection, default_label)
+            logg.info('using pooled rpc connections, max {} idle per node'.format(pool.size))
         RPCConnection.register_location(config.get('RPC_PROVIDER'), chain_spec, default_label)
         if use_signer:
 
@@ -0,0 +1,176 @@
+# standard imports
+import os
+import logging
+import time
+import threading
+
+# external imports
+import redis
+from sqlalchemy import event
+
+logg = logging.getLogger()
+
+INVALIDATE_CHANNEL = 'cic-eth:db:invalidate'
+"""Redis channel signalled when account roles or locks are written"""
+
+
+class ModelCache:
+    """Process-local read-through cache for database rows that only change on operator action, like account roles and locks.
+
+    Any process that writes such a row publishes a signal on a redis channel, and every process holding a cache drops all entries when it receives it. The subscription runs in a background thread, which is started on first use in each process.
+
+    Entries are only cached while the subscription is live; if the redis connection is lost, all reads go to the database until it is restored. Entries also expire after the given time-to-live.
+
+    If no redis host is given, the cache is disabled. If the time-to-live is 0, nothing is cached, but invalidation signals are still published on writes.
+
+    :param ttl: Seconds to cache an entry
+    :type ttl: float
+    :param host: Redis host
+    :type host: str
+    :param port: Redis port
+    :type port: int
+    :param db: Redis database
+    :type db: int
+    :param channel: Redis channel for invalidation signals
+    :type channel: str
+    :param retry_interval: Seconds to wait before resubscribing after a redis error
+    :type retry_interval: float
+    """
+
+    def __init__(self, ttl=60, host=None, port=6379, db=0, channel=INVALIDATE_CHANNEL, retry_interval=1.0):
+        self.ttl = ttl
+        self.redis = None
+        if host != None:
+            self.redis = redis.Redis(host=host, port=port, db=db)
+        self.channel = channel
+        self.retry_interval = retry_interval
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.generation = 0
+        self.subscribed = False
+        self.pid = None
+        self.thread = None
+
+
+    def __clear(self):
+        with self.lock:
+            self.entries = {}
+            self.generation += 1
+
+
+    def __listen(self):
+        while True:
+            try:
+                p = self.redis.pubsub()
+                p.subscribe(self.channel)
+                for m in p.listen():
+                    self.__clear()
+                    if m['type'] == 'subscribe':
+                        # anything may have been written while not subscribed
+                        self.subscribed = True
+                        logg.debug('subscribed to db cache invalidation channel {}'.format(self.channel))
+            except redis.exceptions.RedisError as e:
+                logg.warning('db cache invalidation subscription lost, bypassing cache: {}'.format(e))
+            self.subscribed = False
+            self.__clear()
+            time.sleep(self.retry_interval)
+
+
+    def __start(self):
+        pid = os.getpid()
+        if self.pid == pid:
+            return
+        with self.lock:
+            if self.pid == pid:
+                return
+            # a listener thread started before fork does not exist in the child
+            self.subscribed = False
+            self.entries = {}
+            self.thread = threading.Thread(target=self.__listen, daemon=True)
+            self.thread.start()
+            self.pid = pid
+
+
+    def get(self, key):
+        """Retrieve a cached entry.
+
+        :param key: Entry key
+        :type key: hashable
+        :rtype: tuple
+        :returns: Whether a live entry was found, the cached value, and a generation token to pass to put() for a value read from the database after a miss
+        """
+        if self.redis == None or self.ttl == 0:
+            return (False, None, None,)
+        self.__start()
+        with self.lock:
+            generation = self.generation
+            if not self.subscribed:
+                return (False, None, generation,)
+            v = self.entries.get(key)
+            if v != None and v[1] > time.time():
+                return (True, v[0], generation,)
+        return (False, None, generation,)
+
+
+    def put(self, key, value, generation):
+        """Cache an entry read from the database.
+
+        The entry is not cached if an invalidation signal has been received since the generation token was issued, since the value read may then be stale.
+
+        :param key: Entry key
+        :type key: hashable
+        :param value: Value
+        :type value: any
+        :param generation: Generation token returned by get()
+        :type generation: int
+        """
+        if generation == None:
+            return
+        with self.lock:
+            if not self.subscribed or generation != self.generation:
+                return
+            self.entries[key] = (value, time.time() + self.ttl,)
+
+
+    def invalidate(self):
+        """Drop all cached entries, and signal all other processes to drop theirs.
+
+        Must be called after the write has been committed.
+        """
+        self.__clear()
+        if self.redis == None:
+            return
+        try:
+            self.redis.publish(self.channel, str(os.getpid()))
+        except redis.exceptions.RedisError as e:
+            logg.error('could not publish db cache invalidation: {}'.format(e))
+
+
+model_cache = ModelCache()
+
+
+def connect_model_cache(cache):
+    """Set the cache used for account role and lock reads in the process.
+
+    :param cache: Model cache
+    :type cache: cic_eth.db.cache.ModelCache
+    """
+    global model_cache
+    model_cache = cache
+
+
+def invalidate_on_commit(session):
+    """Invalidate the model cache when the given session is committed.
+
+    :param session: Database session
+    :type session: sqlalchemy.orm.Session
+    """
+    if session.info.get('cic_eth_invalidate'):
+        return
+    session.info['cic_eth_invalidate'] = True
+
+    def __invalidate(session):
+        session.info.pop('cic_eth_invalidate', None)
+        model_cache.invalidate()
+
+    event.listen(session, 'after_commit', __invalidate, once=True)
@@ -0,0 +1,57 @@
+"""Notify dispatcher on queue changes
+
+Revision ID: e3b5c0a9d214
+Revises: c91cafc3e0c1
+Create Date: 2021-11-08 14:12:51.604328
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3b5c0a9d214'
+down_revision = 'c91cafc3e0c1'
+branch_labels = None
+depends_on = None
+
+# must match cic_eth.db.notify.DISPATCH_CHANNEL
+channel = 'cic_eth_dispatch'
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute("""CREATE FUNCTION cic_eth_notify_dispatch() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('{}', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql""".format(channel))
+
+    # otx status bit 0x01 is chainqueue StatusBits.QUEUED
+    op.execute("""CREATE TRIGGER otx_queued_insert_notify AFTER INSERT ON otx
+FOR EACH ROW WHEN (NEW.status & 1 = 1)
+EXECUTE PROCEDURE cic_eth_notify_dispatch()""")
+    op.execute("""CREATE TRIGGER otx_queued_update_notify AFTER UPDATE OF status ON otx
+FOR EACH ROW WHEN (NEW.status & 1 = 1 AND OLD.status & 1 = 0)
+EXECUTE PROCEDURE cic_eth_notify_dispatch()""")
+
+    op.execute("""CREATE TRIGGER lock_release_update_notify AFTER UPDATE OF flags ON lock
+FOR EACH ROW WHEN (OLD.flags & ~NEW.flags != 0)
+EXECUTE PROCEDURE cic_eth_notify_dispatch()""")
+    op.execute("""CREATE TRIGGER lock_release_delete_notify AFTER DELETE ON lock
+FOR EACH ROW
+EXECUTE PROCEDURE cic_eth_notify_dispatch()""")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute('DROP TRIGGER lock_release_delete_notify ON lock')
+    op.execute('DROP TRIGGER lock_release_update_notify ON lock')
+    op.execute('DROP TRIGGER otx_queued_update_notify ON otx')
+    op.execute('DROP TRIGGER otx_queued_insert_notify ON otx')
+    op.execute('DROP FUNCTION cic_eth_notify_dispatch()')
@@ -0,0 +1,83 @@
+"""Add pending balance table
+
+Revision ID: f7c2d4a9b816
+Revises: e3b5c0a9d214
+Create Date: 2021-11-10 09:31:07.118254
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f7c2d4a9b816'
+down_revision = 'e3b5c0a9d214'
+branch_labels = None
+depends_on = None
+
+# chainqueue dead() status mask, StatusBits.FINAL | StatusBits.OBSOLETE
+dead = 0x3000
+
+
+def upgrade():
+    op.create_table(
+            'balance_pending',
+            sa.Column('id', sa.Integer, primary_key=True),
+            sa.Column('address', sa.String, nullable=False),
+            sa.Column('token_address', sa.String, nullable=False),
+            sa.Column('incoming', sa.NUMERIC(), nullable=False, server_default='0'),
+            sa.Column('outgoing', sa.NUMERIC(), nullable=False, server_default='0'),
+            )
+    op.create_index('idx_balance_pending_address_token', 'balance_pending', ['address', 'token_address'], unique=True)
+
+    # the table is only maintained by triggers, which are only provided for postgresql
+    # the triggers themselves are created by the cic-eth-balance-pending install command, when the table is to be used
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    # sender and recipient rows are upserted in one statement, in address order, so that concurrent transfers in opposite directions lock them in the same order
+    op.execute("""CREATE FUNCTION cic_eth_balance_pending_apply(p_otx_id integer, p_sign integer) RETURNS void AS $$
+BEGIN
+    INSERT INTO balance_pending (address, token_address, incoming, outgoing)
+        SELECT address, token_address, SUM(incoming), SUM(outgoing) FROM (
+            SELECT sender AS address, source_token_address AS token_address, 0 AS incoming, p_sign * from_value AS outgoing FROM tx_cache WHERE otx_id = p_otx_id
+            UNION ALL
+            SELECT recipient, destination_token_address, p_sign * to_value, 0 FROM tx_cache WHERE otx_id = p_otx_id AND to_value IS NOT NULL
+            ) AS v
+        GROUP BY address, token_address
+        ORDER BY address, token_address
+        ON CONFLICT (address, token_address) DO UPDATE SET incoming = balance_pending.incoming + EXCLUDED.incoming, outgoing = balance_pending.outgoing + EXCLUDED.outgoing;
+END;
+$$ LANGUAGE plpgsql""")
+
+    op.execute("""CREATE FUNCTION cic_eth_balance_pending_tx_cache() RETURNS trigger AS $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM otx WHERE id = NEW.otx_id AND status & {0} = 0) THEN
+        PERFORM cic_eth_balance_pending_apply(NEW.otx_id, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql""".format(dead))
+
+    op.execute("""CREATE FUNCTION cic_eth_balance_pending_otx() RETURNS trigger AS $$
+BEGIN
+    IF NEW.status & {0} = 0 THEN
+        PERFORM cic_eth_balance_pending_apply(NEW.id, 1);
+    ELSE
+        PERFORM cic_eth_balance_pending_apply(NEW.id, -1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql""".format(dead))
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('DROP TRIGGER IF EXISTS otx_balance_pending ON otx')
+        op.execute('DROP TRIGGER IF EXISTS tx_cache_balance_pending ON tx_cache')
+        op.execute('DROP FUNCTION cic_eth_balance_pending_otx()')
+        op.execute('DROP FUNCTION cic_eth_balance_pending_tx_cache()')
+        op.execute('DROP FUNCTION cic_eth_balance_pending_apply(integer, integer)')
+
+    op.drop_index('idx_balance_pending_address_token')
+    op.drop_table('balance_pending')
@@ -0,0 +1,140 @@
+# standard imports
+import logging
+
+# external imports
+from sqlalchemy import Column, String, NUMERIC
+from chainqueue.db.enum import dead
+
+# local imports
+from .base import SessionBase
+
+logg = logging.getLogger(__name__)
+
+# name, table and definition of the triggers maintaining the pending balance table
+triggers = [
+    ('tx_cache_balance_pending', 'tx_cache', """CREATE TRIGGER tx_cache_balance_pending AFTER INSERT ON tx_cache
+FOR EACH ROW
+EXECUTE PROCEDURE cic_eth_balance_pending_tx_cache()"""),
+    ('otx_balance_pending', 'otx', """CREATE TRIGGER otx_balance_pending AFTER UPDATE OF status ON otx
+FOR EACH ROW WHEN ((OLD.status & {0} = 0) != (NEW.status & {0} = 0))
+EXECUTE PROCEDURE cic_eth_balance_pending_otx()""".format(dead())),
+    ]
+
+
+def trigger_count(session):
+    """Count the existing triggers maintaining the pending balance table.
+
+    :param session: Backend state integrity session
+    :type session: varies
+    :rtype: int
+    :returns: Number of triggers
+    """
+    names = ["'{}'".format(v[0]) for v in triggers]
+    r = session.execute('SELECT COUNT(*) FROM pg_trigger WHERE tgname IN ({})'.format(','.join(names)))
+    return r.first()[0]
+
+
+class PendingBalance(SessionBase):
+    """Accumulated value of unprocessed incoming and outgoing transactions per holder and token.
+
+    Rows are maintained by database triggers on queue state changes, which are only available with the postgresql backend. The triggers are only created by install, which is run by the cic-eth-balance-pending admin command, so that queue writes do not update the table when it is not used. Workers set enabled at startup if the triggers exist, and the table should only be read from if enabled is set.
+    """
+    __tablename__ = 'balance_pending'
+
+    enabled = False
+
+    address = Column(String())
+    token_address = Column(String())
+    incoming = Column(NUMERIC())
+    outgoing = Column(NUMERIC())
+
+
+    @staticmethod
+    def get(address, token_addresses, session=None):
+        """Retrieve pending balances of the given tokens for a holder.
+
+        :param address: Normalized holder address
+        :type address: str
+        :param token_addresses: Normalized token addresses
+        :type token_addresses: list of str
+        :param session: Backend state integrity session
+        :type session: varies
+        :rtype: dict
+        :returns: Tuple of incoming and outgoing value, keyed by token address
+        """
+        session = SessionBase.bind_session(session)
+
+        q = session.query(PendingBalance.token_address, PendingBalance.incoming, PendingBalance.outgoing)
+        q = q.filter(PendingBalance.address==address)
+        q = q.filter(PendingBalance.token_address.in_(token_addresses))
+        r = {}
+        for v in q.all():
+            r[v[0]] = (int(v[1]), int(v[2]),)
+
+        SessionBase.release_session(session)
+
+        return r
+
+
+    @staticmethod
+    def install(session=None):
+        """Rebuild the table from the queue, and create the triggers maintaining it, unless they already exist.
+
+        Queue writes are blocked until the session is committed, so that no changes are missed between the rebuild and the creation of the triggers.
+
+        :param session: Backend state integrity session
+        :type session: varies
+        :rtype: bool
+        :returns: True if the triggers were created
+        """
+        session = SessionBase.bind_session(session)
+
+        if trigger_count(session) == len(triggers):
+            SessionBase.release_session(session)
+            return False
+
+        session.execute('LOCK TABLE otx, tx_cache IN SHARE ROW EXCLUSIVE MODE')
+        session.execute('DELETE FROM balance_pending')
+        session.execute("""INSERT INTO balance_pending (address, token_address, incoming, outgoing)
+    SELECT address, token_address, SUM(incoming), SUM(outgoing) FROM (
+        SELECT tx_cache.sender AS address, tx_cache.source_token_address AS token_address, 0 AS incoming, tx_cache.from_value AS outgoing FROM tx_cache
+        JOIN otx ON otx.id = tx_cache.otx_id WHERE otx.status & {0} = 0
+        UNION ALL
+        SELECT tx_cache.recipient, tx_cache.destination_token_address, tx_cache.to_value, 0 FROM tx_cache
+        JOIN otx ON otx.id = tx_cache.otx_id WHERE otx.status & {0} = 0 AND tx_cache.to_value IS NOT NULL
+        ) AS v
+    GROUP BY address, token_address""".format(dead()))
+        for (name, table, sql) in triggers:
+            session.execute('DROP TRIGGER IF EXISTS {} ON {}'.format(name, table))
+            session.execute(sql)
+        logg.info('installed pending balance triggers')
+
+        SessionBase.release_session(session)
+
+        return True
+
+
+    @staticmethod
+    def uninstall(session=None):
+        """Drop the triggers maintaining the table, if they exist.
+
+        The table is stale from then on, until it is rebuilt by install.
+
+        :param session: Backend state integrity session
+        :type session: varies
+        :rtype: bool
+        :returns: True if any triggers were dropped
+        """
+        session = SessionBase.bind_session(session)
+
+        if trigger_count(session) == 0:
+            SessionBase.release_session(session)
+            return False
+
+        for (name, table, sql) in triggers:
+            session.execute('DROP TRIGGER IF EXISTS {} ON {}'.format(name, table))
+        logg.info('removed pending balance triggers')
+
+        SessionBase.release_session(session)
+
+        return True
@@ -9,6 +9,7 @@ from chainqueue.db.models.otx import Otx
 
 # local imports
 from cic_eth.db.models.base import SessionBase
+import cic_eth.db.cache
 from cic_eth.encode  import ZERO_ADDRESS_NORMAL
 
 logg = logging.getLogger()
@@ -83,6 +84,7 @@ class Lock(SessionBase):
 
         session.add(lock)
         session.commit()
+        cic_eth.db.cache.model_cache.invalidate()
 
         SessionBase.release_session(session)
 
@@ -127,6 +129,7 @@ class Lock(SessionBase):
                 session.add(lock)
                 r = lock.flags
             session.commit()
+            cic_eth.db.cache.model_cache.invalidate()
 
         SessionBase.release_session(session)
 
@@ -172,14 +175,37 @@ class Lock(SessionBase):
 
     @staticmethod
     def check_aggregate(chain_str, flags, address, session=None):
-        localsession = session
-        if localsession == None:
-            localsession = SessionBase.create_session()
+        """Checks whether all given flags are set for given chain, either globally or for the given address.
 
-        r = Lock.check(chain_str, flags, session=localsession) 
-        r |= Lock.check(chain_str, flags, address=address, session=localsession) 
+        The global and address entries are retrieved in a single query, and read through the model cache.
 
-        if session == None:
-            localsession.close()
+        :param chain_str: Chain spec string representation
+        :type str: str
+        :param flags: Flags to check
+        :type flags: number
+        :param address: Ethereum address
+        :type address: str, 0x-hex
+        :param session: Database session, if None a separate session will be used.
+        :type session: SQLAlchemy session
+        :returns: Returns the value of all flags matched
+        :rtype: number
+        """
+        k = ('lock', chain_str, address,)
+        (found, entries, generation) = cic_eth.db.cache.model_cache.get(k)
+        if not found:
+            session = SessionBase.bind_session(session)
+
+            q = session.query(Lock.flags)
+            q = q.filter(Lock.blockchain==chain_str)
+            q = q.filter(Lock.address.in_([ZERO_ADDRESS_NORMAL, address]))
+            entries = [v[0] for v in q.all()]
 
+            SessionBase.release_session(session)
+
+            cic_eth.db.cache.model_cache.put(k, entries, generation)
+
+        r = 0
+        for v in entries:
+            if v & flags == flags:
+                r |= v & flags
         return r
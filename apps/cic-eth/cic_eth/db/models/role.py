@@ -7,6 +7,8 @@ from chainlib.eth.constant import ZERO_ADDRESS
 
 # local imports
 from .base import SessionBase
+import cic_eth.db.cache
+from cic_eth.db.cache import invalidate_on_commit
 
 logg = logging.getLogger()
 
@@ -44,6 +46,8 @@ class AccountRole(SessionBase):
     def get_address(tag, session):
         """Get Ethereum address matching the given tag
 
+        The result is read through the model cache.
+
         :param tag: Tag
         :type tag: str
         :returns: Ethereum address, or zero-address if tag does not exist
@@ -52,6 +56,11 @@ class AccountRole(SessionBase):
         if session == None:
             raise ValueError('nested bind session calls will not succeed as the first call to release_session in the stack will leave the db object detached further down the stack. We will need additional reference count.')
 
+        k = ('role', tag,)
+        (found, r, generation) = cic_eth.db.cache.model_cache.get(k)
+        if found:
+            return r
+
         session = SessionBase.bind_session(session)
 
         role = AccountRole.__get_role(tag, session)
@@ -64,6 +73,8 @@ class AccountRole(SessionBase):
 
         SessionBase.release_session(session)
 
+        cic_eth.db.cache.model_cache.put(k, r, generation)
+
         return r
 
 
@@ -116,6 +127,7 @@ class AccountRole(SessionBase):
         role.address_hex = address_hex
 
         session.flush()
+        invalidate_on_commit(session)
         
         SessionBase.release_session(session)
 
@@ -0,0 +1,94 @@
+# standard imports
+import logging
+import select
+import time
+
+# local imports
+from cic_eth.db.models.base import SessionBase
+
+logg = logging.getLogger()
+
+DISPATCH_CHANNEL = 'cic_eth_dispatch'
+"""Notification channel signalled when a transaction is queued or a lock is released"""
+
+
+class DispatchListener:
+    """Waits for database notifications on the dispatch channel.
+
+    Notifications are emitted by database triggers when an outgoing transaction enters the QUEUED state, or when a lock flag is reset. They are only available with the postgresql backend; for any other backend, or when the notification connection is lost, wait() simply sleeps for the given timeout.
+
+    :param channel: Notification channel name
+    :type channel: str
+    """
+
+    def __init__(self, channel=DISPATCH_CHANNEL):
+        self.channel = channel
+        self.conn = None
+        self.dbapi_conn = None
+        self.enabled = SessionBase.engine.dialect.name == 'postgresql'
+        if not self.enabled:
+            logg.warning('database backend {} does not support notifications, dispatcher will poll'.format(SessionBase.engine.dialect.name))
+
+
+    def connect(self):
+        """Check out a dedicated database connection and subscribe to the notification channel.
+        """
+        self.conn = SessionBase.engine.raw_connection()
+        self.dbapi_conn = self.conn.connection
+        self.dbapi_conn.autocommit = True
+        cur = self.dbapi_conn.cursor()
+        cur.execute('LISTEN {}'.format(self.channel))
+        cur.close()
+        logg.info('listening for notifications on channel {}'.format(self.channel))
+
+
+    def close(self):
+        """Release the notification connection.
+        """
+        if self.conn != None:
+            try:
+                self.conn.invalidate()
+            except Exception as e:
+                logg.debug('error closing notification connection: {}'.format(e))
+        self.conn = None
+        self.dbapi_conn = None
+
+
+    def wait(self, timeout):
+        """Block until a notification is received or the timeout expires.
+
+        All pending notifications are consumed.
+
+        :param timeout: Maximum seconds to wait
+        :type timeout: float
+        :rtype: bool
+        :returns: True if one or more notifications were received
+        """
+        if not self.enabled:
+            time.sleep(timeout)
+            return False
+
+        if self.dbapi_conn == None:
+            try:
+                self.connect()
+            except Exception as e:
+                logg.error('could not listen for notifications: {}'.format(e))
+                self.close()
+                time.sleep(timeout)
+                return False
+
+        try:
+            if len(self.dbapi_conn.notifies) == 0:
+                r = select.select([self.dbapi_conn], [], [], timeout)
+                if r[0] == []:
+                    return False
+                self.dbapi_conn.poll()
+        except Exception as e:
+            logg.error('notification connection failed: {}'.format(e))
+            self.close()
+            return False
+
+        c = len(self.dbapi_conn.notifies)
+        del self.dbapi_conn.notifies[:]
+        logg.debug('received {} notifications on channel {}'.format(c, self.channel))
+        return c > 0
@@ -0,0 +1,133 @@
+# standard imports
+import logging
+
+# external imports
+from chainlib.eth.constant import ZERO_ADDRESS
+from chainlib.jsonrpc import JSONRPCRequest
+from chainlib.hash import keccak256_string_to_hex
+from chainlib.error import RPCException
+from eth_erc20 import ERC20
+from hexathon import (
+        strip_0x,
+        add_0x,
+        )
+
+# local imports
+from cic_eth.eth.rpc import do_batch
+
+logg = logging.getLogger()
+
+MULTICALL_AGGREGATE = keccak256_string_to_hex('aggregate((address,bytes)[])')[:8]
+"""Method signature of aggregate method of multicall contract"""
+
+DEFAULT_CONCURRENCY = 8
+
+
+def __word(v):
+    return '{:064x}'.format(v)
+
+
+def multicall_aggregate_data(calls):
+    """Encode input data for the aggregate((address,bytes)[]) method of a multicall contract.
+
+    :param calls: Contract address and input data of each call
+    :type calls: list of tuples
+    :rtype: str, 0x-hex
+    :returns: Encoded input data
+    """
+    tuples = []
+    for (address, data) in calls:
+        data = strip_0x(data)
+        padding = '0' * ((64 - len(data) % 64) % 64)
+        tuples.append(__word(int(strip_0x(address), 16)) + __word(0x40) + __word(len(data) // 2) + data + padding)
+
+    r = MULTICALL_AGGREGATE + __word(0x20) + __word(len(tuples))
+    offset = len(tuples) * 32
+    for v in tuples:
+        r += __word(offset)
+        offset += len(v) // 2
+    r += ''.join(tuples)
+    return add_0x(r)
+
+
+def multicall_aggregate_parse(v):
+    """Decode the (uint256,bytes[]) result of the aggregate method of a multicall contract.
+
+    :param v: Result data
+    :type v: str, 0x-hex
+    :rtype: list of str, 0x-hex
+    :returns: Result data of each call
+    """
+    b = bytes.fromhex(strip_0x(v))
+
+    def uint(o):
+        return int.from_bytes(b[o:o+32], 'big')
+
+    o = uint(32)
+    c = uint(o)
+    base = o + 32
+    r = []
+    for i in range(c):
+        o = base + uint(base + (i * 32))
+        l = uint(o)
+        r.append(add_0x(b[o+32:o+32+l].hex()))
+    return r
+
+
+def balance_of_batch(chain_spec, conn, token_addresses, holder_address, caller_address=ZERO_ADDRESS, multicall_address=None, concurrency=DEFAULT_CONCURRENCY):
+    """Retrieve the balances of a holder for several tokens.
+
+    If a multicall contract address is given, all balances are retrieved with a single call to it. If the multicall fails, or no address is given, the balanceOf calls are sent as a single JSON-RPC batch request, or as concurrent requests if the node does not accept batches.
+
+    :param chain_spec: Chain spec
+    :type chain_spec: chainlib.chain.ChainSpec
+    :param conn: RPC connection
+    :type conn: chainlib.connection.RPCConnection
+    :param token_addresses: Token contract addresses
+    :type token_addresses: list of str, 0x-hex
+    :param holder_address: Token holder address
+    :type holder_address: str, 0x-hex
+    :param caller_address: Address to make the calls from
+    :type caller_address: str, 0x-hex
+    :param multicall_address: Multicall contract address
+    :type multicall_address: str, 0x-hex
+    :param concurrency: Maximum concurrent requests if the node does not accept batches
+    :type concurrency: int
+    :raises chainlib.error.RPCException: A balance call failed
+    :rtype: list of int
+    :returns: Balances, in the order of the token addresses
+    """
+    if caller_address == None:
+        caller_address = ZERO_ADDRESS
+
+    c = ERC20(chain_spec)
+    requests = []
+    for address in token_addresses:
+        requests.append(c.balance_of(address, holder_address, sender_address=caller_address))
+
+    if multicall_address != None and len(requests) > 1:
+        calls = []
+        for o in requests:
+            calls.append((o['params'][0]['to'], o['params'][0]['data'],))
+        j = JSONRPCRequest()
+        o = j.template()
+        o['method'] = 'eth_call'
+        o['params'].append({
+            'from': caller_address,
+            'to': multicall_address,
+            'data': multicall_aggregate_data(calls),
+            })
+        o['params'].append('latest')
+        o = j.finalize(o)
+        try:
+            r = conn.do(o)
+            return [c.parse_balance(v) for v in multicall_aggregate_parse(r)]
+        except RPCException as e:
+            logg.warning('multicall balance of {} tokens failed, falling back to batch request: {}'.format(len(requests), e))
+
+    balances = []
+    for (v, e) in do_batch(conn, requests, concurrency=concurrency):
+        if e != None:
+            raise e
+        balances.append(c.parse_balance(v))
+    return balances
@@ -23,6 +23,7 @@ from chainqueue.error import NotLocalTxError
 from eth_erc20 import ERC20
 from chainqueue.sql.tx import cache_tx_dict
 from okota.token_index.index import to_identifier
+from eth_token_index import TokenUniqueSymbolIndex
 
 # local imports
 from cic_eth.db.models.base import SessionBase
@@ -36,7 +37,13 @@ from cic_eth.error import (
 from cic_eth.queue.tx import register_tx
 from cic_eth.eth.gas import create_check_gas_task
 from cic_eth.eth.util import CacheGasOracle
+from cic_eth.eth.balance import balance_of_batch
+from cic_eth.eth.rpc import do_batch
 from cic_eth.ext.address import translate_address
+from cic_eth.registry import (
+        LookupCache,
+        lookup_name,
+        )
 from cic_eth.task import (
         CriticalSQLAlchemyTask,
         CriticalWeb3Task,
@@ -56,6 +63,8 @@ logg = logging.getLogger()
 def balance(self, tokens, holder_address, chain_spec_dict):
     """Return token balances for a list of tokens for given address
 
+    The balances of all tokens are retrieved together, through the multicall contract if one is registered.
+
     :param tokens: Token addresses
     :type tokens: list of str, 0x-hex
     :param holder_address: Token holder address
@@ -69,15 +78,11 @@ def balance(self, tokens, holder_address, chain_spec_dict):
     rpc = RPCConnection.connect(chain_spec, 'default')
     caller_address = ERC20Token.caller_address 
 
-    for t in tokens:
-        address = t['address']
-        logg.debug('address {} {}'.format(address, holder_address))
-        gas_oracle = self.create_gas_oracle(rpc, address=address, min_price=self.min_fee_price)
-        token = ERC20Token(chain_spec, rpc, add_0x(address))
-        c = ERC20(chain_spec, gas_oracle=gas_oracle)
-        o = c.balance_of(address, holder_address, sender_address=caller_address)
-        r = rpc.do(o)
-        t['balance_network'] = c.parse_balance(r)
+    token_addresses = [add_0x(t['address']) for t in tokens]
+    logg.debug('addresses {} {}'.format(token_addresses, holder_address))
+    balances = balance_of_batch(chain_spec, rpc, token_addresses, holder_address, caller_address=caller_address, multicall_address=self.multicall_address)
+    for i, t in enumerate(tokens):
+        t['balance_network'] = balances[i]
     rpc.disconnect()
 
     return tokens
@@ -363,7 +368,7 @@ def resolve_tokens_by_symbol(self, token_symbols, chain_spec_dict):
     sender_address = AccountRole.get_address('DEFAULT', session)
     session.close()
     for token_symbol in token_symbols:
-        token_address = registry.by_name(token_symbol, sender_address=sender_address)
+        token_address = lookup_name(registry, chain_spec, token_symbol, sender_address=sender_address, kind=LookupCache.TOKEN)
         logg.debug('token {}'.format(token_address))
         tokens.append({
             'address': token_address,
@@ -374,6 +379,48 @@ def resolve_tokens_by_symbol(self, token_symbols, chain_spec_dict):
     return tokens
 
 
+@celery_app.task(bind=True, base=BaseTask)
+def token_symbols(self, chain_spec_dict):
+    """Returns the symbols of all tokens in the token registry
+
+    :param chain_spec_dict: Chain spec dict representation
+    :type chain_spec_dict: dict
+    :raises chainlib.error.RPCException: A token registry or token call failed
+    :return: Token symbols, in order of registration
+    :rtype: list of str
+    """
+    chain_spec = ChainSpec.from_dict(chain_spec_dict)
+    rpc = RPCConnection.connect(chain_spec, 'default')
+    registry = CICRegistry(chain_spec, rpc)
+    token_registry_address = lookup_name(registry, chain_spec, 'TokenRegistry', sender_address=self.call_address)
+
+    c = TokenUniqueSymbolIndex(chain_spec)
+    o = c.entry_count(token_registry_address, sender_address=self.call_address)
+    count = c.parse_entry_count(rpc.do(o))
+
+    requests = []
+    for i in range(count):
+        requests.append(c.entry(token_registry_address, i, sender_address=self.call_address))
+    token_addresses = []
+    for (r, e) in do_batch(rpc, requests):
+        if e != None:
+            raise e
+        token_addresses.append(c.parse_entry(r))
+
+    c = ERC20(chain_spec)
+    requests = []
+    for token_address in token_addresses:
+        requests.append(c.symbol(token_address, sender_address=self.call_address))
+    symbols = []
+    for (r, e) in do_batch(rpc, requests):
+        if e != None:
+            raise e
+        symbols.append(c.parse_symbol(r))
+
+    rpc.disconnect()
+    return symbols
+
+
 @celery_app.task(base=CriticalSQLAlchemyTask)
 def cache_transfer_data(
     tx_hash_hex,
@@ -532,6 +579,14 @@ def token_info(self, tokens, chain_spec_dict, proofs=[]):
 def verify_token_info(self, tokens, chain_spec_dict, success_callback, error_callback):
     queue = self.request.delivery_info.get('routing_key')
 
+    # a batch callback receives the results of all tokens in one call
+    # failed verifications are passed to it as error markers, since the chord would otherwise fail as a whole
+    batch = False
+    if success_callback != None:
+        callback_task = celery_app.tasks.get(success_callback['task'])
+        batch = getattr(callback_task, 'batch', False)
+
+    verify_tasks = []
     for token in tokens:
         s = celery.signature(
                 'cic_eth.eth.trust.verify_proofs',
@@ -543,15 +598,28 @@ def verify_token_info(self, tokens, chain_spec_dict, success_callback, error_cal
                     success_callback,
                     error_callback,
                     ],
+                {
+                    'batch': batch,
+                    },
                 queue=queue,
                 )
 
+        if batch:
+            verify_tasks.append(s)
+            continue
+
         if success_callback != None:
             s.link(success_callback)
         if error_callback != None:
             s.on_error(error_callback)
         s.apply_async()
 
+    if batch and len(verify_tasks) > 0:
+        s_callback = celery.signature(success_callback)
+        if error_callback != None:
+            s_callback.on_error(error_callback)
+        celery.chord(verify_tasks)(s_callback)
+
     return tokens
 
 
@@ -3,13 +3,22 @@ import logging
 
 # external imports
 import celery
+import redis
+from sqlalchemy import func
+from chainlib.chain import ChainSpec
+from chainlib.connection import RPCConnection
 from chainlib.eth.address import is_checksum_address, is_address, strip_0x
+from chainlib.eth.nonce import nonce as nonce_query
+from chainqueue.db.models.otx import Otx
+from chainqueue.db.models.tx import TxCache
+from hexathon import add_0x
 
 # local imports
 from cic_eth.db.models.role import AccountRole
 from cic_eth.db.models.base import SessionBase
 from cic_eth.encode import tx_normalize
 from cic_eth.task import CriticalSQLAlchemyTask
+from cic_eth.error import IntegrityError
 from cic_eth.db.models.nonce import (
         Nonce,
         NonceReservation,
@@ -19,14 +28,197 @@ celery_app = celery.current_app
 logg = logging.getLogger()
 
 
+class RedisNonceAllocator:
+    """Allocates nonces from per-sender counters in redis, instead of from the nonce table.
+
+    Redis increments are atomic, so any number of workers can allocate nonces for the same sender without holding a database row lock. Reservations for tasks are kept in redis too. Like reservations in the nonce table they do not expire, since the nonce of a reservation is already taken from the counter.
+
+    The counters are persisted to the nonce table as a high-water mark once for every block of allocated nonces, by the persist_nonce task. Before a process first allocates from the counter of a sender, the counter is reconciled with the highest of the persisted mark, the pending nonce on the network and the highest nonce of the sender in the queue. A missing counter is recovered the same way, and a counter restored behind from an earlier redis snapshot is never used to hand out nonces that were already used.
+
+    :param host: Redis host
+    :type host: str
+    :param port: Redis port
+    :type port: int
+    :param db: Redis database
+    :type db: int
+    :param block_size: Number of allocations between each persisted high-water mark
+    :type block_size: int
+    :param prefix: Redis key prefix
+    :type prefix: str
+    """
+
+    # increment only an existing counter, so a lost counter is never restarted from zero
+    incr_script = "if redis.call('exists', KEYS[1]) == 1 then return redis.call('incr', KEYS[1]) end return nil"
+    # raise the counter to the given value, but never lower it
+    max_script = "local v = tonumber(redis.call('get', KEYS[1])) local n = tonumber(ARGV[1]) if v == nil or v < n then redis.call('set', KEYS[1], n) return n end return v"
+
+    def __init__(self, host='localhost', port=6379, db=0, block_size=100, prefix='cic-eth:nonce'):
+        self.redis = redis.Redis(host=host, port=port, db=db)
+        self.block_size = block_size
+        self.prefix = prefix
+        self.incr = self.redis.register_script(self.incr_script)
+        self.max = self.redis.register_script(self.max_script)
+        self.reconciled = set()
+
+
+    def __key(self, address):
+        return '{}:{}'.format(self.prefix, address)
+
+
+    def __reservation_key(self, address, key):
+        return '{}:reservation:{}:{}'.format(self.prefix, address, key)
+
+
+    def reconcile(self, address, nonce):
+        """Raise the nonce counter for the given address to the given next nonce, if it is behind it or missing.
+
+        :param address: Normalized address
+        :type address: str
+        :param nonce: Next nonce that is known to be unused
+        :type nonce: int
+        :rtype: int
+        :returns: Next nonce of the counter after reconciling
+        """
+        r = int(self.max(keys=[self.__key(address)], args=[nonce]))
+        logg.debug('nonce counter for address {} is {} after reconciling with {}'.format(address, r, nonce))
+        return r
+
+
+    def recover(self, address, conn, session=None):
+        """Reconcile the nonce counter for the given address with the highest of the persisted mark, the pending nonce on the network and the highest nonce in the queue.
+
+        :param address: Normalized address
+        :type address: str
+        :param conn: RPC connection
+        :type conn: chainlib.connection.RPCConnection
+        :param session: Backend state integrity session
+        :type session: varies
+        :rtype: int
+        :returns: Next nonce of the counter after reconciling
+        """
+        session = SessionBase.bind_session(session)
+
+        nonce = Nonce.get(address, session=session)
+        if nonce == None:
+            nonce = 0
+
+        q = session.query(func.max(Otx.nonce))
+        q = q.join(TxCache, TxCache.otx_id==Otx.id)
+        q = q.filter(TxCache.sender==address)
+        r = q.first()
+        if r[0] != None and r[0] + 1 > nonce:
+            nonce = r[0] + 1
+
+        SessionBase.release_session(session)
+
+        o = nonce_query(add_0x(address))
+        r = conn.do(o)
+        network_nonce = int(r, 16)
+        if network_nonce > nonce:
+            nonce = network_nonce
+
+        return self.reconcile(address, nonce)
+
+
+    def next(self, address, conn, session=None):
+        """Allocate the next nonce for the given address.
+
+        :param address: Normalized address
+        :type address: str
+        :param conn: RPC connection, used if the nonce counter needs to be recovered
+        :type conn: chainlib.connection.RPCConnection
+        :param session: Backend state integrity session
+        :type session: varies
+        :rtype: int
+        :returns: Nonce
+        """
+        k = self.__key(address)
+        if address not in self.reconciled:
+            # the counter may have been restored from a snapshot taken before nonces were last allocated
+            self.recover(address, conn, session=session)
+            self.reconciled.add(address)
+        r = self.incr(keys=[k])
+        if r == None:
+            self.recover(address, conn, session=session)
+            r = self.incr(keys=[k])
+        return int(r) - 1
+
+
+    def high_water_mark(self, nonce):
+        """Return the high-water mark to persist after the given nonce has been allocated, if the nonce completes a block.
+
+        :param nonce: Allocated nonce
+        :type nonce: int
+        :rtype: int
+        :returns: Next nonce after the block, or None
+        """
+        if (nonce + 1) % self.block_size == 0:
+            return nonce + 1
+        return None
+
+
+    def reserve(self, address, key, conn, session=None):
+        """Allocate the next nonce for the given address, and reserve it for the given task key.
+
+        :param address: Normalized address
+        :type address: str
+        :param key: Task key
+        :type key: str
+        :param conn: RPC connection, used if the nonce counter needs to be recovered
+        :type conn: chainlib.connection.RPCConnection
+        :param session: Backend state integrity session
+        :type session: varies
+        :raises cic_eth.error.IntegrityError: Reservation for key already exists
+        :rtype: tuple
+        :returns: Task key and nonce
+        """
+        k = self.__reservation_key(address, key)
+        # claim the reservation before allocating, so that a nonce is never taken from the counter without being reserved
+        if not self.redis.set(k, '', nx=True):
+            raise IntegrityError('"next" called on nonce for key {} address {} during active key'.format(key, address))
+        try:
+            nonce = self.next(address, conn, session=session)
+        except Exception as e:
+            self.redis.delete(k)
+            raise e
+        self.redis.set(k, nonce)
+        return (key, nonce,)
+
+
+    def release(self, address, key):
+        """Release the nonce reserved for the given task key.
+
+        :param address: Normalized address
+        :type address: str
+        :param key: Task key
+        :type key: str
+        :raises cic_eth.error.IntegrityError: No reservation exists for key
+        :rtype: tuple
+        :returns: Task key and nonce
+        """
+        k = self.__reservation_key(address, key)
+        pipe = self.redis.pipeline()
+        pipe.get(k)
+        pipe.delete(k)
+        r = pipe.execute()
+        if r[0] == None or r[0] == b'':
+            raise IntegrityError('"release" called on key {} address {} which does not exists'.format(key, address))
+        return (key, int(r[0]),)
+
+
 class CustodialTaskNonceOracle():
     """Ensures atomic nonce increments for all transactions across all tasks and threads.
 
+    If a nonce allocator is set, nonces are reserved and released through it instead of the nonce table.
+
     :param address: Address to generate nonces for
     :type address: str, 0x-hex
     :param default_nonce: Initial nonce value to use if no nonce cache entry already exists
     :type default_nonce: number
     """
+
+    allocator = None
+
     def __init__(self, address, uuid, session=None):
         self.address = address
         self.uuid = uuid
@@ -44,7 +236,10 @@ class CustodialTaskNonceOracle():
         :rtype: number
         """
         address = tx_normalize.wallet_address(self.address)
-        r = NonceReservation.release(address, self.uuid, session=self.session)
+        if self.allocator != None:
+            r = self.allocator.release(address, self.uuid)
+        else:
+            r = NonceReservation.release(address, self.uuid, session=self.session)
         return r[1]
 
 
@@ -72,7 +267,24 @@ def reserve_nonce(self, chained_input, chain_spec_dict, signer_address=None):
 
     root_id = self.request.root_id
     address = tx_normalize.wallet_address(address)
-    r = NonceReservation.next(address, root_id, session=session)
+    allocator = CustodialTaskNonceOracle.allocator
+    if allocator != None:
+        chain_spec = ChainSpec.from_dict(chain_spec_dict)
+        rpc = RPCConnection.connect(chain_spec, 'default')
+        r = allocator.reserve(address, root_id, rpc, session=session)
+        mark = allocator.high_water_mark(r[1])
+        if mark != None:
+            s = celery.signature(
+                'cic_eth.eth.nonce.persist_nonce',
+                [
+                    address,
+                    mark,
+                    ],
+                queue=self.request.delivery_info.get('routing_key'),
+                )
+            s.apply_async()
+    else:
+        r = NonceReservation.next(address, root_id, session=session)
     logg.debug('nonce {} reserved for address {} task {}'.format(r[1], address, r[0]))
 
     session.commit()
@@ -80,3 +292,39 @@ def reserve_nonce(self, chained_input, chain_spec_dict, signer_address=None):
     session.close()
 
     return chained_input
+
+
+@celery_app.task(base=CriticalSQLAlchemyTask)
+def persist_nonce(address, nonce):
+    """Persist a nonce high-water mark from the nonce allocator to the nonce table.
+
+    The stored value is never decreased. If the stored mark is above the given one, the allocator counter is behind, and it is raised to the stored mark.
+
+    :param address: Normalized address
+    :type address: str
+    :param nonce: Next nonce to allocate
+    :type nonce: int
+    :rtype: int
+    :returns: Persisted nonce
+    """
+    session = SessionBase.create_session()
+    q = session.query(Nonce)
+    q = q.filter(Nonce.address_hex==address)
+    q = q.filter(Nonce.nonce<nonce)
+    c = q.update({Nonce.nonce: nonce}, synchronize_session=False)
+    stored = nonce
+    if c == 0:
+        stored = Nonce.get(address, session=session)
+        if stored == None:
+            Nonce.init(address, nonce=nonce, session=session)
+            stored = nonce
+    session.commit()
+    session.close()
+    logg.debug('persisted nonce {} for address {}'.format(nonce, address))
+
+    allocator = CustodialTaskNonceOracle.allocator
+    if allocator != None and stored > nonce:
+        logg.warning('nonce counter for address {} is behind persisted mark {}'.format(address, stored))
+        allocator.reconcile(address, stored)
+
+    return nonce
@@ -0,0 +1,395 @@
+# standard imports
+import os
+import logging
+import json
+import base64
+import ssl
+import time
+import select
+import threading
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+# external imports
+from chainlib.eth.tx import raw
+from chainlib.eth.connection import EthHTTPConnection
+from chainlib.connection import error_parser
+from chainlib.error import (
+        RPCException,
+        JSONRPCException,
+        )
+from chainlib.jsonrpc import jsonrpc_result
+from chainlib.hash import keccak256_hex_to_hex
+from hexathon import add_0x
+
+logg = logging.getLogger()
+
+# error messages of nodes that already have a submitted transaction in their pool (geth, openethereum)
+known_tx_errors = [
+    'already known',
+    'known transaction',
+    'already imported',
+    ]
+
+
+class RPCPool:
+    """Pool of persistent HTTP connections to JSON-RPC nodes, shared by all connection objects in a worker process.
+
+    Idle connections are kept per node, up to the given size. Before an idle connection is reused it is checked for having been closed by the node, and it is discarded if it has been idle longer than the health check interval.
+
+    Connections inherited from a parent process are never reused.
+
+    :param size: Maximum number of idle connections to keep per node
+    :type size: int
+    :param timeout: Socket timeout in seconds
+    :type timeout: float
+    :param health_interval: Maximum seconds a connection may be idle before it is discarded
+    :type health_interval: float
+    :param verify_identity: If False, TLS certificates are not verified
+    :type verify_identity: bool
+    """
+
+    def __init__(self, size=8, timeout=None, health_interval=60, verify_identity=True):
+        self.size = size
+        self.timeout = timeout
+        self.health_interval = health_interval
+        self.verify_identity = verify_identity
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+        self.idle = {}
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+        self.requests = 0
+        self.errors = 0
+
+
+    def __connect(self, scheme, netloc):
+        url = urlparse('{}://{}'.format(scheme, netloc))
+        if scheme == 'https':
+            ctx = None
+            if not self.verify_identity:
+                ctx = ssl.SSLContext()
+                ctx.verify_mode = ssl.CERT_NONE
+            h = http.client.HTTPSConnection(url.hostname, port=url.port, timeout=self.timeout, context=ctx)
+        else:
+            h = http.client.HTTPConnection(url.hostname, port=url.port, timeout=self.timeout)
+        logg.debug('new persistent rpc connection to {}'.format(netloc))
+        return h
+
+
+    def __healthy(self, h, t):
+        if time.time() - t > self.health_interval:
+            return False
+        if h.sock == None:
+            return True
+        try:
+            # an idle connection only becomes readable when the node has closed it
+            r = select.select([h.sock], [], [], 0)
+        except (OSError, ValueError):
+            return False
+        return r[0] == []
+
+
+    def checkout(self, scheme, netloc):
+        """Retrieve a connection to the given node, reusing an idle connection if a healthy one is available.
+
+        :param scheme: Url scheme, http or https
+        :type scheme: str
+        :param netloc: Node host and port
+        :type netloc: str
+        :rtype: tuple
+        :returns: Connection, and whether it is reused
+        """
+        k = (scheme, netloc,)
+        with self.lock:
+            if os.getpid() != self.pid:
+                # sockets opened before fork belong to the parent
+                self.idle = {}
+                self.pid = os.getpid()
+            idle = self.idle.get(k, [])
+            while len(idle) > 0:
+                (h, t) = idle.pop()
+                if self.__healthy(h, t):
+                    self.reused += 1
+                    return (h, True,)
+                h.close()
+                self.discarded += 1
+            self.created += 1
+        return (self.__connect(scheme, netloc), False,)
+
+
+    def checkin(self, scheme, netloc, h):
+        """Return a connection to the pool after use.
+
+        :param scheme: Url scheme, http or https
+        :type scheme: str
+        :param netloc: Node host and port
+        :type netloc: str
+        :param h: Connection
+        :type h: http.client.HTTPConnection
+        """
+        k = (scheme, netloc,)
+        with self.lock:
+            idle = self.idle.get(k)
+            if idle == None:
+                idle = []
+                self.idle[k] = idle
+            if len(idle) < self.size:
+                idle.append((h, time.time(),))
+                return
+            self.discarded += 1
+        h.close()
+
+
+    def post(self, location, data, headers={}):
+        """Post data to a node, and return the decoded JSON response.
+
+        If a reused connection turns out to have been closed by the node before the request could be written, the request is retried on another connection. Requests are never resent after they have been written, since the node may already have acted on them.
+
+        :param location: Node url
+        :type location: str
+        :param data: Request body
+        :type data: str
+        :param headers: Additional request headers
+        :type headers: dict
+        :raises ConnectionError: Node could not be reached, or responded with an error status
+        :rtype: any
+        :returns: Decoded response
+        """
+        url = urlparse(location)
+        path = url.path
+        if path == '':
+            path = '/'
+        if url.query != '':
+            path += '?' + url.query
+
+        request_headers = {
+            'Content-Type': 'application/json',
+            }
+        request_headers.update(headers)
+
+        self.requests += 1
+        while True:
+            (h, reused) = self.checkout(url.scheme, url.netloc)
+            try:
+                h.request('POST', path, body=data, headers=request_headers)
+            except (BrokenPipeError, ConnectionResetError) as e:
+                h.close()
+                # the node may close idle persistent connections, in which case the request could not be written
+                if reused:
+                    logg.debug('persistent rpc connection to {} was closed, reconnecting'.format(url.netloc))
+                    with self.lock:
+                        self.discarded += 1
+                    continue
+                self.errors += 1
+                raise ConnectionError(e)
+            except (OSError, http.client.HTTPException) as e:
+                h.close()
+                self.errors += 1
+                raise ConnectionError(e)
+
+            # once the request has been written the node may already have acted on it, so it is never resent
+            try:
+                r = h.getresponse()
+                resp = r.read()
+            except (OSError, http.client.HTTPException) as e:
+                h.close()
+                self.errors += 1
+                raise ConnectionError(e)
+
+            if r.will_close:
+                h.close()
+            else:
+                self.checkin(url.scheme, url.netloc, h)
+
+            if r.status != 200:
+                self.errors += 1
+                raise ConnectionError('rpc node responded with status {} {}'.format(r.status, r.reason))
+            return json.loads(resp)
+
+
+    def stats(self):
+        """Return pool usage counters.
+
+        :rtype: dict
+        :returns: Usage counters
+        """
+        idle = 0
+        for v in self.idle.values():
+            idle += len(v)
+        reuse_rate = 0.0
+        if self.created + self.reused > 0:
+            reuse_rate = self.reused / (self.created + self.reused)
+        return {
+            'size': self.size,
+            'idle': idle,
+            'created': self.created,
+            'reused': self.reused,
+            'discarded': self.discarded,
+            'requests': self.requests,
+            'errors': self.errors,
+            'reuse_rate': reuse_rate,
+                }
+
+
+default_pool = RPCPool()
+
+
+def auth_headers(conn):
+    """Generate authentication headers for the credentials of an RPC connection.
+
+    :param conn: RPC connection
+    :type conn: chainlib.connection.RPCConnection
+    :rtype: dict
+    :returns: Headers
+    """
+    headers = {}
+    auth = getattr(conn, 'auth', None)
+    if auth != None:
+        p = auth.urllib_header()
+        headers[p[0]] = p[1]
+    elif getattr(conn, 'basic', None) != None:
+        s = '{}:{}'.format(conn.basic[0], conn.basic[1])
+        headers['Authorization'] = 'Basic ' + base64.b64encode(s.encode('utf-8')).decode('utf-8')
+    return headers
+
+
+class PooledEthHTTPConnection(EthHTTPConnection):
+    """Ethereum JSON-RPC HTTP connection that sends requests over persistent connections from a shared pool.
+
+    Registered as the connection constructor for HTTP(S) node urls by cic_eth.cli.RPC when a pool is configured.
+    """
+
+    pool = default_pool
+
+
+    def do(self, o, error_parser=error_parser):
+        data = json.dumps(o)
+        logg.debug('(HTTP) send {}'.format(data))
+        result = self.pool.post(self.location, data, headers=auth_headers(self))
+        logg.debug('(HTTP) recv {}'.format(result))
+        if o['id'] != result['id']:
+            raise ValueError('RPC id mismatch; sent {} received {}'.format(o['id'], result['id']))
+        return jsonrpc_result(result, error_parser)
+
+
+def __post_each(pool, location, requests, headers, concurrency):
+    def __post(o):
+        return pool.post(location, json.dumps(o), headers=headers)
+
+    if len(requests) == 0:
+        return []
+
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(requests))) as executor:
+        return list(executor.map(__post, requests))
+
+
+def do_batch(conn, requests, error_parser=error_parser, concurrency=0):
+    """Execute JSON-RPC requests in a single JSON-RPC batch request.
+
+    The batch is posted over a persistent connection from the pool of the connection object, or the default pool. The node handles the requests in the order given.
+
+    If the RPC connection is not a JSON-RPC HTTP connection, the requests are executed one by one over the connection instead.
+
+    If the node does not accept batch requests and concurrency is set, the requests are posted individually with the given number of concurrent connections from the pool. In this case the order of execution is not guaranteed.
+
+    :param conn: RPC connection
+    :type conn: chainlib.connection.RPCConnection
+    :param requests: JSON-RPC query objects
+    :type requests: list of dict
+    :param error_parser: Error parser object to process JSON-RPC error responses with
+    :type error_parser: chainlib.jsonrpc.ErrorParser
+    :param concurrency: Maximum concurrent requests if batches are not accepted, or 0 to not fall back to individual requests
+    :type concurrency: int
+    :raises ConnectionError: Node could not be reached, or returned an invalid response.
+    :rtype: list of tuples
+    :returns: Result and exception (or None if successful) for each request, in the order given
+    """
+    location = getattr(conn, 'location', None)
+    if location == None or urlparse(location).scheme not in ['http', 'https']:
+        r = []
+        for o in requests:
+            try:
+                r.append((conn.do(o), None,))
+            except JSONRPCException as e:
+                r.append((None, e,))
+        return r
+
+    if len(requests) == 0:
+        return []
+
+    pool = getattr(conn, 'pool', default_pool)
+    headers = auth_headers(conn)
+    logg.debug('(HTTP) send batch of {} requests'.format(len(requests)))
+    result = pool.post(location, json.dumps(requests), headers=headers)
+    if not isinstance(result, list):
+        # a single error object is returned if the node rejects the batch as a whole
+        if concurrency == 0:
+            raise ConnectionError('rpc node rejected batch request: {}'.format(result))
+        logg.warning('rpc node rejected batch request, sending {} requests individually: {}'.format(len(requests), result))
+        result = __post_each(pool, location, requests, headers, concurrency)
+
+    responses = {}
+    for v in result:
+        responses[v.get('id')] = v
+
+    r = []
+    for o in requests:
+        try:
+            v = responses[o['id']]
+            r.append((jsonrpc_result(v, error_parser), None,))
+        except KeyError:
+            r.append((None, JSONRPCException('no response for request id {}'.format(o['id'])),))
+        except RPCException as e:
+            r.append((None, e,))
+    return r
+
+
+def is_known_tx_error(e):
+    """Check whether a send error means that the node already has the transaction.
+
+    :param e: Error returned for a eth_sendRawTransaction request
+    :type e: Exception
+    :rtype: bool
+    :returns: True if the transaction is already known by the node
+    """
+    s = str(e).lower()
+    for v in known_tx_errors:
+        if v in s:
+            return True
+    return False
+
+
+def send_raw_batch(conn, txs):
+    """Submit signed transactions to the node in a single JSON-RPC batch request.
+
+    The node handles the requests in the order given, so transactions from the same sender must be ordered by nonce.
+
+    A transaction the node reports as already known is considered sent, since the node already has it in its pool.
+
+    :param conn: RPC connection
+    :type conn: chainlib.connection.RPCConnection
+    :param txs: Signed raw transaction data
+    :type txs: list of str, 0x-hex
+    :raises ConnectionError: Node could not be reached, or returned an invalid response. No transactions are known to be sent.
+    :rtype: list of tuples
+    :returns: Transaction hash and JSONRPCException (or None if sent successfully) for each transaction, in the order given
+    """
+    tx_hashes = []
+    requests = []
+    for tx in txs:
+        tx_hex = add_0x(tx)
+        tx_hashes.append(add_0x(keccak256_hex_to_hex(tx_hex)))
+        requests.append(raw(tx_hex))
+
+    r = do_batch(conn, requests)
+    result = []
+    for i, v in enumerate(r):
+        e = v[1]
+        if e != None and is_known_tx_error(e):
+            logg.debug('transaction {} already known by node'.format(tx_hashes[i]))
+            e = None
+        result.append((tx_hashes[i], e,))
+    return result
@@ -13,6 +13,8 @@ from hexathon import strip_0x
 # local imports
 from cic_eth.task import BaseTask
 from cic_eth.error import TrustError
+from cic_eth.registry import lookup_name
+from cic_eth.callbacks import batch_error
 
 celery_app = celery.current_app
 logg = logging.getLogger()
@@ -33,7 +35,13 @@ def verify_proof(self, chained_input, proof, subject, chain_spec_dict, success_c
 
 
 @celery_app.task(bind=True, base=BaseTask)
-def verify_proofs(self, chained_input, subject, proofs, chain_spec_dict, success_callback, error_callback):
+def verify_proofs(self, chained_input, subject, proofs, chain_spec_dict, success_callback, error_callback, batch=False):
+    """Verify that each of the given proofs for a subject is declared by at least one trusted address.
+
+    If batch is set, a missing proof is returned as a batch error marker instead of raised, so that a chord of verifications for several subjects still completes.
+
+    :raises TrustError: Proof not declared by any trusted address, if batch is not set
+    """
     queue = self.request.delivery_info.get('routing_key')
 
     chain_spec = ChainSpec.from_dict(chain_spec_dict)
@@ -43,7 +51,7 @@ def verify_proofs(self, chained_input, subject, proofs, chain_spec_dict, success
     sender_address = AccountRole.get_address('DEFAULT', session)
 
     registry = CICRegistry(chain_spec, rpc)
-    declarator_address = registry.by_name('AddressDeclarator', sender_address=sender_address)
+    declarator_address = lookup_name(registry, chain_spec, 'AddressDeclarator', sender_address=sender_address)
 
     declarator = Declarator(chain_spec)
 
@@ -71,7 +79,10 @@ def verify_proofs(self, chained_input, subject, proofs, chain_spec_dict, success
     for proof in have_proofs.keys():
         if len(have_proofs[proof]) == 0:
             logg.error('missing signer for proof {} subject {}'.format(proof, subject))
-            raise TrustError((subject, proof,))
+            e = TrustError((subject, proof,))
+            if batch:
+                return batch_error(str(e))
+            raise e
         out_proofs[proof] = have_proofs[proof]
        
     return (chained_input, out_proofs)
@@ -39,7 +39,8 @@ from cic_eth.error import (
         TemporaryTxError,
         )
 from cic_eth.eth.gas import create_check_gas_task
-from cic_eth.admin.ctrl import lock_send
+from cic_eth.admin.ctrl import check_lock
+from cic_eth.db.enum import LockEnum
 from cic_eth.task import (
         CriticalSQLAlchemyTask,
         CriticalWeb3Task,
@@ -50,6 +51,8 @@ from cic_eth.task import (
 from cic_eth.queue.tx import (
         register_tx,
         )
+from cic_eth.queue.state import set_sent_batch
+from cic_eth.eth.rpc import send_raw_batch
 
 celery_app = celery.current_app
 logg = logging.getLogger()
@@ -97,9 +100,9 @@ def hashes_to_txs(self, tx_hashes):
 def send(self, txs, chain_spec_dict):
     """Send transactions to the network.
 
-    If more than one transaction is passed to the task, it will spawn a new send task with the remaining transaction(s) after the first in the list has been processed.
+    All transactions passed to the task are submitted to the node in a single JSON-RPC batch request, in the order given. Transactions from the same sender must be ordered by nonce.
 
-    Updates the outgoing transaction queue entry to SENT on successful send.
+    Updates the outgoing transaction queue entries to SENT on successful send, in a single state update task for all of the transactions.
 
     If a temporary error occurs, the queue entry is set to SENDFAIL.
 
@@ -113,7 +116,7 @@ def send(self, txs, chain_spec_dict):
     :type chain_str: str
     :raises TemporaryTxError: If unable to connect to node
     :raises PermanentTxError: If EVM execution fails immediately due to tx input, or if tx contents are invalid. 
-    :return: transaction hash of sent transaction
+    :return: transaction hash of first sent transaction
     :rtype: str, 0x-hex
     """
     if len(txs) == 0:
@@ -121,20 +124,19 @@ def send(self, txs, chain_spec_dict):
 
     chain_spec = ChainSpec.from_dict(chain_spec_dict)
 
-    tx_hex = add_0x(txs[0])
-
-    tx_hash_hex = add_0x(keccak256_hex_to_hex(tx_hex))
-
-    logg.debug('send transaction {} -> {}'.format(tx_hash_hex, tx_hex))
-
     queue = self.request.delivery_info.get('routing_key')
 
-    o = raw(tx_hex)
-    err_state = False
     conn = RPCConnection.connect(chain_spec, 'default')
-    try:
-        conn.do(o)
-    except JSONRPCException as e:
+    r = send_raw_batch(conn, txs)
+
+    tx_hashes = []
+    fails = []
+    for (tx_hash_hex, e) in r:
+        logg.debug('sent transaction {} error {}'.format(tx_hash_hex, e))
+        tx_hashes.append(tx_hash_hex)
+        fails.append(e != None)
+        if e == None:
+            continue
         logg.error('send to node failed! {}'.format(e))
         if self.debug_log:
             s_debug = celery.signature(
@@ -146,35 +148,75 @@ def send(self, txs, chain_spec_dict):
                     queue=queue,
                     )
             s_debug.apply_async()
-        err_state = True
 
-    r = None
     s_set_sent = celery.signature(
-        'cic_eth.queue.state.set_sent',
+        'cic_eth.queue.state.set_sent_batch',
         [
             chain_spec_dict,
-            tx_hash_hex,
-            err_state,
+            tx_hashes,
+            fails,
             ],
             queue=queue,
         )
-
     s_set_sent.apply_async()
 
-    tx_tail = txs[1:]
-    if len(tx_tail) > 0:
-        s = celery.signature(
-            'cic_eth.eth.tx.send',
-            [
-                tx_tail,
-                chain_spec_dict,
-            ],
-            queue=queue,
-                )
-        s.apply_async()
+    return tx_hashes[0]
 
-    return tx_hash_hex
 
+@celery_app.task(bind=True, base=CriticalSQLAlchemyAndWeb3Task)
+def send_batch(self, txs, chain_spec_dict, address):
+    """Send a batch of transactions from the same sender to the network, in the order given.
+
+    The queue lock for the sender is checked once for the whole batch. The transactions are then submitted to the node in a single JSON-RPC batch request.
+
+    Queue entries are updated to SENT or SENDFAIL in a single database transaction after the batch has been sent.
+
+    :param txs: Signed raw transaction data, ordered by nonce
+    :type txs: list of str, 0x-hex
+    :param chain_spec_dict: Chain spec, dict representation
+    :type chain_spec_dict: dict
+    :param address: Sender of the transactions
+    :type address: str, 0x-hex
+    :raises ValueError: Empty batch
+    :raises cic_eth.error.LockedError: Queue is locked for sender
+    :raises ConnectionError: If unable to connect to node
+    :return: Transaction hashes of sent transactions
+    :rtype: list of str, 0x-hex
+    """
+    if len(txs) == 0:
+        raise ValueError('no transaction to send')
+
+    check_lock(None, chain_spec_dict, LockEnum.QUEUE, address=address)
+
+    chain_spec = ChainSpec.from_dict(chain_spec_dict)
+    queue = self.request.delivery_info.get('routing_key')
+
+    conn = RPCConnection.connect(chain_spec, 'default')
+    r = send_raw_batch(conn, txs)
+
+    tx_hashes = []
+    fails = []
+    for (tx_hash_hex, e) in r:
+        tx_hashes.append(tx_hash_hex)
+        fails.append(e != None)
+        if e == None:
+            logg.debug('sent batch transaction {}'.format(tx_hash_hex))
+            continue
+        logg.error('send to node failed! {}'.format(e))
+        if self.debug_log:
+            s_debug = celery.signature(
+                'cic_eth.debug.debug_add',
+                [
+                    ','.join([str(chain_spec), tx_hash_hex]),
+                    str(e),
+                    ],
+                    queue=queue,
+                    )
+            s_debug.apply_async()
+
+    set_sent_batch(chain_spec_dict, tx_hashes, fails)
+
+    return tx_hashes
 
 
 @celery_app.task(bind=True, throws=(NotFoundEthException,), base=CriticalWeb3Task)
@@ -11,32 +11,67 @@ from eth_address_declarator import Declarator
 
 # local imports
 from cic_eth.task import BaseTask
+from cic_eth.eth.rpc import do_batch
+import cic_eth.registry
+from cic_eth.registry import (
+        LookupCache,
+        lookup_name,
+        )
 
 celery_app = celery.current_app
 
 logg = logging.getLogger()
 
 
-def translate_address(address, trusted_addresses, chain_spec, sender_address=ZERO_ADDRESS):
+def translate_address(address, trusted_addresses, chain_spec, sender_address=ZERO_ADDRESS, rpc=None):
+    """Resolve the declaration label of an address, using the lookup cache.
 
-    rpc = RPCConnection.connect(chain_spec, 'default')
+    The declarations of all trusted addresses are retrieved in a single batch request, and the first one that decodes as text is used.
+
+    :param address: Address to resolve
+    :type address: str, 0x-hex
+    :param trusted_addresses: Declarator addresses to trust, in order of preference
+    :type trusted_addresses: list of str, 0x-hex
+    :param chain_spec: Chain spec
+    :type chain_spec: chainlib.chain.ChainSpec
+    :param sender_address: Address to make the calls from
+    :type sender_address: str, 0x-hex
+    :param rpc: RPC connection, or None to connect to the default node
+    :type rpc: chainlib.connection.RPCConnection
+    :rtype: str
+    :returns: Declaration label, or None if no trusted address has declared the address
+    """
+    k = (str(chain_spec), address, tuple(trusted_addresses),)
+    (found, declaration) = cic_eth.registry.lookup_cache.get(LookupCache.DECLARATION, k)
+    if found:
+        return declaration
+
+    if rpc == None:
+        rpc = RPCConnection.connect(chain_spec, 'default')
     registry = CICRegistry(chain_spec, rpc)
     
-    declarator_address = registry.by_name('AddressDeclarator', sender_address=sender_address)
+    declarator_address = lookup_name(registry, chain_spec, 'AddressDeclarator', sender_address=sender_address)
     c = Declarator(chain_spec)
 
+    requests = []
     for trusted_address in trusted_addresses:
-        o = c.declaration(declarator_address, trusted_address, address, sender_address=sender_address)
-        r = rpc.do(o)
+        requests.append(c.declaration(declarator_address, trusted_address, address, sender_address=sender_address))
+
+    declaration = None
+    for (r, e) in do_batch(rpc, requests):
+        if e != None:
+            raise e
         declaration_hex = Declarator.parse_declaration(r)
         declaration_hex = declaration_hex[0].rstrip('0')
         declaration_bytes = bytes.fromhex(declaration_hex)
-        declaration = None
         try:
             declaration = declaration_bytes.decode('utf-8', errors='strict')
         except UnicodeDecodeError:
             continue
-        return declaration
+        break
+
+    cic_eth.registry.lookup_cache.put(LookupCache.DECLARATION, k, declaration)
+    return declaration
 
 
 @celery_app.task(bind=True, base=BaseTask)
@@ -19,18 +19,20 @@ from chainlib.eth.constant import ZERO_ADDRESS
 from chainlib.eth.tx import Tx
 from hexathon import strip_0x
 from cic_eth_registry import CICRegistry
-from cic_eth_registry.erc20 import ERC20Token
 from cic_eth_registry.error import UnknownContractError
 from chainqueue.db.models.otx import Otx
 from chainqueue.db.enum import StatusEnum
-from chainqueue.sql.query import get_tx_cache
 from eth_erc20 import ERC20
 from erc20_faucet import Faucet
 from potaahto.symbols import snake_and_camel
 
 # local imports
 from cic_eth.queue.time import tx_times
+from cic_eth.queue.query import get_tx_cache_batch_local
 from cic_eth.task import BaseTask
+from cic_eth.eth.rpc import do_batch
+import cic_eth.registry
+from cic_eth.registry import LookupCache
 from cic_eth.db.models.base import SessionBase
 from cic_eth.encode import tx_normalize
 
@@ -171,13 +173,14 @@ def list_tx_by_bloom(self, bloomspec, address, chain_spec_dict):
     return txs
 
 
-# TODO: Surely it must be possible to optimize this
 # TODO: DRY this with callback filter in cic_eth/runnable/manager
 # TODO: Remove redundant fields from end representation (timestamp, tx_hash)
 @celery_app.task(bind=True, base=BaseTask)
 def tx_collate(self, tx_batches, chain_spec_dict, offset, limit, newest_first=True, verify_contracts=True):
     """Merges transaction data from multiple sources and sorts them in chronological order.
 
+    The queue data of all signed transactions is retrieved with a single query, and the tokens of all transactions are verified and resolved together before the transactions are expanded.
+
     :param tx_batches: Transaction data inputs
     :type tx_batches: lists of lists of transaction data
     :param chain_str: Chain spec string representation
@@ -197,27 +200,37 @@ def tx_collate(self, tx_batches, chain_spec_dict, offset, limit, newest_first=Tr
     if isinstance(tx_batches, dict):
         tx_batches = [tx_batches]
 
-    session = SessionBase.create_session()
-
+    tx_hashes = []
     for b in tx_batches:
         for v in b.values():
-            tx = None
-            k = None
-            try:
-                hx = strip_0x(v)
-                tx = unpack(bytes.fromhex(hx), chain_spec)
-                txc = get_tx_cache(chain_spec, tx['hash'], session)
-                txc['timestamp'] = int(txc['date_created'].timestamp())
-                txc['hash'] = txc['tx_hash']
-                tx = txc
-            except TypeError:
+            if isinstance(v, dict):
                 tx = v
                 tx['timestamp'] = tx['date_created']
-            k = '{}.{}.{}'.format(tx['timestamp'], tx['sender'], tx['nonce'])
-            txs_by_block[k] = tx
+                k = '{}.{}.{}'.format(tx['timestamp'], tx['sender'], tx['nonce'])
+                txs_by_block[k] = tx
+                continue
+            hx = strip_0x(v)
+            tx = unpack(bytes.fromhex(hx), chain_spec)
+            tx_hashes.append(tx['hash'])
 
+    session = SessionBase.create_session()
+    txcs = get_tx_cache_batch_local(chain_spec, tx_hashes, session=session)
     session.close()
 
+    for tx in txcs.values():
+        tx['timestamp'] = int(tx['date_created'].timestamp())
+        tx['hash'] = tx['tx_hash']
+        k = '{}.{}.{}'.format(tx['timestamp'], tx['sender'], tx['nonce'])
+        txs_by_block[k] = tx
+
+    tokens = None
+    if verify_contracts:
+        rpc = RPCConnection.connect(chain_spec, 'default')
+        token_addresses = set()
+        for tx in txs_by_block.values():
+            token_addresses.update(unexpanded_tokens(tx))
+        tokens = lookup_tokens(chain_spec, rpc, token_addresses, sender_address=self.call_address)
+
     txs = []
     ks = list(txs_by_block.keys())
     ks.sort()
@@ -227,7 +240,7 @@ def tx_collate(self, tx_batches, chain_spec_dict, offset, limit, newest_first=Tr
         tx = txs_by_block[k]
         if verify_contracts:
             try:
-                tx = verify_and_expand(tx, chain_spec, sender_address=BaseTask.call_address)
+                tx = verify_and_expand(tx, chain_spec, sender_address=self.call_address, tokens=tokens)
             except UnknownContractError:
                 logg.error('verify failed on tx {}, skipping'.format(tx['hash']))
                 continue
@@ -238,20 +251,107 @@ def tx_collate(self, tx_batches, chain_spec_dict, offset, limit, newest_first=Tr
     return txs
 
 
-def verify_and_expand(tx, chain_spec, sender_address=ZERO_ADDRESS):
-    rpc = RPCConnection.connect(chain_spec, 'default')
-    registry = CICRegistry(chain_spec, rpc)
+def unexpanded_tokens(tx):
+    """Returns the addresses of the tokens of a transaction that do not have their symbols and decimals set.
 
-    if tx.get('source_token_symbol') == None and tx['source_token'] != ZERO_ADDRESS:
-        r = registry.by_address(tx['source_token'], sender_address=sender_address)
-        token = ERC20Token(chain_spec, rpc, tx['source_token'])
-        tx['source_token_symbol'] = token.symbol
-        tx['source_token_decimals'] = token.decimals
-
-    if tx.get('destination_token_symbol') == None and tx['destination_token'] != ZERO_ADDRESS:
-        r = registry.by_address(tx['destination_token'], sender_address=sender_address)
-        token = ERC20Token(chain_spec, rpc, tx['destination_token'])
-        tx['destination_token_symbol'] = token.symbol
-        tx['destination_token_decimals'] = token.decimals
+    :param tx: Transaction data
+    :type tx: dict
+    :rtype: list of str, 0x-hex
+    :returns: Token addresses
+    """
+    token_addresses = []
+    for p in ['source', 'destination']:
+        if tx.get(p + '_token_symbol') == None and tx[p + '_token'] != ZERO_ADDRESS:
+            token_addresses.append(tx[p + '_token'])
+    return token_addresses
+
+
+def lookup_tokens(chain_spec, rpc, token_addresses, sender_address=ZERO_ADDRESS):
+    """Verifies tokens against the registry, and retrieves their symbols and decimals.
+
+    Results are kept in the lookup cache. The symbols and decimals of all tokens not in the cache are retrieved in a single batch request.
+
+    :param chain_spec: Chain spec
+    :type chain_spec: chainlib.chain.ChainSpec
+    :param rpc: RPC connection
+    :type rpc: chainlib.connection.RPCConnection
+    :param token_addresses: Token addresses
+    :type token_addresses: iterable of str, 0x-hex
+    :param sender_address: Address to make the calls from
+    :type sender_address: str, 0x-hex
+    :raises chainlib.error.RPCException: A token call failed
+    :rtype: dict
+    :returns: Symbol and decimals by token address, or None for tokens that are not in the registry
+    """
+    registry = CICRegistry(chain_spec, rpc)
+    tokens = {}
+    unresolved = []
+    for token_address in token_addresses:
+        k = (str(chain_spec), CICRegistry.address, 'address', token_address,)
+        (found, token) = cic_eth.registry.lookup_cache.get(LookupCache.TOKEN, k)
+        if found:
+            tokens[token_address] = token
+            continue
+        try:
+            registry.by_address(token_address, sender_address=sender_address)
+        except UnknownContractError:
+            cic_eth.registry.lookup_cache.put(LookupCache.TOKEN, k, None)
+            tokens[token_address] = None
+            continue
+        unresolved.append(token_address)
+
+    if len(unresolved) == 0:
+        return tokens
+
+    c = ERC20(chain_spec)
+    requests = []
+    for token_address in unresolved:
+        requests.append(c.symbol(token_address, sender_address=sender_address))
+        requests.append(c.decimals(token_address, sender_address=sender_address))
+    r = do_batch(rpc, requests)
+
+    for i, token_address in enumerate(unresolved):
+        (symbol, e) = r[i * 2]
+        if e != None:
+            raise e
+        (decimals, e) = r[(i * 2) + 1]
+        if e != None:
+            raise e
+        token = (c.parse_symbol(symbol), c.parse_decimals(decimals),)
+        k = (str(chain_spec), CICRegistry.address, 'address', token_address,)
+        cic_eth.registry.lookup_cache.put(LookupCache.TOKEN, k, token)
+        tokens[token_address] = token
+
+    return tokens
+
+
+def verify_and_expand(tx, chain_spec, sender_address=ZERO_ADDRESS, tokens=None):
+    """Adds the symbols and decimals of the tokens of a transaction to the transaction data.
+
+    :param tx: Transaction data
+    :type tx: dict
+    :param chain_spec: Chain spec
+    :type chain_spec: chainlib.chain.ChainSpec
+    :param sender_address: Address to make the calls from
+    :type sender_address: str, 0x-hex
+    :param tokens: Token details as returned by lookup_tokens, or None to look up the tokens of the transaction
+    :type tokens: dict
+    :raises cic_eth_registry.error.UnknownContractError: A token is not in the registry
+    :rtype: dict
+    :returns: Transaction data
+    """
+    if tokens == None:
+        rpc = RPCConnection.connect(chain_spec, 'default')
+        tokens = lookup_tokens(chain_spec, rpc, unexpanded_tokens(tx), sender_address=sender_address)
+
+    for p in ['source', 'destination']:
+        token_address = tx[p + '_token']
+        if tx.get(p + '_token_symbol') != None or token_address == ZERO_ADDRESS:
+            continue
+        token = tokens.get(token_address)
+        if token == None:
+            raise UnknownContractError(token_address)
+        tx[p + '_token_symbol'] = token[0]
+        tx[p + '_token_decimals'] = token[1]
 
     return tx
@@ -1,3 +1,4 @@
+import asyncio
 import json
 import logging
 import mmap
@@ -15,12 +16,17 @@ class TestGetter:
         """   
         def __init__(self, _cs, _rh, _rp, _rdb, _rto) -> None:         
             self.callback_task = 'cic_eth.pytest.mock.callback.test_getter_callback'
-            self.callback_param = str(uuid.uuid4())
 
-        def get_callback_param(self):
-            return self.callback_param
+        async def open(self):
+            return str(uuid.uuid4())
 
-        def read_mm(self, callback_param, timeout=15):
+        async def close(self):
+            pass
+
+        def discard(self, callback_param):
+            pass
+
+        async def read_mm(self, callback_param, timeout=15):
             """Read Memory Map created by `cic_eth.pytest.mock.callback.test_getter_callback` task and identified by the `callback_param`
 
             Args:
@@ -43,7 +49,7 @@ class TestGetter:
                     f = open(fp, 'rb')
                     f.close()
                 except FileNotFoundError:
-                    time.sleep(0.1)
+                    await asyncio.sleep(0.1)
                     log.debug('look for {}'.format(fp))
                     continue
                 f = open(fp, 'rb')
@@ -60,13 +66,12 @@ class TestGetter:
                     data = v.decode()
 
                 return data
-        def get(self, length=4000, catch=1):
+        async def get(self, callback_param, length=4000, catch=1):
                 if catch==1:
-                    return self.read_mm(f"{self.callback_param}_0")
+                    return await self.read_mm(f"{callback_param}_0")
                 else:
                     data = []
                     for i in range(catch):
-                        result = self.read_mm(f"{self.callback_param}_{i}")
+                        result = await self.read_mm(f"{callback_param}_{i}")
                         data.append(result)
                     return data
-                
\ No newline at end of file
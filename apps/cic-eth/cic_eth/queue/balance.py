@@ -3,6 +3,10 @@ import logging
 
 # third-party imports
 import celery
+from sqlalchemy import (
+        func,
+        literal,
+        )
 from chainlib.chain import ChainSpec
 from hexathon import strip_0x
 from chainqueue.db.models.otx import Otx
@@ -14,6 +18,7 @@ from chainqueue.db.enum import (
 
 # local imports
 from cic_eth.db import SessionBase
+from cic_eth.db.models.balance import PendingBalance
 from cic_eth.task import CriticalSQLAlchemyTask
 from cic_eth.encode import tx_normalize
 
@@ -22,22 +27,80 @@ celery_app = celery.current_app
 logg = logging.getLogger()
 
 
-def __balance_outgoing_compatible(token_address, holder_address):
-    token_address = tx_normalize.executable_address(token_address)
+def __balance_pending_compatible(token_addresses, holder_address):
+    token_addresses = [tx_normalize.executable_address(v) for v in token_addresses]
     holder_address = tx_normalize.wallet_address(holder_address)
 
+    balances = {}
+    for token_address in token_addresses:
+        balances[token_address] = (0, 0,)
+
     session = SessionBase.create_session()
-    q = session.query(TxCache.from_value)
-    q = q.join(Otx)
-    q = q.filter(TxCache.sender==holder_address)
+
+    if PendingBalance.enabled:
+        balances.update(PendingBalance.get(holder_address, token_addresses, session=session))
+        session.close()
+        return balances
+
     status_compare = dead()
-    q = q.filter(Otx.status.op('&')(status_compare)==0)
-    q = q.filter(TxCache.source_token_address==token_address)
-    delta = 0
-    for r in q.all():
-        delta += int(r[0])
+
+    q_outgoing = session.query(
+            TxCache.source_token_address.label('token_address'),
+            literal(0).label('direction'),
+            func.sum(TxCache.from_value).label('value'),
+            )
+    q_outgoing = q_outgoing.join(Otx)
+    q_outgoing = q_outgoing.filter(TxCache.sender==holder_address)
+    q_outgoing = q_outgoing.filter(Otx.status.op('&')(status_compare)==0)
+    q_outgoing = q_outgoing.filter(TxCache.source_token_address.in_(token_addresses))
+    q_outgoing = q_outgoing.group_by(TxCache.source_token_address)
+
+    q_incoming = session.query(
+            TxCache.destination_token_address.label('token_address'),
+            literal(1).label('direction'),
+            func.sum(TxCache.to_value).label('value'),
+            )
+    q_incoming = q_incoming.join(Otx)
+    q_incoming = q_incoming.filter(TxCache.recipient==holder_address)
+    q_incoming = q_incoming.filter(Otx.status.op('&')(status_compare)==0)
+    # TODO: this can change the result for the recipient if tx is later obsoleted and resubmission is delayed. 
+    #q_incoming = q_incoming.filter(Otx.status.op('&')(StatusBits.IN_NETWORK)==StatusBits.IN_NETWORK)
+    q_incoming = q_incoming.filter(TxCache.destination_token_address.in_(token_addresses))
+    q_incoming = q_incoming.group_by(TxCache.destination_token_address)
+
+    for r in q_outgoing.union_all(q_incoming).all():
+        if r[2] == None:
+            continue
+        v = balances[r[0]]
+        if r[1] == 0:
+            balances[r[0]] = (v[0], v[1] + int(r[2]),)
+        else:
+            balances[r[0]] = (v[0] + int(r[2]), v[1],)
+
     session.close()
-    return delta
+    return balances
+
+
+@celery_app.task(base=CriticalSQLAlchemyTask)
+def balance_pending(tokens, holder_address, chain_spec_dict):
+    """Retrieve accumulated value of unprocessed transactions sent from and to be received by the given address.
+
+    :param tokens: list of token spec dicts with addresses to retrieve balances for
+    :type tokens: list of str, 0x-hex
+    :param holder_address: Holder address
+    :type holder_address: str, 0x-hex
+    :param chain_str: Chain spec string representation
+    :type chain_str: str
+    :returns: Tokens dicts with incoming and outgoing balance added
+    :rtype: dict
+    """
+    balances = __balance_pending_compatible([t['address'] for t in tokens], holder_address)
+    for t in tokens:
+        b = balances[tx_normalize.executable_address(t['address'])]
+        t['balance_incoming'] = b[0]
+        t['balance_outgoing'] = b[1]
+
+    return tokens
 
 
 @celery_app.task(base=CriticalSQLAlchemyTask)
@@ -53,34 +116,13 @@ def balance_outgoing(tokens, holder_address, chain_spec_dict):
     :returns: Tokens dicts with outgoing balance added
     :rtype: dict
     """
-    chain_spec = ChainSpec.from_dict(chain_spec_dict)
+    balances = __balance_pending_compatible([t['address'] for t in tokens], holder_address)
     for t in tokens: 
-        b = __balance_outgoing_compatible(t['address'], holder_address)
-        t['balance_outgoing'] = b
+        t['balance_outgoing'] = balances[tx_normalize.executable_address(t['address'])][1]
 
     return tokens
 
 
-def __balance_incoming_compatible(token_address, receiver_address):
-    token_address = tx_normalize.executable_address(token_address)
-    receiver_address = tx_normalize.wallet_address(receiver_address)
-
-    session = SessionBase.create_session()
-    q = session.query(TxCache.to_value)
-    q = q.join(Otx)
-    q = q.filter(TxCache.recipient==receiver_address)
-    status_compare = dead()
-    q = q.filter(Otx.status.op('&')(status_compare)==0)
-    # TODO: this can change the result for the recipient if tx is later obsoleted and resubmission is delayed. 
-    #q = q.filter(Otx.status.op('&')(StatusBits.IN_NETWORK)==StatusBits.IN_NETWORK)
-    q = q.filter(TxCache.destination_token_address==token_address)
-    delta = 0
-    for r in q.all():
-        delta += int(r[0])
-    session.close()
-    return delta
-
-
 @celery_app.task(base=CriticalSQLAlchemyTask)
 def balance_incoming(tokens, receipient_address, chain_spec_dict):
     """Retrieve accumulated value of unprocessed transactions to be received by the given address.
@@ -94,10 +136,9 @@ def balance_incoming(tokens, receipient_address, chain_spec_dict):
     :returns: Tokens dicts with outgoing balance added
     :rtype: dict
     """
-    chain_spec = ChainSpec.from_dict(chain_spec_dict)
+    balances = __balance_pending_compatible([t['address'] for t in tokens], receipient_address)
     for t in tokens: 
-        b = __balance_incoming_compatible(t['address'], receipient_address)
-        t['balance_incoming'] = b
+        t['balance_incoming'] = balances[tx_normalize.executable_address(t['address'])][0]
 
     return tokens
 
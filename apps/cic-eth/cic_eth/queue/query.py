@@ -5,11 +5,13 @@ import datetime
 import celery
 from chainlib.chain import ChainSpec
 import chainqueue.sql.query
-from chainlib.eth.tx import unpack
 from chainqueue.db.enum import (
         StatusEnum,
         is_alive,
+        status_str,
         )
+from chainqueue.error import NotLocalTxError
+from hexathon import add_0x
 from sqlalchemy import func
 from sqlalchemy import or_
 from chainqueue.db.models.tx import TxCache
@@ -42,6 +44,57 @@ def get_tx_cache_local(chain_spec, tx_hash, session=None):
     return r
 
 
+def get_tx_cache_batch_local(chain_spec, tx_hashes, session=None):
+    """Returns the aggregate transaction data of multiple queued transactions, retrieved with a single query.
+
+    :param chain_spec: Chain spec for transaction network
+    :type chain_spec: chainlib.chain.ChainSpec
+    :param tx_hashes: Transaction hashes
+    :type tx_hashes: list of str, 0x-hex
+    :param session: Backend state integrity session
+    :type session: varies
+    :raises NotLocalTxError: If a transaction is not found in queue.
+    :returns: Transaction data in the format of get_tx_cache, by normalized transaction hash
+    :rtype: dict
+    """
+    tx_hashes = [tx_normalize.tx_hash(tx_hash) for tx_hash in tx_hashes]
+    if len(tx_hashes) == 0:
+        return {}
+
+    session = SessionBase.bind_session(session)
+    q = session.query(Otx, TxCache)
+    q = q.join(TxCache, TxCache.otx_id==Otx.id)
+    q = q.filter(Otx.tx_hash.in_(tx_hashes))
+
+    txs = {}
+    for (otx, txc) in q.all():
+        txs[otx.tx_hash] = {
+            'tx_hash': add_0x(otx.tx_hash),
+            'signed_tx': add_0x(otx.signed_tx),
+            'nonce': otx.nonce,
+            'status': status_str(otx.status),
+            'status_code': otx.status,
+            'source_token': add_0x(txc.source_token_address),
+            'destination_token': add_0x(txc.destination_token_address),
+            'block_number': otx.block,
+            'tx_index': txc.tx_index,
+            'sender': add_0x(txc.sender),
+            'recipient': add_0x(txc.recipient),
+            'from_value': int(txc.from_value),
+            'to_value': int(txc.to_value),
+            'date_created': txc.date_created,
+            'date_updated': txc.date_updated,
+            'date_checked': txc.date_checked,
+                }
+    SessionBase.release_session(session)
+
+    for tx_hash in tx_hashes:
+        if txs.get(tx_hash) == None:
+            raise NotLocalTxError(tx_hash)
+
+    return txs
+
+
 @celery_app.task(base=CriticalSQLAlchemyTask)
 def get_tx(chain_spec_dict, tx_hash):
     chain_spec = ChainSpec.from_dict(chain_spec_dict)
@@ -114,13 +167,17 @@ def get_nonce_tx_local(chain_spec, nonce, sender, session=None):
     return chainqueue.sql.query.get_nonce_tx_cache(chain_spec, nonce, sender, decoder=unpack_normal, session=session)
 
 
-def get_upcoming_tx(chain_spec, status=StatusEnum.READYSEND, not_status=None, recipient=None, before=None, limit=0, session=None):
+def get_upcoming_tx(chain_spec, status=StatusEnum.READYSEND, not_status=None, recipient=None, before=None, limit=0, sender_limit=1, session=None):
     """Returns the next pending transaction, specifically the transaction with the lowest nonce, for every recipient that has pending transactions.
 
     Will omit addresses that have the LockEnum.SEND bit in Lock set.
 
     (TODO) Will not return any rows if LockEnum.SEND bit in Lock is set for zero address.
 
+    If sender_limit is more than 1, the transactions with the lowest nonces up to that number are returned for every sender.
+
+    The transactions for all senders are selected in a single query, and the check date of all returned transactions is updated in a single statement.
+
     :param status: Defines the status used to filter as upcoming.
     :type status: cic_eth.db.enum.StatusEnum
     :param recipient: Ethereum address of recipient to return transaction for
@@ -129,75 +186,90 @@ def get_upcoming_tx(chain_spec, status=StatusEnum.READYSEND, not_status=None, re
     :type before: datetime.datetime
     :param chain_id: Chain id to use to parse signed transaction data
     :type chain_id: number
+    :param limit: Max number of transactions to return, 0 for no limit
+    :type limit: int
+    :param sender_limit: Max number of transactions to return for each sender
+    :type sender_limit: int
     :raises ValueError: Status is finalized, sent or never attempted sent
     :returns: Transactions
     :rtype: dict, with transaction hash as key, signed raw transaction as value
     """
+    if not is_alive(status):
+        raise ValueError('not a valid non-final tx value: {}'.format(status))
+
     if recipient != None:
         recipient = tx_normalize.wallet_address(recipient)
     session = SessionBase.bind_session(session)
-    q_outer = session.query(
+
+    # all matching transactions, with the rank of their nonce among the matching nonces of their sender
+    q = session.query(
+            Otx.id.label('otx_id'),
+            Otx.tx_hash,
+            Otx.signed_tx,
+            Otx.nonce,
             TxCache.sender,
-            func.min(Otx.nonce).label('nonce'),
+            TxCache.date_checked,
+            func.dense_rank().over(
+                partition_by=TxCache.sender,
+                order_by=Otx.nonce.asc(),
+                ).label('nonce_rank'),
             )
-    q_outer = q_outer.join(TxCache)
-    q_outer = q_outer.join(Lock, isouter=True)
-    q_outer = q_outer.filter(or_(Lock.flags==None, Lock.flags.op('&')(LockEnum.SEND.value)==0))
+    q = q.join(TxCache)
+    q = q.join(Lock, Lock.address==TxCache.sender, isouter=True)
+    q = q.filter(or_(Lock.flags==None, Lock.flags.op('&')(LockEnum.SEND.value)==0))
 
-
-    if not is_alive(status):
-        SessionBase.release_session(session)
-        raise ValueError('not a valid non-final tx value: {}'.format(status))
     if status == StatusEnum.PENDING:
-        q_outer = q_outer.filter(Otx.status==status.value)
+        q = q.filter(Otx.status==status.value)
     else:
-        q_outer = q_outer.filter(Otx.status.op('&')(status)==status)
+        q = q.filter(Otx.status.op('&')(status)==status)
 
     if not_status != None:
-        q_outer = q_outer.filter(Otx.status.op('&')(not_status)==0)
+        q = q.filter(Otx.status.op('&')(not_status)==0)
 
     if recipient != None:
-        q_outer = q_outer.filter(TxCache.recipient==recipient)
+        q = q.filter(TxCache.recipient==recipient)
+
+    q_candidate = q.subquery()
+
+    # of the transactions with the lowest nonces, pick the most recently checked for every sender and nonce
+    q = session.query(
+            q_candidate.c.otx_id,
+            q_candidate.c.tx_hash,
+            q_candidate.c.signed_tx,
+            func.row_number().over(
+                partition_by=(q_candidate.c.sender, q_candidate.c.nonce,),
+                order_by=q_candidate.c.date_checked.desc(),
+                ).label('rank'),
+            )
+    q = q.filter(q_candidate.c.nonce_rank<=sender_limit)
 
-    q_outer = q_outer.group_by(TxCache.sender)
+    if before != None:
+        q = q.filter(q_candidate.c.date_checked<before)
 
-    txs = {}
+    q_ranked = q.subquery()
 
-    i = 0
-    for r in q_outer.all():
-        q = session.query(Otx)
-        q = q.join(TxCache)
-        q = q.filter(TxCache.sender==r.sender)
-        q = q.filter(Otx.nonce==r.nonce)
-        q = q.filter(Otx.status.op('&')(status)==status)
-
-        if before != None:
-            q = q.filter(TxCache.date_checked<before)
-       
-        q = q.order_by(TxCache.date_checked.desc())
-        o = q.first()
+    q = session.query(
+            q_ranked.c.otx_id,
+            q_ranked.c.tx_hash,
+            q_ranked.c.signed_tx,
+            )
+    q = q.filter(q_ranked.c.rank==1)
+    q = q.order_by(q_ranked.c.otx_id.asc())
+    if limit > 0:
+        q = q.limit(limit)
 
-        # TODO: audit; should this be possible if a row is found in the initial query? If not, at a minimum log error.
-        if o == None:
-            continue
+    txs = {}
+    otx_ids = []
+    for r in q.all():
+        txs[r.tx_hash] = r.signed_tx
+        otx_ids.append(r.otx_id)
 
-        tx_signed_bytes = bytes.fromhex(o.signed_tx)
-        tx = unpack(tx_signed_bytes, chain_spec)
-        txs[o.tx_hash] = o.signed_tx
-        
+    if len(otx_ids) > 0:
         q = session.query(TxCache)
-        q = q.filter(TxCache.otx_id==o.id)
-        o = q.first()
-
-        o.date_checked = datetime.datetime.now()
-        session.add(o)
+        q = q.filter(TxCache.otx_id.in_(otx_ids))
+        q.update({TxCache.date_checked: datetime.datetime.now()}, synchronize_session=False)
         session.commit()
 
-        i += 1
-        if limit > 0 and limit == i:
-            break
-
     SessionBase.release_session(session)
 
     return txs
-
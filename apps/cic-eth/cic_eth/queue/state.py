@@ -1,6 +1,13 @@
+# standard imports
+import logging
+
 # external imports
 from chainlib.chain import ChainSpec
 import chainqueue.sql.state
+from chainqueue.error import (
+        NotLocalTxError,
+        TxStateChangeError,
+        )
 
 # local imports
 import celery
@@ -9,6 +16,7 @@ from cic_eth.db.models.base import SessionBase
 from cic_eth.encode import tx_normalize
 
 celery_app = celery.current_app
+logg = logging.getLogger()
 
 
 @celery_app.task(base=CriticalSQLAlchemyTask)
@@ -21,6 +29,39 @@ def set_sent(chain_spec_dict, tx_hash, fail=False):
     return r
 
 
+@celery_app.task(base=CriticalSQLAlchemyTask)
+def set_sent_batch(chain_spec_dict, tx_hashes, fails):
+    """Set SENT or SENDFAIL state for a batch of transactions, committed in a single database transaction.
+
+    Transactions whose state cannot be changed are skipped.
+
+    :param chain_spec_dict: Chain spec, dict representation
+    :type chain_spec_dict: dict
+    :param tx_hashes: Transaction hashes
+    :type tx_hashes: list of str, 0x-hex
+    :param fails: Send failure flag for each transaction
+    :type fails: list of bool
+    :rtype: list of str, 0x-hex
+    :returns: Transaction hashes whose state was changed
+    """
+    chain_spec = ChainSpec.from_dict(chain_spec_dict)
+    session = SessionBase.create_session()
+    r = []
+    for i, tx_hash in enumerate(tx_hashes):
+        tx_hash = tx_normalize.tx_hash(tx_hash)
+        session.begin_nested()
+        try:
+            chainqueue.sql.state.set_sent(chain_spec, tx_hash, fails[i], session=session)
+        except (NotLocalTxError, TxStateChangeError) as e:
+            logg.error('could not set sent state for {}: {}'.format(tx_hash, e))
+            session.rollback()
+            continue
+        r.append(tx_hash)
+    session.commit()
+    session.close()
+    return r
+
+
 @celery_app.task(base=CriticalSQLAlchemyTask)
 def set_final(chain_spec_dict, tx_hash, block=None, tx_index=None, fail=False):
     tx_hash = tx_normalize.tx_hash(tx_hash)
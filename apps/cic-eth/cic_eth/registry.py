@@ -1,8 +1,12 @@
 # standard imports
 import logging
+import time
+import threading
 
 # external imports
+import redis
 from cic_eth_registry import CICRegistry
+from cic_eth_registry.error import UnknownContractError
 from cic_eth_registry.lookup.declarator import AddressDeclaratorLookup
 from cic_eth_registry.lookup.tokenindex import TokenIndexLookup
 from chainlib.eth.constant import ZERO_ADDRESS
@@ -10,6 +14,215 @@ from chainlib.eth.constant import ZERO_ADDRESS
 logg = logging.getLogger()
 
 
+class LookupCache:
+    """Cache for results of registry and declarator lookups, shared by all tasks in a process.
+
+    Entries are kept for a time-to-live that depends on the kind of lookup. Lookups that did not resolve are cached too, with a separate time-to-live.
+
+    If a redis host is given, a generation counter in redis is checked at most once every check interval, and all entries are dropped when it has changed. This lets the tracker invalidate the caches of all worker processes when it sees a write to the registry contracts.
+
+    :param name_ttl: Seconds to cache registry name to address lookups
+    :type name_ttl: float
+    :param token_ttl: Seconds to cache token symbol to address lookups
+    :type token_ttl: float
+    :param declaration_ttl: Seconds to cache address to declaration label lookups
+    :type declaration_ttl: float
+    :param negative_ttl: Seconds to cache lookups that did not resolve
+    :type negative_ttl: float
+    :param host: Redis host for the shared generation counter, or None to invalidate only locally
+    :type host: str
+    :param port: Redis port
+    :type port: int
+    :param db: Redis database
+    :type db: int
+    :param check_interval: Minimum seconds between each check of the shared generation counter
+    :type check_interval: float
+    :param key: Redis key of the shared generation counter
+    :type key: str
+    """
+
+    NAME = 'name'
+    TOKEN = 'token'
+    DECLARATION = 'declaration'
+
+    def __init__(self, name_ttl=300, token_ttl=300, declaration_ttl=60, negative_ttl=30, host=None, port=6379, db=0, check_interval=1.0, key='cic-eth:lookup:generation'):
+        self.ttl = {
+            LookupCache.NAME: name_ttl,
+            LookupCache.TOKEN: token_ttl,
+            LookupCache.DECLARATION: declaration_ttl,
+            }
+        self.negative_ttl = negative_ttl
+        self.redis = None
+        if host != None:
+            self.redis = redis.Redis(host=host, port=port, db=db)
+        self.check_interval = check_interval
+        self.key = key
+        self.generation = None
+        self.checked = 0
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+
+    @classmethod
+    def from_config(cls, config):
+        """Create a lookup cache from the lookup and redis configuration sections.
+
+        :param config: Configuration
+        :type config: confini.Config
+        :rtype: cic_eth.registry.LookupCache
+        :returns: Lookup cache
+        """
+        host = None
+        if config.true('LOOKUP_SHARED'):
+            host = config.get('REDIS_HOST')
+        return cls(
+                name_ttl=float(config.get('LOOKUP_NAME_TTL')),
+                token_ttl=float(config.get('LOOKUP_TOKEN_TTL')),
+                declaration_ttl=float(config.get('LOOKUP_DECLARATION_TTL')),
+                negative_ttl=float(config.get('LOOKUP_NEGATIVE_TTL')),
+                host=host,
+                port=config.get('REDIS_PORT'),
+                db=config.get('REDIS_DB'),
+                check_interval=float(config.get('LOOKUP_CHECK_INTERVAL')),
+                )
+
+
+    def __sync(self):
+        if self.redis == None:
+            return
+        now = time.time()
+        if now - self.checked < self.check_interval:
+            return
+        self.checked = now
+        try:
+            generation = self.redis.get(self.key)
+        except redis.exceptions.RedisError as e:
+            logg.warning('could not check lookup cache generation, dropping cache: {}'.format(e))
+            self.entries = {}
+            return
+        if generation != self.generation:
+            if self.generation != None:
+                logg.debug('lookup cache generation changed to {}, dropping cache'.format(generation))
+            self.entries = {}
+            self.generation = generation
+
+
+    def get(self, kind, key):
+        """Retrieve a cached lookup result.
+
+        :param kind: Lookup kind
+        :type kind: str
+        :param key: Lookup key
+        :type key: hashable
+        :rtype: tuple
+        :returns: Whether a live entry was found, and the cached value. A cached value of None means the lookup did not resolve.
+        """
+        with self.lock:
+            self.__sync()
+            v = self.entries.get((kind, key,))
+            if v != None and v[1] > time.time():
+                self.hits += 1
+                return (True, v[0],)
+            self.misses += 1
+            return (False, None,)
+
+
+    def put(self, kind, key, value):
+        """Cache a lookup result.
+
+        :param kind: Lookup kind
+        :type kind: str
+        :param key: Lookup key
+        :type key: hashable
+        :param value: Lookup result, or None if the lookup did not resolve
+        :type value: any
+        """
+        ttl = self.ttl[kind]
+        if value == None:
+            ttl = self.negative_ttl
+        with self.lock:
+            self.entries[(kind, key,)] = (value, time.time() + ttl,)
+
+
+    def invalidate(self, kind=None):
+        """Drop cached lookup results, and signal other processes to drop theirs.
+
+        :param kind: Lookup kind to drop, or None to drop all
+        :type kind: str
+        """
+        with self.lock:
+            if kind == None:
+                self.entries = {}
+            else:
+                for k in list(self.entries.keys()):
+                    if k[0] == kind:
+                        del self.entries[k]
+        logg.debug('invalidated lookup cache kind {}'.format(kind))
+        if self.redis != None:
+            try:
+                self.redis.incr(self.key)
+            except redis.exceptions.RedisError as e:
+                logg.error('could not signal lookup cache invalidation: {}'.format(e))
+
+
+    def stats(self):
+        """Return cache usage counters.
+
+        :rtype: dict
+        :returns: Usage counters
+        """
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            }
+
+
+lookup_cache = LookupCache()
+
+
+def connect_lookup_cache(cache):
+    """Set the lookup cache used by all registry and declarator lookups in the process.
+
+    :param cache: Lookup cache
+    :type cache: cic_eth.registry.LookupCache
+    """
+    global lookup_cache
+    lookup_cache = cache
+
+
+def lookup_name(registry, chain_spec, name, sender_address=ZERO_ADDRESS, kind=LookupCache.NAME):
+    """Resolve a registry name, using the lookup cache.
+
+    :param registry: Registry object
+    :type registry: cic_eth_registry.CICRegistry
+    :param chain_spec: Chain spec
+    :type chain_spec: chainlib.chain.ChainSpec
+    :param name: Contract name or token symbol
+    :type name: str
+    :param sender_address: Address to make the calls from
+    :type sender_address: str, 0x-hex
+    :param kind: Lookup kind to cache the result as
+    :type kind: str
+    :raises cic_eth_registry.error.UnknownContractError: Name is not in the registry
+    :rtype: str, 0x-hex
+    :returns: Contract address
+    """
+    k = (str(chain_spec), CICRegistry.address, name,)
+    (found, address) = lookup_cache.get(kind, k)
+    if not found:
+        try:
+            address = registry.by_name(name, sender_address=sender_address)
+        except UnknownContractError:
+            address = None
+        lookup_cache.put(kind, k, address)
+    if address == None:
+        raise UnknownContractError(name)
+    return address
+
+
 def connect_token_registry(rpc, chain_spec, sender_address=ZERO_ADDRESS):
     registry = CICRegistry(chain_spec, rpc)
     token_registry_address = registry.by_name('TokenRegistry', sender_address=sender_address)
@@ -31,4 +244,3 @@ def connect(rpc, chain_spec, registry_address, sender_address=ZERO_ADDRESS):
     registry = CICRegistry(chain_spec, rpc)
     registry_address = registry.by_name('ContractRegistry', sender_address=sender_address)
     return registry
-
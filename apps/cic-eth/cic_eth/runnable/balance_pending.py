@@ -0,0 +1,63 @@
+#!python3
+
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# standard imports
+import sys
+import logging
+
+# local imports
+import cic_eth.cli
+from cic_eth.db import dsn_from_config
+from cic_eth.db.models.base import SessionBase
+from cic_eth.db.models.balance import (
+        PendingBalance,
+        trigger_count,
+        triggers,
+        )
+
+logging.basicConfig(level=logging.WARNING)
+logg = logging.getLogger()
+
+
+arg_flags = cic_eth.cli.argflag_std_base
+local_arg_flags = 0
+argparser = cic_eth.cli.ArgumentParser(arg_flags, description='Manage the database triggers maintaining the pending balance table')
+argparser.process_local_flags(local_arg_flags)
+
+sub = argparser.add_subparsers(help='')
+sub.dest = 'command'
+sub.add_parser('install', help='Rebuild the pending balance table from the queue, and create the triggers maintaining it')
+sub.add_parser('uninstall', help='Drop the triggers maintaining the pending balance table')
+sub.add_parser('status', help='Show whether the triggers maintaining the pending balance table exist')
+args = argparser.parse_args()
+
+config = cic_eth.cli.Config.from_args(args, arg_flags, local_arg_flags)
+
+dsn = dsn_from_config(config)
+SessionBase.connect(dsn, debug=config.true('DATABASE_DEBUG'))
+
+
+def main():
+    if SessionBase.engine.dialect.name != 'postgresql':
+        sys.stderr.write('pending balance table is only maintained with postgresql\n')
+        sys.exit(1)
+
+    if args.command == 'install':
+        if not PendingBalance.install():
+            logg.info('pending balance triggers already installed')
+    elif args.command == 'uninstall':
+        if not PendingBalance.uninstall():
+            logg.info('pending balance triggers not installed')
+    elif args.command == 'status':
+        session = SessionBase.create_session()
+        c = trigger_count(session)
+        session.close()
+        print('{} of {} pending balance triggers installed'.format(c, len(triggers)))
+    else:
+        argparser.print_help()
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
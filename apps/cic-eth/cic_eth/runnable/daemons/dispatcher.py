@@ -18,14 +18,19 @@ from chainqueue.db.enum import (
     StatusEnum,
     StatusBits,
     )
-from chainqueue.error import NotLocalTxError
+from chainqueue.error import (
+    NotLocalTxError,
+    TxStateChangeError,
+    )
 from chainqueue.sql.state import set_reserved
+from chainqueue.db.models.otx import Otx
 
 # local imports
 import cic_eth.cli
 from cic_eth.db import SessionBase
 from cic_eth.db.enum import LockEnum
 from cic_eth.db import dsn_from_config
+from cic_eth.db.notify import DispatchListener
 from cic_eth.queue.query import get_upcoming_tx
 from cic_eth.admin.ctrl import lock_send
 from cic_eth.eth.tx import send as task_tx_send
@@ -65,8 +70,10 @@ class DispatchSyncer:
 
     yield_delay = 0.01
 
-    def __init__(self, chain_spec):
+    def __init__(self, chain_spec, batch_size=0, listener=None):
         self.chain_spec = chain_spec
+        self.batch_size = batch_size
+        self.listener = listener
         self.session = None
 
 
@@ -120,16 +127,73 @@ class DispatchSyncer:
         self.session = None
 
 
+    def process_batch(self, conn, txs):
+        c = len(txs.keys())
+        logg.debug('processing {} txs in batches at {}'.format(c, datetime.datetime.utcnow()))
+        self.session = SessionBase.create_session()
+        batches = {}
+        for k in txs.keys():
+            tx_raw = txs[k]
+            tx_raw_bytes = bytes.fromhex(strip_0x(tx_raw))
+            tx = unpack(tx_raw_bytes, self.chain_spec)
+
+            # a savepoint per tx, so that one failed reservation does not undo the rest of the batch
+            self.session.begin_nested()
+            try:
+                o = Otx.load(tx['hash'], session=self.session)
+                if o == None:
+                    raise NotLocalTxError('queue does not contain tx hash {}'.format(tx['hash']))
+                o.reserve(session=self.session)
+                self.session.add(o)
+                self.session.commit()
+            except NotLocalTxError as e:
+                logg.warning('dispatcher was triggered with non-local tx {}'.format(tx['hash']))
+                self.session.rollback()
+                continue
+            except TxStateChangeError as e:
+                logg.error('dispatcher could not reserve tx {}: {}'.format(tx['hash'], e))
+                self.session.rollback()
+                continue
+
+            if batches.get(tx['from']) == None:
+                batches[tx['from']] = []
+            batches[tx['from']].append((tx['nonce'], tx_raw,))
+
+        self.session.commit()
+        self.session.close()
+        self.session = None
+
+        for sender in batches.keys():
+            batch = sorted(batches[sender])
+            s_send = celery.signature(
+                    'cic_eth.eth.tx.send_batch',
+                    [
+                        [v[1] for v in batch],
+                        self.chain_spec.asdict(),
+                        sender,
+                        ],
+                    queue=config.get('CELERY_QUEUE'),
+                    )
+            t = s_send.apply_async()
+            logg.info('processed batch of {} txs from {} at {}'.format(len(batch), sender, datetime.datetime.utcnow()))
+
+
     def loop(self, interval):
         while run:
             txs = {}
             typ = StatusBits.QUEUED
-            utxs = get_upcoming_tx(self.chain_spec, typ)
+            sender_limit = 1
+            if self.batch_size > 0:
+                sender_limit = self.batch_size
+            utxs = get_upcoming_tx(self.chain_spec, typ, sender_limit=sender_limit)
             for k in utxs.keys():
                 txs[k] = utxs[k]
             try:
                 conn = RPCConnection.connect(self.chain_spec, 'default')
-                self.process(conn, txs)
+                if self.batch_size > 0:
+                    self.process_batch(conn, txs)
+                else:
+                    self.process(conn, txs)
             except ConnectionError as e:
                 if self.session != None:
                     self.session.close()
@@ -138,12 +202,17 @@ class DispatchSyncer:
 
             if len(utxs) > 0:
                 time.sleep(self.yield_delay)
+            elif self.listener != None:
+                self.listener.wait(interval)
             else:
                 time.sleep(interval)
 
 
 def main(): 
-    syncer = DispatchSyncer(chain_spec)
+    listener = None
+    if config.true('DISPATCHER_NOTIFY'):
+        listener = DispatchListener()
+    syncer = DispatchSyncer(chain_spec, batch_size=int(config.get('DISPATCHER_BATCH_SIZE', 0)), listener=listener)
     syncer.loop(float(config.get('DISPATCHER_LOOP_INTERVAL')))
 
     sys.exit(0)
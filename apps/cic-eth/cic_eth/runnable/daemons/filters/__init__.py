@@ -4,3 +4,4 @@ from .gas import GasFilter
 from .register import RegistrationFilter
 from .transferauth import TransferAuthFilter
 from .token import TokenFilter
+from .lookup import LookupCacheFilter
@@ -0,0 +1,61 @@
+# standard imports
+import logging
+
+# external imports
+from hexathon import strip_0x
+
+# local imports
+from .base import SyncFilter
+import cic_eth.registry
+from cic_eth.registry import LookupCache
+
+logg = logging.getLogger(__name__)
+
+
+class LookupCacheFilter(SyncFilter):
+    """Invalidates cached registry and declarator lookups when a transaction to one of the registry contracts is seen.
+
+    :param chain_spec: Chain spec
+    :type chain_spec: chainlib.chain.ChainSpec
+    :param registry_address: Contract registry address
+    :type registry_address: str, 0x-hex
+    :param declarator_address: Address declarator address
+    :type declarator_address: str, 0x-hex
+    :param token_registry_address: Token registry address
+    :type token_registry_address: str, 0x-hex
+    """
+
+    def __init__(self, chain_spec, registry_address, declarator_address=None, token_registry_address=None):
+        super(LookupCacheFilter, self).__init__()
+        self.chain_spec = chain_spec
+        self.contracts = {}
+        # registry writes may change any name, so everything is dropped
+        self.contracts[strip_0x(registry_address).lower()] = None
+        if declarator_address != None:
+            self.contracts[strip_0x(declarator_address).lower()] = LookupCache.DECLARATION
+        if token_registry_address != None:
+            self.contracts[strip_0x(token_registry_address).lower()] = LookupCache.TOKEN
+
+
+    def filter(self, conn, block, tx, db_session=None):
+        super(LookupCacheFilter, self).filter(conn, block, tx, db_session)
+        if not tx.payload:
+            return None
+
+        k = strip_0x(tx.inputs[0]).lower()
+        try:
+            kind = self.contracts[k]
+        except KeyError:
+            return None
+
+        self.register_match()
+        cic_eth.registry.lookup_cache.invalidate(kind=kind)
+
+        logline = 'invalidated {} lookups'.format(kind or 'all')
+        logline = self.to_logline(block, tx, logline)
+        logg.info(logline)
+        return None
+
+
+    def __str__(self):
+        return 'lookup cache invalidation filter'
@@ -52,10 +52,12 @@ server_port = config.get('SERVER_PORT', 5000)
 server_host = config.get('SERVER_HOST', "0.0.0.0")
 server_workers = config.get('SERVER_WORKERS', 1)
 server_config = config.get('SERVER_CONFIG', None)
+server_token_refresh_interval = int(config.get('SERVER_TOKEN_REFRESH_INTERVAL', 300))
 
 # Create FastAPI App
 app = create_app(chain_spec, redis_host, redis_port, redis_db,
-                 redis_timeout, RedisGetter, celery_queue=celery_queue)
+                 redis_timeout, RedisGetter, celery_queue=celery_queue,
+                 token_refresh_interval=server_token_refresh_interval)
 
 
 class StandaloneApplication(gunicorn.app.base.Application):
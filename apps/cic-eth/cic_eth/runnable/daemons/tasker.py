@@ -32,6 +32,7 @@ from cic_eth.eth.util import (
         )
 from hexathon import add_0x
 import liveness.linux
+import redis as redis_interface
 
 
 # local imports
@@ -64,13 +65,26 @@ from cic_eth.callbacks import (
         #tcp,
         redis,
         )
+from cic_eth.callbacks.http import HTTPCallbackPool
 from cic_eth.db.models.base import SessionBase
+from cic_eth.db.models.balance import (
+        PendingBalance,
+        trigger_count,
+        triggers as pending_balance_triggers,
+        )
+from cic_eth.db.cache import (
+        ModelCache,
+        connect_model_cache,
+        )
 from cic_eth.db import dsn_from_config
+from cic_eth.eth.rpc import RPCPool
 from cic_eth.ext import tx
 from cic_eth.registry import (
         connect as connect_registry,
         connect_declarator,
         connect_token_registry,
+        connect_lookup_cache,
+        LookupCache,
         )
 from cic_eth.task import (
         BaseTask,
@@ -107,7 +121,15 @@ config = cic_eth.cli.Config.from_args(args, arg_flags, local_arg_flags)
 celery_app = cic_eth.cli.CeleryApp.from_config(config)
 
 # set up rpc
-rpc = cic_eth.cli.RPC.from_config(config, use_signer=True)
+rpc_pool = None
+rpc_pool_size = int(config.get('RPCPOOL_SIZE', 0))
+if rpc_pool_size > 0:
+    rpc_pool = RPCPool(
+            size=rpc_pool_size,
+            timeout=float(config.get('RPCPOOL_TIMEOUT')),
+            health_interval=float(config.get('RPCPOOL_HEALTH_INTERVAL')),
+            )
+rpc = cic_eth.cli.RPC.from_config(config, use_signer=True, pool=rpc_pool)
 conn = rpc.get_default()
 
 
@@ -115,6 +137,15 @@ conn = rpc.get_default()
 dsn = dsn_from_config(config)
 SessionBase.connect(dsn, pool_size=int(config.get('DATABASE_POOL_SIZE')), debug=config.true('DATABASE_DEBUG'))
 Otx.tracing = config.true('TASKS_TRACE_QUEUE_STATUS')
+if config.true('TASKS_BALANCE_PENDING_TABLE'):
+    if SessionBase.engine.dialect.name == 'postgresql':
+        session = SessionBase.create_session()
+        PendingBalance.enabled = trigger_count(session) == len(pending_balance_triggers)
+        session.close()
+        if not PendingBalance.enabled:
+            logg.warning('pending balance triggers are not installed (see cic-eth-balance-pending install), falling back to queue aggregation')
+    else:
+        logg.warning('pending balance table is only maintained with postgresql, falling back to queue aggregation')
 
 
 # execute health checks
@@ -210,6 +241,13 @@ else:
     logg.info('found default token {} address {}'.format(default_token_symbol, default_token_address))
     config.add(default_token_symbol, 'CIC_DEFAULT_TOKEN_SYMBOL', exists_ok=True)
 
+multicall_address = None
+try:
+    multicall_address = registry.by_name('Multicall')
+    logg.info('found multicall contract {}'.format(multicall_address))
+except UnknownContractError:
+    logg.info('no multicall contract in registry, balances will be retrieved with batch requests')
+
 for v in aux:
     mname = 'cic_eth_aux.' + v
     mod = importlib.import_module(mname)
@@ -247,8 +285,40 @@ def main():
     default_token.load(conn)
     BaseTask.default_token_decimals = default_token.decimals
     BaseTask.default_token_name = default_token.name
+    BaseTask.multicall_address = multicall_address
     BaseTask.trusted_addresses = trusted_addresses
     BaseTask.debug_log = config.true('CELERY_DEBUG_LOG')
+    BaseTask.rpc_pool = rpc_pool
+    Callback.http_pool = HTTPCallbackPool(
+            size=int(config.get('CALLBACK_HTTP_POOL_SIZE')),
+            concurrency=int(config.get('CALLBACK_HTTP_CONCURRENCY')),
+            timeout=float(config.get('CALLBACK_HTTP_TIMEOUT')),
+            retries=int(config.get('CALLBACK_HTTP_RETRIES')),
+            # prefork children deliver one callback each, so the concurrency bound must be shared between them
+            redis=redis_interface.Redis(
+                host=config.get('REDIS_HOST'),
+                port=config.get('REDIS_PORT'),
+                db=config.get('REDIS_DB'),
+                ),
+            )
+    connect_lookup_cache(LookupCache.from_config(config))
+    connect_model_cache(ModelCache(
+            ttl=float(config.get('DATABASE_CACHE_TTL')),
+            host=config.get('REDIS_HOST'),
+            port=config.get('REDIS_PORT'),
+            db=config.get('REDIS_DB'),
+            ))
+
+    if config.get('NONCE_MODE') == 'redis':
+        nonce.CustodialTaskNonceOracle.allocator = nonce.RedisNonceAllocator(
+                host=config.get('REDIS_HOST'),
+                port=config.get('REDIS_PORT'),
+                db=config.get('REDIS_DB'),
+                block_size=int(config.get('NONCE_BLOCK_SIZE')),
+                )
+        logg.info('using redis nonce allocator, high-water mark persisted every {} nonces'.format(config.get('NONCE_BLOCK_SIZE')))
+    elif config.get('NONCE_MODE') != 'db':
+        raise ValueError('unknown nonce mode {}'.format(config.get('NONCE_MODE')))
     MaxGasOracle.fee_units = int(config.get('ETH_MAX_FEE_UNITS'))
 
     CriticalWeb3Task.safe_gas_refill_amount = int(config.get('ETH_GAS_HOLDER_MINIMUM_UNITS')) * int(config.get('ETH_GAS_HOLDER_REFILL_UNITS'))
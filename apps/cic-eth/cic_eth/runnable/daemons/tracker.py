@@ -39,12 +39,15 @@ from cic_eth.runnable.daemons.filters import (
         RegistrationFilter,
         TransferAuthFilter,
         TokenFilter,
+        LookupCacheFilter,
         )
 from cic_eth.stat import init_chain_stat
 from cic_eth.registry import (
         connect as connect_registry,
         connect_declarator,
         connect_token_registry,
+        connect_lookup_cache,
+        LookupCache,
         )
 from stateness.redis import RedisMonitor
 
@@ -167,6 +170,14 @@ def main():
     connect_token_registry(conn, chain_spec)
     CallbackFilter.trusted_addresses = trusted_addresses
 
+    connect_lookup_cache(LookupCache.from_config(config))
+    lookup_filter = LookupCacheFilter(
+            chain_spec,
+            config.get('CIC_REGISTRY_ADDRESS'),
+            declarator_address=registry.by_name('AddressDeclarator'),
+            token_registry_address=registry.by_name('TokenRegistry'),
+            )
+
     callback_filters = []
     for cb in config.get('TASKS_TRANSFER_CALLBACKS', '').split(','):
         task_split = cb.split(':')
@@ -190,6 +201,7 @@ def main():
     i = 0
     for syncer in syncers:
         logg.debug('running syncer index {}'.format(i))
+        syncer.add_filter(lookup_filter)
         syncer.add_filter(gas_filter)
         syncer.add_filter(registration_filter)
         # TODO: the two following filter functions break the filter loop if return uuid. Pro: less code executed. Con: Possibly unintuitive flow break
@@ -1,15 +1,18 @@
+import asyncio
+import functools
 import logging
 from typing import List, Optional, Union
 
 from cic_eth.api.api_task import Api
 from cic_eth.server import converters
+from cic_eth.server.cache import TokenCache
 from cic_eth.server.models import (DefaultToken, Token, TokenBalance, Transaction)
 from fastapi import FastAPI, Query
 from cic_eth.version import __version_string__
 
 log = logging.getLogger(__name__)
 
-def create_app(chain_spec, redis_host, redis_port, redis_db,redis_timeout, Getter, celery_queue='cic-eth'):
+def create_app(chain_spec, redis_host, redis_port, redis_db,redis_timeout, Getter, celery_queue='cic-eth', token_refresh_interval=0):
     app = FastAPI(
         debug=True,
         title="Grassroots Economics",
@@ -25,38 +28,57 @@ def create_app(chain_spec, redis_host, redis_port, redis_db,redis_timeout, Gette
             "name": "GPLv3",
         }
     )
-    @app.get("/version", response_model=str)
-    def version():
-        return __version_string__
+    getter = Getter(chain_spec, redis_host, redis_port, redis_db, redis_timeout)
 
-    @app.get("/transactions", response_model=List[Transaction])
-    def transactions(address: str, limit: Optional[str] = 10):
-        getter = Getter(chain_spec, redis_host, redis_port, redis_db, redis_timeout)
+    @app.on_event("startup")
+    async def startup():
+        token_cache.start()
+
+    @app.on_event("shutdown")
+    async def shutdown():
+        await token_cache.stop()
+        await getter.close()
+
+    async def call_api(method, *args, catch=1, **kwargs):
+        """Dispatch an api call with a callback to the getter, and wait for its result.
+        """
+        callback_param = await getter.open()
+        callback_task = getter.callback_task
+        if catch > 1:
+            # results of multi-result calls are delivered together if the getter supports it
+            callback_task = getattr(getter, 'batch_callback_task', callback_task)
         api = Api(
             chain_spec,
             queue=celery_queue,
-            callback_param=getter.get_callback_param(),
-            callback_task=getter.callback_task,
+            callback_param=callback_param,
+            callback_task=callback_task,
             callback_queue=celery_queue
         )
-        task = api.list(address, limit=limit)
-        data = getter.get()
+        try:
+            # publishing the task to the broker blocks, so it is kept out of the event loop
+            await asyncio.get_running_loop().run_in_executor(None, functools.partial(getattr(api, method), *args, **kwargs))
+        except BaseException:
+            # no callback will arrive for a request that was not dispatched
+            getter.discard(callback_param)
+            raise
+        return await getter.get(callback_param, catch=catch)
+
+    token_cache = TokenCache(call_api, refresh_interval=token_refresh_interval)
+
+    @app.get("/version", response_model=str)
+    async def version():
+        return __version_string__
+
+    @app.get("/transactions", response_model=List[Transaction])
+    async def transactions(address: str, limit: Optional[str] = 10):
+        data = await call_api('list', address, limit=limit)
         return data
 
     @app.get("/balance", response_model=List[TokenBalance])
-    def balance(token_symbol: str, address: str = Query(..., title="Address", min_length=40, max_length=42), include_pending: bool = True):
-        getter = Getter(chain_spec, redis_host, redis_port, redis_db, redis_timeout)
-        api = Api(
-            chain_spec,
-            queue=celery_queue,
-            callback_param=getter.get_callback_param(),
-            callback_task=getter.callback_task,
-            callback_queue=celery_queue
-        )
-        task = api.balance(address, token_symbol, include_pending=include_pending)
-        data = getter.get()
+    async def balance(token_symbol: str, address: str = Query(..., title="Address", min_length=40, max_length=42), include_pending: bool = True):
+        data = await call_api('balance', address, token_symbol, include_pending=include_pending)
+        token = await get_token(token_symbol)
         for b in data:
-            token = get_token(token_symbol)
             b['balance_network'] = converters.from_wei(
                 token.decimals, int(b['balance_network']))
             b['balance_incoming'] = converters.from_wei(
@@ -73,90 +95,46 @@ def create_app(chain_spec, redis_host, redis_port, redis_db,redis_timeout, Gette
     
 
     @app.post("/create_account")
-    def create_account(password: Optional[str] = None, register: bool = True):
+    async def create_account(password: Optional[str] = None, register: bool = True):
         """ Creates a redis channel and calls `cic_eth.api` with the provided `method` and `*args`. Returns the result of the api call. Catch allows you to specify how many messages to catch before returning.
         """
-
-        getter = Getter(chain_spec, redis_host, redis_port, redis_db, redis_timeout)
-        api = Api(
-            chain_spec,
-            queue=celery_queue,
-            callback_param=getter.get_callback_param(),
-            callback_task=getter.callback_task,
-            callback_queue=celery_queue
-        )
-        task = api.create_account(password=password, register=register)
-        return getter.get()
+        return await call_api('create_account', password=password, register=register)
 
     @app.post("/transfer")
-    def transfer(from_address: str, to_address: str, value: int, token_symbol: str):
-        token = get_token(
+    async def transfer(from_address: str, to_address: str, value: int, token_symbol: str):
+        token = await get_token(
             token_symbol)
         wei_value = converters.to_wei(token.decimals, int(value))
-        getter = Getter(chain_spec, redis_host, redis_port, redis_db, redis_timeout)
-        api = Api(
-            chain_spec,
-            queue=celery_queue,
-            callback_param=getter.get_callback_param(),
-            callback_task=getter.callback_task,
-            callback_queue=celery_queue
-        )
-        task = api.transfer(from_address, to_address, wei_value, token_symbol)
-        data = getter.get()
+        data = await call_api('transfer', from_address, to_address, wei_value, token_symbol)
         return data
 
     @app.get("/token", response_model=Token)
-    def token(token_symbol: str, proof: Optional[str] = None):
-        token = get_token(token_symbol, proof=proof)
+    async def token(token_symbol: str, proof: Optional[str] = None):
+        token = await get_token(token_symbol, proof=proof)
         return token
 
     @app.get("/tokens", response_model=List[Token])
-    def tokens(token_symbols: Optional[List[str]] = Query(...), proof: Optional[List[str]] = None):
-        getter = Getter(chain_spec, redis_host, redis_port, redis_db, redis_timeout)
-        api = Api(
-            chain_spec,
-            queue=celery_queue,
-            callback_param=getter.get_callback_param(),
-            callback_task=getter.callback_task,
-            callback_queue=celery_queue
-        )
-        task = api.tokens(token_symbols, proof=proof)
-        data = getter.get(catch=len(token_symbols))
+    async def tokens(token_symbols: Optional[List[str]] = Query(...), proof: Optional[List[str]] = None):
+        data = await call_api('tokens', token_symbols, proof=proof, catch=len(token_symbols))
         if data:
             tokens = []
             if len(token_symbols) == 1:
                 tokens.append(Token.new(data))
             else:
                 for token in data:
-                    tokens.append(Token.new(token))
+                    try:
+                        tokens.append(Token.new(token))
+                    except (TypeError, KeyError, IndexError, AttributeError, ValueError):
+                        # tokens that failed proof verification are delivered as error descriptions
+                        log.warning(f"Skipping unverified token: {token}")
             return tokens
         return None
 
     @app.get("/default_token", response_model=DefaultToken)
-    def default_token():
-        getter = Getter(chain_spec, redis_host, redis_port, redis_db, redis_timeout)
-        api = Api(
-            chain_spec,
-            queue=celery_queue,
-            callback_param=getter.get_callback_param(),
-            callback_task=getter.callback_task,
-            callback_queue=celery_queue
-        )
-        task = api.default_token()
-        data = getter.get()
+    async def default_token():
+        data = await call_api('default_token')
         return data
 
-    def get_token(token_symbol: str, proof=None):
-        getter = Getter(chain_spec, redis_host, redis_port, redis_db, redis_timeout)
-        api = Api(
-            chain_spec,
-            queue=celery_queue,
-            callback_param=getter.get_callback_param(),
-            callback_task=getter.callback_task,
-            callback_queue=celery_queue
-        )
-        task = api.token(token_symbol, proof=None)
-        data = getter.get()
-        return Token.new(data)
+    async def get_token(token_symbol: str, proof=None):
+        return await token_cache.get(token_symbol)
     return app
-
@@ -0,0 +1,93 @@
+import asyncio
+import logging
+
+from cic_eth.server.models import Token
+
+log = logging.getLogger(__name__)
+
+
+class TokenCache:
+    """Token metadata by symbol, for endpoints that only need the decimals or other static data of a token.
+
+    `refresh` loads all tokens in the token registry with two api calls, and `start` runs it in the background at the given interval. A token that is not cached yet is looked up on request, and concurrent requests for it share the lookup.
+    """
+    def __init__(self, call_api, refresh_interval=300):
+        self.call_api = call_api
+        self.refresh_interval = refresh_interval
+        self.tokens = {}
+        self.pending = {}
+        self.task = None
+
+    async def refresh(self):
+        """Load the metadata of all tokens in the token registry.
+        """
+        symbols = await self.call_api('token_symbols')
+        if len(symbols) == 0:
+            return
+        data = await self.call_api('tokens', symbols, catch=len(symbols))
+        if len(symbols) == 1:
+            data = [data]
+        for v in data:
+            try:
+                token = Token.new(v)
+            except (TypeError, KeyError, IndexError, AttributeError, ValueError):
+                log.warning(f"Skipping invalid token data: {v}")
+                continue
+            self.tokens[token.symbol] = token
+        log.debug(f"Token cache refreshed, {len(self.tokens)} tokens")
+
+    async def get(self, token_symbol: str) -> Token:
+        """Return the metadata of a token, looking it up if not cached.
+        """
+        token = self.tokens.get(token_symbol)
+        if token != None:
+            return token
+
+        pending = self.pending.get(token_symbol)
+        if pending != None:
+            return await asyncio.shield(pending)
+
+        pending = asyncio.get_running_loop().create_future()
+        self.pending[token_symbol] = pending
+        try:
+            data = await self.call_api('token', token_symbol, proof=None)
+            token = Token.new(data)
+            self.tokens[token_symbol] = token
+            pending.set_result(token)
+            return token
+        except Exception as e:
+            pending.set_exception(e)
+            # only requests sharing the lookup need to see the exception
+            pending.exception()
+            raise
+        finally:
+            del self.pending[token_symbol]
+
+    async def __run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                log.error(f"Token cache refresh failed: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self):
+        """Start refreshing the cache in the background of the running event loop.
+
+        Does nothing if the refresh interval is 0.
+        """
+        if self.refresh_interval == 0:
+            return
+        self.task = asyncio.get_running_loop().create_task(self.__run())
+
+    async def stop(self):
+        """Stop refreshing the cache.
+        """
+        if self.task == None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
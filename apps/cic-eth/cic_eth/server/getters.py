@@ -1,43 +1,128 @@
+import asyncio
 import json
 import logging
 import uuid
-import redis
+
+import redis.asyncio as redis
 
 log = logging.getLogger(__name__)
 
 class RedisGetter:
+        """Receives results of the `cic_eth.callbacks.redis.redis` callback task for all requests of a server worker process.
+
+        A single pattern subscription on one redis connection is shared by all requests. Each request is given its own channel under the prefix of the subscription, and messages are routed to the request waiting on the channel, so requests only hold a queue while pending.
+
+        The subscription is set up on first use in the event loop of the worker process.
+        """
         def __init__(self, chain_spec, redis_host, redis_port, redis_db, redis_timeout) -> None:
             self.redis_host=redis_host
             self.redis_port=redis_port
             self.chain_spec=chain_spec
             self.redis_db=redis_db
-            self.redis_timeout=redis_timeout
+            self.redis_timeout=float(redis_timeout)
             self.callback_task = 'cic_eth.callbacks.redis.redis'
+            self.batch_callback_task = 'cic_eth.callbacks.redis.redis_batch'
             log.debug(f"Using redis: {redis_host}, {redis_port}, {redis_db}")
-            self.redis_channel = str(uuid.uuid4())
-            r = redis.Redis(redis_host, redis_port, redis_db)
-            ps = r.pubsub()
-            ps.subscribe(self.redis_channel)
-            self.ps = ps
+            # the callback task splits its parameter on ':', so the channel cannot contain one
+            self.prefix = 'cic-eth-server.{}'.format(uuid.uuid4())
+            self.pending = {}
+            self.redis = None
+            self.ps = None
+            self.reader = None
+            self.loop = None
+            self.lock = None
 
-        def get_callback_param(self):
-            return '{}:{}:{}:{}'.format(self.redis_host, self.redis_port, self.redis_db, self.redis_channel)
+        async def start(self):
+            """Connect to redis and subscribe to the channels of this getter, unless already done in the running event loop.
+            """
+            loop = asyncio.get_running_loop()
+            if self.loop == loop and self.reader != None and not self.reader.done():
+                return
+            if self.loop != loop:
+                self.lock = asyncio.Lock()
+                self.loop = loop
+            async with self.lock:
+                if self.reader != None and not self.reader.done():
+                    return
+                if self.redis != None:
+                    # the previous subscription was lost, or belongs to another event loop
+                    self.reader = None
+                    await self.close()
+                self.redis = redis.Redis(host=self.redis_host, port=self.redis_port, db=self.redis_db)
+                self.ps = self.redis.pubsub()
+                await self.ps.psubscribe(self.prefix + '.*')
+                self.reader = loop.create_task(self.__read())
+                log.info(f"Subscribed to callback channels {self.prefix}.*")
 
-        def get(self, catch=1):
-            self.ps.get_message()
+        async def close(self):
+            """Cancel the subscription and close the redis connection.
+            """
+            if self.reader != None:
+                self.reader.cancel()
+                try:
+                    await self.reader
+                except (asyncio.CancelledError, Exception):
+                    pass
+                self.reader = None
+            if self.ps != None:
+                await self.ps.close()
+                self.ps = None
+            if self.redis != None:
+                await self.redis.close()
+                self.redis = None
+
+        async def __read(self):
+            try:
+                async for message in self.ps.listen():
+                    if message['type'] != 'pmessage':
+                        continue
+                    channel = message['channel'].decode('utf-8')
+                    q = self.pending.get(channel)
+                    if q == None:
+                        log.debug(f"Dropping callback for channel {channel} with no pending request")
+                        continue
+                    q.put_nowait(message['data'])
+            except redis.RedisError as e:
+                log.error(f"Callback subscription lost: {e}")
+                # fail all pending requests now instead of letting them time out
+                for q in self.pending.values():
+                    q.put_nowait(e)
+
+        async def open(self):
+            """Create a channel for a new request, and start receiving its callbacks.
+
+            Returns the callback parameter to pass to the `cic_eth.callbacks.redis.redis` task.
+            """
+            await self.start()
+            channel = '{}.{}'.format(self.prefix, uuid.uuid4())
+            self.pending[channel] = asyncio.Queue()
+            return '{}:{}:{}:{}'.format(self.redis_host, self.redis_port, self.redis_db, channel)
+
+        def discard(self, callback_param):
+            """Release the channel of a request opened with `open` without waiting for its callbacks.
+            """
+            channel = callback_param.split(':')[-1]
+            self.pending.pop(channel, None)
+
+        async def get(self, callback_param, catch=1):
+            """Wait for the callbacks of a request opened with `open`, and release its channel.
+
+            Raises TimeoutError if not all callbacks are received within the redis timeout.
+            """
+            channel = callback_param.split(':')[-1]
+            q = self.pending[channel]
             try:
                 data = []
-                if catch == 1:
-                    message = self.ps.get_message(timeout=self.redis_timeout)
-                    data = json.loads(message['data'])["result"]
-                else:
-                    for _i in range(catch):
-                        message = self.ps.get_message(
-                            timeout=self.redis_timeout)
-                        result = json.loads(message['data'])["result"]
-                        data.append(result)
-            except Exception as e:
-                raise BaseException(message)
-
-            self.ps.unsubscribe()
+                for _i in range(catch):
+                    message = await asyncio.wait_for(q.get(), timeout=self.redis_timeout)
+                    if isinstance(message, Exception):
+                        raise message
+                    data.append(json.loads(message)["result"])
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"Timeout waiting for callback on channel {channel}")
+            finally:
+                del self.pending[channel]
+
+            if catch == 1:
+                return data[0]
             return data
@@ -37,8 +37,10 @@ class BaseTask(celery.Task):
     default_token_symbol = None
     default_token_name = None
     default_token_decimals = None
+    multicall_address = None
     run_dir = '/run'
     debug_log = False
+    rpc_pool = None
 
 
     def create_gas_oracle(self, conn, address=None, *args, **kwargs):
@@ -167,6 +169,18 @@ def registry_name_lookup(chain_spec_dict, name, connection_tag='default'):
     return registry.by_name(name, sender_address=self.call_address)
 
 
+@celery_app.task(bind=True, base=BaseTask)
+def rpc_pool_stats(self):
+    """Return usage counters of the rpc connection pool of the worker executing the task.
+
+    :rtype: dict
+    :returns: Pool usage counters, or None if connections are not pooled
+    """
+    if self.rpc_pool == None:
+        return None
+    return self.rpc_pool.stats()
+
+
 @celery_app.task()
 def rpc_proxy(chain_spec_dict, o, connection_tag='default'):
     chain_spec = ChainSpec.from_dict(chain_spec_dict)
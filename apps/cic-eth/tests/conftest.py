@@ -12,6 +12,10 @@ import redis
 # local imports
 from cic_eth.api import Api
 from cic_eth.task import BaseTask
+from cic_eth.registry import (
+        connect_lookup_cache,
+        LookupCache,
+        )
 
 script_dir = os.path.dirname(os.path.realpath(__file__))
 root_dir = os.path.dirname(script_dir)
@@ -31,6 +35,14 @@ from cic_eth_registry.pytest.fixtures_contracts import *
 from cic_eth_registry.pytest.fixtures_tokens import *
 
 
+@pytest.fixture(scope='function', autouse=True)
+def lookup_cache():
+    # contracts are redeployed for each test, so lookups must not be carried over
+    c = LookupCache()
+    connect_lookup_cache(c)
+    return c
+
+
 @pytest.fixture(scope='function')
 def api(
     default_chain_spec,
@@ -0,0 +1,54 @@
+# standard imports
+import asyncio
+import json
+
+# external imports
+import pytest
+import redis
+
+# local imports
+from cic_eth.server.getters import RedisGetter
+
+
+def test_redis_getter(
+        config,
+        have_redis,
+        ):
+
+    if have_redis != None:
+        pytest.skip('cannot connect to redis, skipping test: {}'.format(have_redis))
+
+    r = redis.Redis(
+            host=config.get('REDIS_HOST'),
+            port=config.get('REDIS_PORT'),
+            db=config.get('REDIS_DB'),
+            )
+
+    async def run():
+        getter = RedisGetter(None, config.get('REDIS_HOST'), config.get('REDIS_PORT'), config.get('REDIS_DB'), 5)
+        callback_params = []
+        for i in range(100):
+            callback_params.append(await getter.open())
+
+        # callbacks are routed by channel, regardless of order
+        for i in reversed(range(100)):
+            (host, port, db, channel) = callback_params[i].split(':')
+            r.publish(channel, json.dumps({'root_id': None, 'status': 0, 'result': i}))
+        results = await asyncio.gather(*[getter.get(callback_param) for callback_param in callback_params])
+        assert results == list(range(100))
+        assert len(getter.pending) == 0
+
+        callback_param = await getter.open()
+        (host, port, db, channel) = callback_param.split(':')
+        r.publish(channel, json.dumps({'root_id': None, 'status': 0, 'result': 'foo'}))
+        r.publish(channel, json.dumps({'root_id': None, 'status': 0, 'result': 'bar'}))
+        assert await getter.get(callback_param, catch=2) == ['foo', 'bar']
+
+        # a request that could not be dispatched releases its channel
+        callback_param = await getter.open()
+        getter.discard(callback_param)
+        assert len(getter.pending) == 0
+
+        await getter.close()
+
+    asyncio.run(run())
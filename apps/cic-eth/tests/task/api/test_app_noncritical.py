@@ -4,10 +4,12 @@ import os
 import uuid
 import time
 import mmap
+import json
 
 # external imports
 import celery
 import pytest
+import redis as redis_interface
 from hexathon import (
         strip_0x,
         uniform as hex_uniform,
@@ -40,6 +42,24 @@ def test_default_token(
     assert r['address'] == foo_token
 
 
+def test_token_symbols(
+        default_chain_spec,
+        foo_token,
+        bar_token,
+        token_registry,
+        register_tokens,
+        register_lookups,
+        cic_registry,
+        celery_session_worker,
+        ):
+
+    api = Api(str(default_chain_spec), queue=None)
+    t = api.token_symbols()
+    r = t.get_leaf()
+    assert 'FOO' in r
+    assert 'BAR' in r
+
+
 def test_to_v_list():
     assert Api.to_v_list('', 0) == []
     assert Api.to_v_list([], 0) == []
@@ -97,6 +117,60 @@ def test_token_single(
     assert r[0]['address'] == strip_0x(foo_token)
 
 
+def test_tokens_batch_error(
+        default_chain_spec,
+        foo_token,
+        bar_token,
+        token_registry,
+        register_tokens,
+        register_lookups,
+        cic_registry,
+        init_database,
+        init_celery_tasks,
+        custodial_roles,
+        foo_token_declaration,
+        bar_token_declaration,
+        load_config,
+        celery_session_worker,
+        ):
+
+    timeout = 10
+
+    channel = str(uuid.uuid4())
+    host = load_config.get('REDIS_HOST', 'localhost')
+    port = load_config.get('REDIS_PORT', '6379')
+    db = load_config.get('REDIS_DB', '0')
+
+    try:
+        r = redis_interface.Redis(host=host, port=int(port), db=int(db))
+        ps = r.pubsub()
+        ps.subscribe(channel)
+        ps.get_message(timeout=timeout) # subscribe message
+    except redis_interface.exceptions.ConnectionError as e:
+        pytest.skip('cannot connect to redis, skipping test: {}'.format(e))
+
+    api = Api(str(default_chain_spec), queue=None, callback_param='{}:{}:{}:{}'.format(host, port, db, channel), callback_task='cic_eth.callbacks.redis.redis_batch')
+    bogus_proof = os.urandom(32).hex()
+    t = api.tokens(['BAR', 'FOO'], proof=[[bar_token_declaration], [bogus_proof]])
+    t.get()
+
+    # one callback for each token, also for the one that failed verification
+    results = []
+    for i in range(2):
+        echo = ps.get_message(timeout=timeout)
+        while echo != None and echo['type'] != 'message':
+            echo = ps.get_message(timeout=timeout)
+        assert echo != None
+        results.append(json.loads(echo['data']))
+
+    assert results[0]['status'] == 0
+    assert results[0]['result'][0]['address'] == strip_0x(bar_token)
+    assert results[1]['status'] == 1
+    assert bogus_proof in results[1]['result']
+
+    r.close()
+
+
 def test_tokens_noproof(
         default_chain_spec,
         foo_token,
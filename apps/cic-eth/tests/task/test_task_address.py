@@ -8,7 +8,10 @@ from eth_address_declarator import Declarator
 from hexathon import add_0x
 
 # local imports
-from cic_eth.ext.address import translate_tx_addresses
+from cic_eth.ext.address import (
+        translate_tx_addresses,
+        translate_address,
+        )
 
 
 def test_translate(
@@ -65,3 +68,31 @@ def test_translate(
 
     assert r['sender_label'] == 'alice'
     assert r['recipient_label'] == 'bob'
+
+
+def test_translate_undecodable(
+        default_chain_spec,
+        address_declarator,
+        eth_signer,
+        eth_rpc,
+        contract_roles,
+        agent_roles,
+        cic_registry,
+        init_celery_tasks,
+        register_lookups,
+    ):
+
+    nonce_oracle = RPCNonceOracle(contract_roles['CONTRACT_DEPLOYER'], eth_rpc)
+
+    c = Declarator(default_chain_spec, signer=eth_signer, nonce_oracle=nonce_oracle)
+
+    # proof hashes and other binary declarations are not labels
+    description = b'\xff\xfe'.ljust(32, b'\x00').hex()
+    (tx_hash_hex, o) = c.add_declaration(address_declarator, contract_roles['CONTRACT_DEPLOYER'], agent_roles['CAROL'], add_0x(description))
+    eth_rpc.do(o)
+    o = receipt(tx_hash_hex)
+    r = eth_rpc.do(o)
+    assert r['status'] == 1
+
+    assert translate_address(agent_roles['CAROL'], [contract_roles['CONTRACT_DEPLOYER']], default_chain_spec, rpc=eth_rpc) == None
+    assert translate_address(agent_roles['CAROL'], [], default_chain_spec, rpc=eth_rpc) == None
@@ -104,6 +104,54 @@ def test_tx_send(
     assert len(r) == 1
 
 
+def test_tx_send_batch(
+        init_database,
+        default_chain_spec,
+        eth_rpc,
+        eth_signer,
+        agent_roles,
+        contract_roles,
+        celery_session_worker,
+        ):
+
+    nonce_oracle = RPCNonceOracle(agent_roles['ALICE'], conn=eth_rpc)
+    c = Gas(default_chain_spec, signer=eth_signer, nonce_oracle=nonce_oracle)
+    tx_hashes = []
+    txs = []
+    for i in range(3):
+        (tx_hash_hex, tx_signed_raw_hex) = c.create(agent_roles['ALICE'], agent_roles['BOB'], 1024 + i, tx_format=TxFormat.RLP_SIGNED)
+        register_tx(tx_hash_hex, tx_signed_raw_hex, default_chain_spec, None, session=init_database)
+        cache_gas_data(tx_hash_hex, tx_signed_raw_hex, default_chain_spec.asdict())
+        set_ready(default_chain_spec, tx_hash_hex, session=init_database)
+        set_reserved(default_chain_spec, tx_hash_hex, session=init_database)
+        tx_hashes.append(tx_hash_hex)
+        txs.append(tx_signed_raw_hex)
+
+    s_send = celery.signature(
+            'cic_eth.eth.tx.send_batch',
+            [
+                txs,
+                default_chain_spec.asdict(),
+                agent_roles['ALICE'],
+                ],
+            queue=None,
+            )
+    t = s_send.apply_async()
+    r = t.get_leaf()
+    assert t.successful()
+    assert len(r) == 3
+
+    init_database.commit()
+
+    for tx_hash_hex in tx_hashes:
+        o = receipt(tx_hash_hex)
+        rcpt = eth_rpc.do(o)
+        assert rcpt['status'] == 1
+
+        o = Otx.load(tx_hash_hex, session=init_database)
+        assert o.status & StatusBits.IN_NETWORK > 0
+
+
 def test_sync_tx(
         init_database,
         default_chain_spec,
@@ -5,6 +5,10 @@ import threading
 import logging
 import time
 import json
+from http.server import (
+        BaseHTTPRequestHandler,
+        ThreadingHTTPServer,
+        )
 
 # third-party imports
 import pytest
@@ -14,33 +18,161 @@ import redis as redis_interface
 from cic_eth.callbacks import http
 from cic_eth.callbacks import tcp
 from cic_eth.callbacks import redis
+from cic_eth.callbacks import batch_error
 
 celery_app = celery.current_app
 
 logg = celery_app.log.get_default_logger()
 
 
-class Response:
+class CallbackHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    clients = set()
+    received = []
+    fail = 0
+    delay = 0
+
+    def do_POST(self):
+        CallbackHandler.clients.add(self.client_address)
+        o = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        time.sleep(CallbackHandler.delay)
+        status = 200
+        if CallbackHandler.fail > 0:
+            CallbackHandler.fail -= 1
+            status = 503
+        else:
+            CallbackHandler.received.append(o)
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='function')
+def callback_server():
+    CallbackHandler.clients = set()
+    CallbackHandler.received = []
+    CallbackHandler.fail = 0
+    CallbackHandler.delay = 0
+    srv = ThreadingHTTPServer(('127.0.0.1', 0), CallbackHandler)
+    t = threading.Thread(target=srv.serve_forever)
+    t.start()
+    yield 'http://127.0.0.1:{}'.format(srv.server_port)
+    srv.shutdown()
+    srv.server_close()
 
-    status = 200
 
 def test_callback_http(
     celery_session_worker,
-    mocker,
+    callback_server,
     ):
 
-    mocker.patch('cic_eth.callbacks.http.urlopen', return_value=Response())
     s = celery.signature(
             'cic_eth.callbacks.http.http',
             [
                 'foo',
-                'http://localhost:65000',
+                callback_server,
                 1,
                ],
             )
     t = s.apply_async()
     t.get()
 
+    assert CallbackHandler.received[0]['result'] == 'foo'
+    assert CallbackHandler.received[0]['status'] == 1
+
+
+def test_callback_http_pool(
+    callback_server,
+    ):
+
+    pool = http.HTTPCallbackPool(size=2, concurrency=2, timeout=2.0, retries=1)
+    for i in range(5):
+        pool.post(callback_server, json.dumps({'result': i}))
+    assert len(CallbackHandler.clients) == 1
+
+    # the receiver may have processed a callback answered with a server error, so it is not sent again
+    CallbackHandler.fail = 1
+    with pytest.raises(RuntimeError):
+        pool.post(callback_server, json.dumps({'result': 5}))
+    pool.post(callback_server, json.dumps({'result': 6}))
+    assert [o['result'] for o in CallbackHandler.received] == [0, 1, 2, 3, 4, 6]
+    assert pool.stats()['retried'] == 0
+
+    # a slow receiver does not hold the task beyond the timeout, and the callback is not sent again
+    CallbackHandler.delay = 3
+    with pytest.raises((TimeoutError, ConnectionError)):
+        pool.post(callback_server, json.dumps({'result': 7}))
+    assert pool.stats()['retried'] == 0
+    while len(CallbackHandler.received) < 7:
+        time.sleep(0.1)
+    time.sleep(0.5)
+    assert [o['result'] for o in CallbackHandler.received] == [0, 1, 2, 3, 4, 6, 7]
+
+    stats = pool.stats()
+    assert stats['delivered'] == 6
+    assert stats['failed'] == 2
+
+
+def test_callback_http_pool_connect(
+    ):
+
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+
+    # a callback that could not be sent is retried on a new connection
+    pool = http.HTTPCallbackPool(timeout=2.0, retries=2)
+    with pytest.raises(ConnectionError):
+        pool.post('http://127.0.0.1:{}'.format(port), json.dumps({'result': 0}))
+
+    stats = pool.stats()
+    assert stats['retried'] == 2
+    assert stats['failed'] == 1
+
+
+def test_callback_http_pool_redis(
+    load_config,
+    callback_server,
+    ):
+
+    host = load_config.get('REDIS_HOST', 'localhost')
+    port = load_config.get('REDIS_PORT', '6379')
+    db = load_config.get('REDIS_DB', '0')
+
+    try:
+        r = redis_interface.Redis(host=host, port=int(port), db=int(db))
+        r.ping()
+    except redis_interface.exceptions.ConnectionError as e:
+        pytest.skip('cannot connect to redis, skipping test: {}'.format(e))
+
+    prefix = 'test:callback:http:{}'.format(time.time())
+    pool = http.HTTPCallbackPool(concurrency=1, timeout=0.5, redis=r, prefix=prefix)
+    pool.post(callback_server, json.dumps({'result': 0}))
+
+    # the slot held by another process is shared with this one
+    other = http.RedisSemaphore(r, '{}:{}'.format(prefix, callback_server), 1, 10.0)
+    token = other.acquire(timeout=0)
+    assert token != None
+    with pytest.raises(TimeoutError):
+        pool.post(callback_server, json.dumps({'result': 1}))
+
+    other.release(token)
+    pool.post(callback_server, json.dumps({'result': 2}))
+    assert [o['result'] for o in CallbackHandler.received] == [0, 2]
+
+    # the slot of a holder that died is released after the lease
+    other = http.RedisSemaphore(r, '{}:{}'.format(prefix, callback_server), 1, 0.2)
+    assert other.acquire(timeout=0) != None
+    pool.post(callback_server, json.dumps({'result': 3}))
+
+    r.close()
+
 
 def test_callback_tcp(
     celery_session_worker,
@@ -163,3 +295,62 @@ def test_callback_redis(
     s_cb.apply_async()
     a.join()
     r.close()
+
+
+def test_callback_redis_batch(
+    load_config,
+    celery_session_worker,
+    ):
+
+    timeout=2
+
+    channel = 'bazbazbaz'
+    host = load_config.get('REDIS_HOST', 'localhost')
+    port = load_config.get('REDIS_PORT', '6379')
+    db = load_config.get('REDIS_DB', '0')
+
+    data = [
+        {'foo': 'bar'},
+        batch_error('xyzzy'),
+        {'baz': None},
+        ]
+
+    try:
+        r = redis_interface.Redis(host=host, port=int(port), db=int(db))
+        ps = r.pubsub()
+        ps.subscribe(channel)
+        ps.get_message(timeout=timeout) # subscribe message
+    except redis_interface.exceptions.ConnectionError as e:
+        pytest.skip('cannot connect to redis, skipping test: {}'.format(e))
+
+    s_cb = celery.signature(
+            'cic_eth.callbacks.redis.redis_batch',
+            [
+                data,
+                '{}:{}:{}:{}'.format(host, port, db, channel),
+                0,
+                ],
+            queue=None,
+            )
+    s_cb.apply_async().get()
+
+    echo = ps.get_message(timeout=timeout)
+    o = json.loads(echo['data'])
+    assert o['result'] == data[0]
+    assert o['status'] == 0
+
+    # error markers are published with error status, without interrupting the batch
+    echo = ps.get_message(timeout=timeout)
+    o = json.loads(echo['data'])
+    assert o['result'] == 'xyzzy'
+    assert o['status'] == 1
+
+    echo = ps.get_message(timeout=timeout)
+    o = json.loads(echo['data'])
+    assert o['result'] == data[2]
+    assert o['status'] == 0
+
+    # connections to the same destination are reused
+    assert len(redis.pools) == 1
+
+    r.close()
@@ -0,0 +1,87 @@
+# standard imports
+import time
+import uuid
+
+# external imports
+import pytest
+
+# local imports
+from cic_eth.db.cache import (
+        ModelCache,
+        connect_model_cache,
+        )
+from cic_eth.db.models.role import AccountRole
+from cic_eth.db.models.lock import Lock
+from cic_eth.db.enum import LockEnum
+
+
+@pytest.fixture(scope='function')
+def model_cache(
+        config,
+        have_redis,
+        ):
+
+    if have_redis != None:
+        pytest.skip('cannot connect to redis, skipping test: {}'.format(have_redis))
+
+    c = ModelCache(
+            host=config.get('REDIS_HOST'),
+            port=config.get('REDIS_PORT'),
+            db=config.get('REDIS_DB'),
+            channel='cic-eth-test:{}'.format(uuid.uuid4()),
+            )
+    connect_model_cache(c)
+    c.get('foo')
+    for i in range(50):
+        if c.subscribed:
+            break
+        time.sleep(0.1)
+    assert c.subscribed
+    yield c
+    connect_model_cache(ModelCache())
+
+
+def test_cache_role(
+        init_database,
+        eth_empty_accounts,
+        model_cache,
+        ):
+
+    foo = AccountRole.set('foo', eth_empty_accounts[0])
+    init_database.add(foo)
+    init_database.commit()
+
+    assert AccountRole.get_address('foo', init_database) == eth_empty_accounts[0]
+    assert model_cache.get(('role', 'foo',))[0]
+
+    # a write bypassing the model is not seen until invalidated
+    init_database.execute("UPDATE account_role SET address_hex = '{}' WHERE tag = 'foo'".format(eth_empty_accounts[1]))
+    init_database.commit()
+    assert AccountRole.get_address('foo', init_database) == eth_empty_accounts[0]
+
+    foo = AccountRole.set('foo', eth_empty_accounts[2])
+    init_database.add(foo)
+    init_database.commit()
+    assert AccountRole.get_address('foo', init_database) == eth_empty_accounts[2]
+
+
+def test_cache_lock(
+        init_database,
+        default_chain_spec,
+        eth_empty_accounts,
+        model_cache,
+        ):
+
+    chain_str = str(default_chain_spec)
+    address = eth_empty_accounts[0]
+
+    assert Lock.check_aggregate(chain_str, LockEnum.QUEUE, address, session=init_database) == 0
+    assert model_cache.get(('lock', chain_str, address,))[0]
+
+    Lock.set(chain_str, LockEnum.QUEUE, address=address)
+    assert Lock.check_aggregate(chain_str, LockEnum.QUEUE, address, session=init_database) == LockEnum.QUEUE
+
+    Lock.reset(chain_str, LockEnum.QUEUE, address=address)
+    Lock.set(chain_str, LockEnum.QUEUE | LockEnum.SEND)
+    assert Lock.check_aggregate(chain_str, LockEnum.QUEUE, address, session=init_database) == LockEnum.QUEUE
+    assert Lock.check_aggregate(chain_str, LockEnum.CREATE, address, session=init_database) == 0
@@ -0,0 +1,18 @@
+# standard imports
+import time
+
+# local imports
+from cic_eth.db.notify import DispatchListener
+
+
+def test_notify_fallback(
+        init_database,
+        ):
+
+    listener = DispatchListener()
+    assert not listener.enabled
+
+    t = time.time()
+    assert not listener.wait(0.1)
+    assert time.time() - t >= 0.1
+    assert listener.conn == None
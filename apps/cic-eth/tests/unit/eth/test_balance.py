@@ -0,0 +1,67 @@
+# standard imports
+import os
+
+# external imports
+from chainlib.eth.tx import receipt
+from chainlib.eth.nonce import RPCNonceOracle
+from eth_erc20 import ERC20
+
+# local imports
+from cic_eth.eth.balance import (
+        MULTICALL_AGGREGATE,
+        multicall_aggregate_data,
+        multicall_aggregate_parse,
+        balance_of_batch,
+        )
+
+
+def test_multicall_codec():
+    address_foo = os.urandom(20).hex()
+    address_bar = os.urandom(20).hex()
+    data = multicall_aggregate_data([
+        (address_foo, '0x70a08231' + os.urandom(32).hex()),
+        (address_bar, '0xabcdef'),
+        ])
+    words = [data[10+i:10+i+64] for i in range(0, len(data) - 10, 64)]
+
+    assert data[2:10] == MULTICALL_AGGREGATE
+    assert int(words[0], 16) == 0x20
+    assert int(words[1], 16) == 2
+    assert int(words[2], 16) == 0x40
+    assert int(words[3], 16) == 0xe0
+    assert words[4][24:] == address_foo
+    assert int(words[6], 16) == 36
+    assert words[9][24:] == address_bar
+    assert int(words[11], 16) == 3
+    assert words[12][:6] == 'abcdef'
+
+    v = '{:064x}{:064x}{:064x}{:064x}{:064x}{:064x}{:064x}{:064x}'.format(42, 0x40, 2, 0x40, 0x80, 32, 1024, 0) 
+    r = multicall_aggregate_parse(v)
+    assert len(r) == 2
+    assert int(r[0], 16) == 1024
+    assert r[1] == '0x'
+
+
+def test_balance_of_batch(
+        default_chain_spec,
+        foo_token,
+        token_roles,
+        agent_roles,
+        eth_signer,
+        eth_rpc,
+        ):
+
+    nonce_oracle = RPCNonceOracle(token_roles['FOO_TOKEN_OWNER'], eth_rpc)
+    c = ERC20(default_chain_spec, signer=eth_signer, nonce_oracle=nonce_oracle)
+    transfer_value = 100 * (10**6)
+    (tx_hash_hex, o) = c.transfer(foo_token, token_roles['FOO_TOKEN_OWNER'], agent_roles['ALICE'], transfer_value)
+    eth_rpc.do(o)
+    o = receipt(tx_hash_hex)
+    r = eth_rpc.do(o)
+    assert r['status'] == 1
+
+    r = balance_of_batch(default_chain_spec, eth_rpc, [foo_token, foo_token], agent_roles['ALICE'])
+    assert r == [transfer_value, transfer_value]
+
+    r = balance_of_batch(default_chain_spec, eth_rpc, [foo_token], agent_roles['BOB'])
+    assert r == [0]
@@ -0,0 +1,119 @@
+# standard imports
+import uuid
+
+# external imports
+import pytest
+
+# local imports
+from cic_eth.eth.nonce import (
+        RedisNonceAllocator,
+        CustodialTaskNonceOracle,
+        persist_nonce,
+        )
+from cic_eth.db.models.nonce import Nonce
+from cic_eth.encode import tx_normalize
+from cic_eth.error import IntegrityError
+
+
+def test_nonce_allocator(
+        init_database,
+        config,
+        have_redis,
+        eth_rpc,
+        eth_empty_accounts,
+        ):
+
+    if have_redis != None:
+        pytest.skip('cannot connect to redis, skipping test: {}'.format(have_redis))
+
+    allocator = RedisNonceAllocator(
+            host=config.get('REDIS_HOST'),
+            port=config.get('REDIS_PORT'),
+            db=config.get('REDIS_DB'),
+            block_size=2,
+            prefix='cic-eth-test:{}'.format(uuid.uuid4()),
+            )
+
+    # counter is recovered from the persisted high-water mark
+    address = tx_normalize.wallet_address(eth_empty_accounts[0])
+    Nonce.init(address, 42, session=init_database)
+    init_database.commit()
+
+    key = str(uuid.uuid4())
+    r = allocator.reserve(address, key, eth_rpc, session=init_database)
+    assert r[1] == 42
+    assert allocator.high_water_mark(r[1]) == None
+
+    with pytest.raises(IntegrityError):
+        allocator.reserve(address, key, eth_rpc, session=init_database)
+
+    assert allocator.release(address, key) == (key, 42,)
+    with pytest.raises(IntegrityError):
+        allocator.release(address, key)
+
+    r = allocator.reserve(address, str(uuid.uuid4()), eth_rpc, session=init_database)
+    assert r[1] == 43
+    assert allocator.high_water_mark(r[1]) == 44
+
+    persist_nonce(address, 44)
+    assert Nonce.get(address, session=init_database) == 44
+
+    # mark is never decreased
+    persist_nonce(address, 40)
+    assert Nonce.get(address, session=init_database) == 44
+
+    # a failed allocation does not leave the reservation claimed
+    class FailingRPC:
+        def do(self, o):
+            raise ConnectionError('node unavailable')
+
+    address = tx_normalize.wallet_address(eth_empty_accounts[1])
+    key = str(uuid.uuid4())
+    with pytest.raises(ConnectionError):
+        allocator.reserve(address, key, FailingRPC(), session=init_database)
+    with pytest.raises(IntegrityError):
+        allocator.release(address, key)
+    r = allocator.reserve(address, key, eth_rpc, session=init_database)
+    assert r[1] == 0
+
+
+def test_nonce_allocator_reconcile(
+        init_database,
+        config,
+        have_redis,
+        eth_rpc,
+        eth_empty_accounts,
+        monkeypatch,
+        ):
+
+    if have_redis != None:
+        pytest.skip('cannot connect to redis, skipping test: {}'.format(have_redis))
+
+    prefix = 'cic-eth-test:{}'.format(uuid.uuid4())
+    allocator = RedisNonceAllocator(
+            host=config.get('REDIS_HOST'),
+            port=config.get('REDIS_PORT'),
+            db=config.get('REDIS_DB'),
+            prefix=prefix,
+            )
+
+    address = tx_normalize.wallet_address(eth_empty_accounts[2])
+    Nonce.init(address, 100, session=init_database)
+    init_database.commit()
+
+    # counter restored from a snapshot taken before the persisted mark
+    k = '{}:{}'.format(prefix, address)
+    allocator.redis.set(k, 10)
+    r = allocator.reserve(address, str(uuid.uuid4()), eth_rpc, session=init_database)
+    assert r[1] == 100
+    r = allocator.reserve(address, str(uuid.uuid4()), eth_rpc, session=init_database)
+    assert r[1] == 101
+
+    # a persisted mark above the counter raises the counter
+    monkeypatch.setattr(CustodialTaskNonceOracle, 'allocator', allocator)
+    allocator.redis.set(k, 5)
+    persist_nonce(address, 6)
+    assert int(allocator.redis.get(k)) == 100
+
+    # the counter is never lowered
+    assert allocator.reconcile(address, 50) == 100
@@ -0,0 +1,155 @@
+# standard imports
+import json
+import threading
+from http.server import (
+        BaseHTTPRequestHandler,
+        ThreadingHTTPServer,
+        )
+
+# external imports
+import pytest
+from chainlib.eth.gas import (
+        Gas,
+        RPCGasOracle,
+        )
+from chainlib.eth.tx import (
+        TxFormat,
+        receipt,
+        )
+from chainlib.eth.nonce import OverrideNonceOracle
+from chainlib.connection import RPCConnection
+
+# local imports
+from cic_eth.eth.rpc import (
+        send_raw_batch,
+        do_batch,
+        RPCPool,
+        PooledEthHTTPConnection,
+        )
+
+
+class JSONRPCHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    clients = set()
+
+    def do_POST(self):
+        JSONRPCHandler.clients.add(self.client_address)
+        o = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        r = json.dumps({'jsonrpc': '2.0', 'id': o['id'], 'result': '0x2a'}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(r)))
+        self.end_headers()
+        self.wfile.write(r)
+
+
+    def log_message(self, *args):
+        pass
+
+
+class DroppingJSONRPCHandler(JSONRPCHandler):
+    """Reads every second request, and closes the connection without responding.
+
+    Requests with batches are answered with an already known error for each request.
+    """
+
+    requests = 0
+
+    def do_POST(self):
+        DroppingJSONRPCHandler.requests += 1
+        o = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        if DroppingJSONRPCHandler.requests % 2 == 0:
+            self.close_connection = True
+            return
+        if isinstance(o, list):
+            r = [{'jsonrpc': '2.0', 'id': v['id'], 'error': {'code': -32000, 'message': 'already known'}} for v in o]
+        else:
+            r = {'jsonrpc': '2.0', 'id': o['id'], 'result': '0x2a'}
+        r = json.dumps(r).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(r)))
+        self.end_headers()
+        self.wfile.write(r)
+
+
+def test_send_raw_batch(
+        default_chain_spec,
+        eth_rpc,
+        eth_signer,
+        agent_roles,
+        ):
+
+    rpc = RPCConnection.connect(default_chain_spec, 'default')
+    gas_oracle = RPCGasOracle(eth_rpc)
+
+    tx_hashes = []
+    txs = []
+    for i in range(3):
+        nonce_oracle = OverrideNonceOracle(agent_roles['ALICE'], i)
+        c = Gas(default_chain_spec, signer=eth_signer, nonce_oracle=nonce_oracle, gas_oracle=gas_oracle)
+        (tx_hash_hex, tx_signed_raw_hex) = c.create(agent_roles['ALICE'], agent_roles['BOB'], 1024 + i, tx_format=TxFormat.RLP_SIGNED)
+        tx_hashes.append(tx_hash_hex)
+        txs.append(tx_signed_raw_hex)
+
+    r = send_raw_batch(rpc, txs)
+    assert len(r) == 3
+    for i in range(3):
+        assert r[i][0] == tx_hashes[i]
+        assert r[i][1] == None
+        o = receipt(tx_hashes[i])
+        rcpt = eth_rpc.do(o)
+        assert rcpt['status'] == 1
+
+
+def test_rpc_pool(
+        monkeypatch,
+        ):
+    srv = ThreadingHTTPServer(('127.0.0.1', 0), JSONRPCHandler)
+    t = threading.Thread(target=srv.serve_forever)
+    t.start()
+
+    pool = RPCPool(size=2, timeout=2.0)
+    monkeypatch.setattr(PooledEthHTTPConnection, 'pool', pool)
+    conn = PooledEthHTTPConnection('http://127.0.0.1:{}'.format(srv.server_port))
+    try:
+        for i in range(5):
+            o = {'jsonrpc': '2.0', 'id': i, 'method': 'eth_blockNumber', 'params': []}
+            assert conn.do(o) == '0x2a'
+    finally:
+        srv.shutdown()
+        srv.server_close()
+
+    assert len(JSONRPCHandler.clients) == 1
+    stats = pool.stats()
+    assert stats['created'] == 1
+    assert stats['reused'] == 4
+    assert stats['idle'] == 1
+
+
+def test_rpc_pool_no_resend():
+    srv = ThreadingHTTPServer(('127.0.0.1', 0), DroppingJSONRPCHandler)
+    t = threading.Thread(target=srv.serve_forever)
+    t.start()
+
+    pool = RPCPool(size=2, timeout=2.0)
+    conn = PooledEthHTTPConnection('http://127.0.0.1:{}'.format(srv.server_port))
+    conn.pool = pool
+    try:
+        o = {'jsonrpc': '2.0', 'id': 0, 'method': 'eth_blockNumber', 'params': []}
+        assert conn.do(o) == '0x2a'
+
+        # the request was received by the node, so it must not be sent again
+        o = {'jsonrpc': '2.0', 'id': 1, 'method': 'eth_blockNumber', 'params': []}
+        with pytest.raises(ConnectionError):
+            conn.do(o)
+        assert DroppingJSONRPCHandler.requests == 2
+
+        r = send_raw_batch(conn, ['0x01', '0x02'])
+        assert len(r) == 2
+        for v in r:
+            assert v[1] == None
+
+        assert do_batch(conn, []) == []
+    finally:
+        srv.shutdown()
+        srv.server_close()
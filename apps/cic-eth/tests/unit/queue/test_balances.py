@@ -11,6 +11,7 @@ from chainqueue.db.models.tx import TxCache
 from cic_eth.queue.balance import (
         balance_outgoing,
         balance_incoming,
+        balance_pending,
         assemble_balances,
         )
 from cic_eth.encode import tx_normalize
@@ -163,3 +164,55 @@ def test_incoming_balance(
 
 
 
+
+
+def test_pending_balance(
+        default_chain_spec,
+        init_database,
+        ):
+
+    holder = '0x' + os.urandom(20).hex()
+    other = '0x' + os.urandom(20).hex()
+    token_foo = '0x' + os.urandom(20).hex()
+    token_bar = '0x' + os.urandom(20).hex()
+    token_baz = '0x' + os.urandom(20).hex()
+
+    txs = [
+        (holder, other, token_foo, 1000),
+        (holder, other, token_foo, 42),
+        (other, holder, token_foo, 13),
+        (other, holder, token_bar, 666),
+        ]
+    for i, v in enumerate(txs):
+        tx_hash = '0x' + os.urandom(32).hex()
+        signed_tx = '0x' + os.urandom(128).hex()
+        otx = Otx.add(i, tx_hash, signed_tx, session=init_database)
+        init_database.add(otx)
+        init_database.commit()
+
+        txc = TxCache(
+                tx_normalize.tx_hash(tx_hash),
+                tx_normalize.wallet_address(v[0]),
+                tx_normalize.wallet_address(v[1]),
+                tx_normalize.executable_address(v[2]),
+                tx_normalize.executable_address(v[2]),
+                v[3],
+                v[3],
+                session=init_database,
+                )
+        init_database.add(txc)
+        init_database.commit()
+
+    tokens = []
+    for token_address in [token_foo, token_bar, token_baz]:
+        tokens.append({
+            'address': token_address,
+            'converters': [],
+            })
+    b = balance_pending(tokens, holder, default_chain_spec.asdict())
+    assert b[0]['balance_outgoing'] == 1042
+    assert b[0]['balance_incoming'] == 13
+    assert b[1]['balance_outgoing'] == 0
+    assert b[1]['balance_incoming'] == 666
+    assert b[2]['balance_outgoing'] == 0
+    assert b[2]['balance_incoming'] == 0
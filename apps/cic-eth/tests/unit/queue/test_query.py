@@ -9,6 +9,8 @@ from chainlib.eth.gas import (
         Gas,
         )
 from chainlib.chain import ChainSpec
+from chainqueue.error import NotLocalTxError
+import pytest
 from hexathon import (
         add_0x,
         strip_0x,
@@ -18,7 +20,11 @@ from hexathon import (
 # local imports
 from cic_eth.db.enum import LockEnum
 from cic_eth.db.models.lock import Lock
-from cic_eth.queue.query import get_upcoming_tx
+from cic_eth.queue.query import (
+        get_upcoming_tx,
+        get_tx_cache_local,
+        get_tx_cache_batch_local,
+        )
 from cic_eth.queue.tx import register_tx
 from cic_eth.eth.gas import cache_gas_data
 from cic_eth.encode import tx_normalize
@@ -65,3 +71,81 @@ def test_upcoming_with_lock(
  
     txs = get_upcoming_tx(default_chain_spec, StatusEnum.PENDING)
     assert len(txs.keys()) == 1
+
+
+def test_upcoming_lowest_nonce(
+    default_chain_spec,
+    init_database,
+    eth_rpc,
+    eth_signer,
+    agent_roles,
+    ):
+
+    rpc = RPCConnection.connect(default_chain_spec, 'default')
+    gas_oracle = RPCGasOracle(eth_rpc)
+
+    alice_normal = tx_normalize.wallet_address(agent_roles['ALICE'])
+    bob_normal = tx_normalize.wallet_address(agent_roles['BOB'])
+
+    tx_hashes = []
+    for i in range(3):
+        nonce_oracle = StaticNonceOracle(42 + i)
+        c = Gas(default_chain_spec, signer=eth_signer, nonce_oracle=nonce_oracle, gas_oracle=gas_oracle)
+        (tx_hash_hex, tx_rpc) = c.create(alice_normal, bob_normal, 100 * (10 ** 6))
+        tx_signed_raw_hex = tx_rpc['params'][0]
+        register_tx(tx_hash_hex, tx_signed_raw_hex, default_chain_spec, None, session=init_database)
+        cache_gas_data(tx_hash_hex, tx_signed_raw_hex, default_chain_spec.asdict())
+        tx_hashes.append(tx_hash_hex)
+
+    nonce_oracle = StaticNonceOracle(13)
+    c = Gas(default_chain_spec, signer=eth_signer, nonce_oracle=nonce_oracle, gas_oracle=gas_oracle)
+    (tx_hash_hex, tx_rpc) = c.create(bob_normal, alice_normal, 100 * (10 ** 6))
+    tx_signed_raw_hex = tx_rpc['params'][0]
+    register_tx(tx_hash_hex, tx_signed_raw_hex, default_chain_spec, None, session=init_database)
+    cache_gas_data(tx_hash_hex, tx_signed_raw_hex, default_chain_spec.asdict())
+
+    txs = get_upcoming_tx(default_chain_spec, StatusEnum.PENDING)
+    assert len(txs.keys()) == 2
+
+    upcoming = []
+    for k in txs.keys():
+        upcoming.append(hex_uniform(strip_0x(k)))
+    assert hex_uniform(strip_0x(tx_hashes[0])) in upcoming
+    assert hex_uniform(strip_0x(tx_hash_hex)) in upcoming
+
+    txs = get_upcoming_tx(default_chain_spec, StatusEnum.PENDING, limit=1)
+    assert len(txs.keys()) == 1
+
+
+def test_tx_cache_batch(
+    default_chain_spec,
+    init_database,
+    eth_rpc,
+    eth_signer,
+    agent_roles,
+    ):
+
+    gas_oracle = RPCGasOracle(eth_rpc)
+
+    alice_normal = tx_normalize.wallet_address(agent_roles['ALICE'])
+    bob_normal = tx_normalize.wallet_address(agent_roles['BOB'])
+
+    tx_hashes = []
+    for i in range(3):
+        nonce_oracle = StaticNonceOracle(42 + i)
+        c = Gas(default_chain_spec, signer=eth_signer, nonce_oracle=nonce_oracle, gas_oracle=gas_oracle)
+        (tx_hash_hex, tx_rpc) = c.create(alice_normal, bob_normal, 100 * (10 ** 6))
+        tx_signed_raw_hex = tx_rpc['params'][0]
+        register_tx(tx_hash_hex, tx_signed_raw_hex, default_chain_spec, None, session=init_database)
+        cache_gas_data(tx_hash_hex, tx_signed_raw_hex, default_chain_spec.asdict())
+        tx_hashes.append(tx_hash_hex)
+
+    txs = get_tx_cache_batch_local(default_chain_spec, tx_hashes, session=init_database)
+    assert len(txs.keys()) == 3
+    for tx_hash_hex in tx_hashes:
+        tx = get_tx_cache_local(default_chain_spec, tx_hash_hex, session=init_database)
+        for k in ['tx_hash', 'nonce', 'status', 'sender', 'recipient', 'source_token', 'from_value', 'date_created']:
+            assert txs[tx_normalize.tx_hash(tx_hash_hex)][k] == tx[k]
+
+    with pytest.raises(NotLocalTxError):
+        get_tx_cache_batch_local(default_chain_spec, tx_hashes + [add_0x('ff' * 32)], session=init_database)
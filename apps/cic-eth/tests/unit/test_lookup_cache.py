@@ -0,0 +1,61 @@
+# standard imports
+import time
+
+# external imports
+import pytest
+from cic_eth_registry.error import UnknownContractError
+from chainlib.eth.address import is_same_address
+
+# local imports
+from cic_eth.registry import (
+        LookupCache,
+        connect,
+        lookup_name,
+        )
+
+
+def test_lookup_cache_ttl():
+    c = LookupCache(name_ttl=60, negative_ttl=0.1)
+
+    c.put(LookupCache.NAME, 'foo', '0x' + 'ab' * 20)
+    c.put(LookupCache.NAME, 'bar', None)
+    assert c.get(LookupCache.NAME, 'foo') == (True, '0x' + 'ab' * 20,)
+    assert c.get(LookupCache.NAME, 'bar') == (True, None,)
+    assert c.get(LookupCache.TOKEN, 'foo') == (False, None,)
+
+    time.sleep(0.2)
+    assert c.get(LookupCache.NAME, 'foo')[0]
+    assert not c.get(LookupCache.NAME, 'bar')[0]
+
+    c.put(LookupCache.DECLARATION, 'foo', 'baz')
+    c.invalidate(kind=LookupCache.NAME)
+    assert not c.get(LookupCache.NAME, 'foo')[0]
+    assert c.get(LookupCache.DECLARATION, 'foo')[0]
+
+    c.invalidate()
+    assert not c.get(LookupCache.DECLARATION, 'foo')[0]
+
+
+def test_lookup_name_cached(
+        eth_rpc,
+        default_chain_spec,
+        address_declarator,
+        contract_roles,
+        registry,
+        lookup_cache,
+        ):
+
+    r = connect(eth_rpc, default_chain_spec, registry, sender_address=contract_roles['CONTRACT_DEPLOYER'])
+
+    address = lookup_name(r, default_chain_spec, 'AddressDeclarator', sender_address=contract_roles['CONTRACT_DEPLOYER'])
+    assert is_same_address(address, address_declarator)
+    assert lookup_name(r, default_chain_spec, 'AddressDeclarator', sender_address=contract_roles['CONTRACT_DEPLOYER']) == address
+
+    with pytest.raises(UnknownContractError):
+        lookup_name(r, default_chain_spec, 'NoSuchContract', sender_address=contract_roles['CONTRACT_DEPLOYER'])
+    with pytest.raises(UnknownContractError):
+        lookup_name(r, default_chain_spec, 'NoSuchContract', sender_address=contract_roles['CONTRACT_DEPLOYER'])
+
+    stats = lookup_cache.stats()
+    assert stats['hits'] == 2
+    assert stats['misses'] == 2